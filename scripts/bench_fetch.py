@@ -0,0 +1,188 @@
+"""
+Bench Fetch - วัด throughput / tail latency ของ scraper กับ mock_server.py
+=======================================================================
+Starts a MockServer in this process and drives the real fetch code at it:
+
+- election_scraper.scrape_async once per --concurrency value (every area
+  of the manifest, MP + PL),
+- election_scraper.scrape_sequential with --sequential,
+- ect_api_fetcher.fetch_all twice: a cold download, then the conditional
+  re-poll (304s).
+
+Each run reports wall time, requests and retries sent, requests/s, MB/s
+of body bytes, the p50/p90/p99/max latency of a GET (HttpClient.latencies:
+retries and backoff included) and the areas that were not saved.
+
+    python scripts/bench_fetch.py --concurrency 4 8 16 32 --latency 80 --jitter 40
+    python scripts/bench_fetch.py --error-rate 0.05 --retries 1 3 --report bench.json
+
+Files are written to a temporary directory that is removed afterwards;
+data/ is only read.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import shutil
+import statistics
+import tempfile
+import time
+
+import ect_api_fetcher
+import election_scraper
+from mock_server import MockServer
+
+
+def percentiles(latencies):
+    """p50 / p90 / p99 / max of a list of seconds, in ms."""
+    if not latencies:
+        return {"p50": None, "p90": None, "p99": None, "max": None}
+    if len(latencies) == 1:
+        cuts = latencies * 99
+    else:
+        cuts = statistics.quantiles(latencies, n=100, method="inclusive")
+    return {"p50": round(cuts[49] * 1000, 1), "p90": round(cuts[89] * 1000, 1),
+            "p99": round(cuts[98] * 1000, 1), "max": round(max(latencies) * 1000, 1)}
+
+
+def measure(name, server, client, run):
+    """Runs `run()` with its output swallowed; the metrics of that run."""
+    hits_before = sum(server.hits.values())
+    bytes_before = server.bytes_sent
+    client.stats = {"requests": 0, "retries": 0}
+    client.latencies.clear()
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = run()
+    wall = time.perf_counter() - started
+    sent = server.bytes_sent - bytes_before
+    row = {
+        "run": name,
+        "wallSeconds": round(wall, 3),
+        "requests": client.stats["requests"],
+        "retries": client.stats["retries"],
+        "responses": sum(server.hits.values()) - hits_before,
+        "requestsPerSecond": round(client.stats["requests"] / wall, 1) if wall else None,
+        "mbPerSecond": round(sent / wall / 1e6, 3) if wall else None,
+        "latencyMs": percentiles(list(client.latencies)),
+    }
+    return row, result
+
+
+def missing_areas(codes):
+    """Manifest areas without an MP or PL file in ./data."""
+    return [code for code in codes
+            if not all(os.path.exists(os.path.join("data", kind, f"{code}.json")) for kind in ("mp", "pl"))]
+
+
+def bench_scraper(server, codes, concurrency, rps, retries):
+    fetcher = election_scraper.AsyncFetcher(concurrency, rps, retries, server.url)
+    try:
+        row, _ = measure(f"scraper async c={concurrency} r={retries}", server, fetcher.client,
+                         lambda: asyncio.run(election_scraper.scrape_async(
+                             concurrency, rps, retries, server.url, codes, fetcher=fetcher)))
+    finally:
+        fetcher.close()
+    row["missing"] = missing_areas(codes)
+    return row
+
+
+def bench_sequential(server, codes, retries):
+    election_scraper.CLIENT.retries = retries
+    row, _ = measure(f"scraper sequential r={retries}", server, election_scraper.CLIENT,
+                     lambda: election_scraper.scrape_sequential(server.url, codes))
+    row["missing"] = missing_areas(codes)
+    return row
+
+
+def bench_ect(server, base_dir, retries):
+    endpoints = ect_api_fetcher.api_endpoints(server.url, server.url)
+    ect_api_fetcher.CLIENT.retries = retries
+    rows = []
+    for name in ("cold", "re-poll"):
+        row, changed = measure(f"ect {name} r={retries}", server, ect_api_fetcher.CLIENT,
+                               lambda: ect_api_fetcher.fetch_all(endpoints=endpoints, base_dir=base_dir))
+        metadata = ect_api_fetcher.load_metadata(base_dir)
+        row["changed"] = len(changed)
+        row["failed"] = metadata.get("failed", 0)
+        rows.append(row)
+    return rows
+
+
+def print_row(row):
+    latency = row["latencyMs"]
+    extra = (f"{len(row['missing'])} areas missing" if "missing" in row
+             else f"{row['changed']} changed, {row['failed']} failed")
+    print(f"  {row['run']:<30} {row['wallSeconds']:>7.2f}s {row['requests']:>5} req "
+          f"{row['retries']:>4} retry {row['requestsPerSecond'] or 0:>7.1f} req/s "
+          f"{row['mbPerSecond'] or 0:>6.2f} MB/s  p50 {latency['p50']} p90 {latency['p90']} "
+          f"p99 {latency['p99']} max {latency['max']} ms  {extra}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the fetchers against the local mock server")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8, 16],
+                        help="async scraper concurrency levels to run (default: 1 4 8 16)")
+    parser.add_argument("--rps", type=float, default=0,
+                        help="scraper requests per second, 0 for no limit (default: 0)")
+    parser.add_argument("--retries", type=int, nargs="+", default=[election_scraper.RETRIES],
+                        help="retry budgets to run (default: %(default)s)")
+    parser.add_argument("--sequential", action="store_true", help="also run the sequential scraper")
+    parser.add_argument("--no-ect", action="store_true", help="skip the ECT fetcher runs")
+    parser.add_argument("--latency", type=float, default=50.0, help="server delay in ms (default: 50)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="mean extra exponential delay in ms (default: 0)")
+    parser.add_argument("--bandwidth", type=float, help="per-connection KB/s (default: unlimited)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of 503 responses (default: 0)")
+    parser.add_argument("--retry-after", type=int, help="Retry-After seconds sent with a 503")
+    parser.add_argument("--forbidden-rate", type=float, default=0.0, help="share of spurious 403 responses (default: 0)")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the server's failure randomness")
+    parser.add_argument("--report", help="also write the results to this JSON file")
+    args = parser.parse_args()
+
+    server = MockServer(latency=args.latency, jitter=args.jitter, bandwidth=args.bandwidth,
+                        error_rate=args.error_rate, forbidden_rate=args.forbidden_rate,
+                        retry_after=args.retry_after, seed=args.seed).start()
+    election_scraper.TIMESTAMP_VERSION = server.versions[-1]
+    with contextlib.redirect_stdout(io.StringIO()):
+        codes = election_scraper.load_manifest()
+    print(f"🧪 Mock server {server.url}: {len(codes)} areas, latency {args.latency:g} ms "
+          f"(+{args.jitter:g} jitter), error rate {args.error_rate:g}, 403 rate {args.forbidden_rate:g}")
+
+    report_path = os.path.abspath(args.report) if args.report else None
+    cwd = os.getcwd()
+    work_dir = tempfile.mkdtemp(prefix="bench_fetch_")
+    rows = []
+    try:
+        # save_to_json writes to ./data/mp and ./data/pl
+        os.chdir(work_dir)
+        for retries in args.retries:
+            for concurrency in args.concurrency:
+                shutil.rmtree("data", ignore_errors=True)
+                rows.append(bench_scraper(server, codes, concurrency, args.rps or None, retries))
+                print_row(rows[-1])
+            if args.sequential:
+                shutil.rmtree("data", ignore_errors=True)
+                rows.append(bench_sequential(server, codes, retries))
+                print_row(rows[-1])
+            if not args.no_ect:
+                ect_dir = os.path.join(work_dir, f"ect_{retries}")
+                for row in bench_ect(server, ect_dir, retries):
+                    rows.append(row)
+                    print_row(row)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(work_dir, ignore_errors=True)
+        server.stop()
+
+    print(f"📊 Server responses: {dict(sorted(server.hits.items()))}")
+    if report_path:
+        with open(report_path, "w", encoding="utf-8") as f:
+            json.dump({"server": vars(args), "runs": rows}, f, ensure_ascii=False, indent=2)
+        print(f"💾 Report: {report_path}")
+
+
+if __name__ == "__main__":
+    main()
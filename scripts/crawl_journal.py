@@ -0,0 +1,163 @@
+"""
+Crawl Journal - checkpoint ของ election_scraper.py ต่อเขต / endpoint
+===================================================================
+One JSON line per finished fetch, appended as the crawl goes:
+
+    data/crawl_journal.jsonl
+    {"kind": "mp", "code": 1001, "version": "2026-02-12-10-20-03-344",
+     "state": "done", "sha256": "..."}
+
+state is "done" (saved to data/<kind>/<code>.json, sha256 of the file),
+"missing" (a probed code has no MP data in that snapshot) or "error"
+(still failing after the retries, or a manifest area answering 403). The last line of a (kind, code) wins.
+
+A restarted crawl of the same snapshot version skips every area whose
+files are "done" and unchanged on disk, and every area known "missing"
+(which also ends a block walk there), so only the unfinished tail is
+fetched. A new version fetches everything again. files() gives the
+snapshot archive exactly the files saved for the version, never a stale
+file left in data/ by an earlier snapshot. Lines are flushed one by
+one, so a killed process loses at most the fetches still in flight; a
+torn last line is ignored. close() rewrites the file with the latest
+line of each (kind, code).
+
+    journal = CrawlJournal(version)
+    journal.pending(1001)              # ["mp", "pl"], [] once both are done
+    journal.record("mp", 1001, "done")
+    journal.close()
+    if not journal.incomplete(codes):
+        archive.add(version, journal.files())
+"""
+
+import hashlib
+import json
+import os
+from collections import Counter
+
+DATA_DIR = "data"  # relative, like election_scraper.save_to_json
+JOURNAL_FILE = os.path.join(DATA_DIR, "crawl_journal.jsonl")
+KINDS = ("mp", "pl")
+
+
+def file_sha256(path):
+    """SHA-256 of a file's bytes, None if it does not exist."""
+    try:
+        with open(path, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except FileNotFoundError:
+        return None
+
+
+class CrawlJournal:
+    """
+    Completion state of every (kind, area code) for snapshot `version`.
+    skipped counts the files pending() found already fetched.
+    """
+    def __init__(self, version, path=JOURNAL_FILE, data_dir=DATA_DIR):
+        self.version = version
+        self.path = path
+        self.data_dir = data_dir
+        self.entries = {}  # (kind, code) -> latest line
+        self.skipped = Counter()
+        self._file = None
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                    self.entries[entry["kind"], int(entry["code"])] = entry
+                except (ValueError, KeyError):
+                    # A line cut off when the process was killed
+                    continue
+
+    def _area_path(self, kind, code):
+        return os.path.join(self.data_dir, kind, f"{code}.json")
+
+    def _current(self, kind, code, state):
+        entry = self.entries.get((kind, code))
+        return entry is not None and entry["version"] == self.version and entry["state"] == state
+
+    def done(self, kind, code):
+        """True if kind/code was saved for this version and the file is still the saved one."""
+        return (self._current(kind, code, "done")
+                and file_sha256(self._area_path(kind, code)) == self.entries[kind, code]["sha256"])
+
+    def missing(self, code):
+        """True if this version is known to have no area `code`."""
+        return self._current("mp", code, "missing")
+
+    def _todo(self, code):
+        return [] if self.missing(code) else [kind for kind in KINDS if not self.done(kind, code)]
+
+    def pending(self, code):
+        """Endpoints of `code` still to fetch: [] when both are done or the area is missing."""
+        todo = self._todo(code)
+        if not self.missing(code):
+            self.skipped.update(kind for kind in KINDS if kind not in todo)
+        return todo
+
+    def incomplete(self, codes=()):
+        """
+        (kind, code) of this version not finished: every "error" entry and
+        each endpoint of a listed area that is neither done nor missing.
+        """
+        unfinished = {key for key, entry in self.entries.items()
+                      if entry["version"] == self.version and entry["state"] == "error"}
+        unfinished.update((kind, code) for code in codes for kind in self._todo(code))
+        return sorted(unfinished)
+
+    def files(self):
+        """
+        {"mp/1001.json": bytes} of the files saved for this version that are
+        still the saved ones on disk.
+        """
+        files = {}
+        for (kind, code), entry in sorted(self.entries.items()):
+            if entry["version"] != self.version or entry["state"] != "done":
+                continue
+            try:
+                with open(self._area_path(kind, code), "rb") as f:
+                    content = f.read()
+            except FileNotFoundError:
+                continue
+            if hashlib.sha256(content).hexdigest() == entry["sha256"]:
+                files[f"{kind}/{code}.json"] = content
+        return files
+
+    def record(self, kind, code, state):
+        """Append the outcome of one fetch ("done" hashes the saved file)."""
+        entry = {"kind": kind, "code": code, "version": self.version, "state": state}
+        if state == "done":
+            entry["sha256"] = file_sha256(self._area_path(kind, code))
+        self.entries[kind, code] = entry
+        if self._file is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._file = open(self.path, "a", encoding="utf-8")
+        self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._file.flush()
+
+    def reset(self):
+        """Forget every entry (the next crawl fetches everything)."""
+        self.entries.clear()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def close(self):
+        """Compact the file to the latest line of each (kind, code)."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if not self.entries:
+            return
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            for key in sorted(self.entries):
+                f.write(json.dumps(self.entries[key], ensure_ascii=False) + "\n")
+        os.replace(tmp, self.path)
@@ -4,100 +4,203 @@ ECT API Data Fetcher - ดึงข้อมูลการเลือกตั
 ดึงข้อมูลจาก 7 API endpoints ของ กกต.:
 - Static (refs): info_province, info_constituency, info_party_overview, info_mp_candidate, info_party_candidate
 - Live (stats): stats_cons, stats_party
+
+ETag / Last-Modified / SHA-256 ของแต่ละ endpoint เก็บใน _metadata.json ("validators")
+แล้วส่ง If-None-Match / If-Modified-Since รอบถัดไป: endpoint ที่ตอบ 304 หรือเนื้อหาเหมือนเดิม
+ไม่ถูกดาวน์โหลดซ้ำหรือเขียนทับ และ _metadata.json["changed"] บอกว่า endpoint ไหนเปลี่ยน
+
+    python scripts/ect_api_fetcher.py            # conditional GET
+    python scripts/ect_api_fetcher.py --force    # ดาวน์โหลดใหม่ทั้งหมด
+    python scripts/ect_api_fetcher.py --base-url http://127.0.0.1:8800 --out-dir /tmp/ect   # mock_server.py
 """
 
+import argparse
 import requests
 import json
 import os
-import time
 from datetime import datetime
+from http_client import HttpClient
 
 # === Configuration ===
 BASE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "ect_api")
+METADATA_NAME = "_metadata.json"
+
+STATIC_HOST = "https://static-ectreport69.ect.go.th"
+STATS_HOST = "https://stats-ectreport69.ect.go.th"
+
+
+def api_endpoints(static_host: str = STATIC_HOST, stats_host: str = STATS_HOST) -> dict:
+    """{name: url} of the 7 endpoints on the given hosts (e.g. a mock server for both)."""
+    static_base = f"{static_host}/data/data/refs"
+    stats_base = f"{stats_host}/data/records"
+    return {
+        # Group 1: Static Reference Data (info_*)
+        "info_province": f"{static_base}/info_province.json",
+        "info_constituency": f"{static_base}/info_constituency.json",
+        "info_party_overview": f"{static_base}/info_party_overview.json",
+        "info_mp_candidate": f"{static_base}/info_mp_candidate.json",
+        "info_party_candidate": f"{static_base}/info_party_candidate.json",
+        # Group 2: Live Stats Data (stats_*)
+        "stats_cons": f"{stats_base}/stats_cons.json",
+        "stats_party": f"{stats_base}/stats_party.json",
+    }
 
-STATIC_BASE = "https://static-ectreport69.ect.go.th/data/data/refs"
-STATS_BASE = "https://stats-ectreport69.ect.go.th/data/records"
-
-API_ENDPOINTS = {
-    # Group 1: Static Reference Data (info_*)
-    "info_province": f"{STATIC_BASE}/info_province.json",
-    "info_constituency": f"{STATIC_BASE}/info_constituency.json",
-    "info_party_overview": f"{STATIC_BASE}/info_party_overview.json",
-    "info_mp_candidate": f"{STATIC_BASE}/info_mp_candidate.json",
-    "info_party_candidate": f"{STATIC_BASE}/info_party_candidate.json",
-    # Group 2: Live Stats Data (stats_*)
-    "stats_cons": f"{STATS_BASE}/stats_cons.json",
-    "stats_party": f"{STATS_BASE}/stats_party.json",
-}
+
+API_ENDPOINTS = api_endpoints()
 
 HEADERS = {
     "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36",
     "Accept": "application/json",
 }
 
+# One keep-alive session per host; at most 2 requests per second to each
+CLIENT = HttpClient(HEADERS, timeout=30, rps=2)
+
+
+def fetch_endpoint(name: str, url: str, validator: dict | None = None,
+                   base_dir: str = BASE_DIR) -> tuple[str, dict | list | None, dict]:
+    """
+    Fetch a single API endpoint with a conditional GET.
+
+    Returns (status, data, validator). status is "changed" (data holds the
+    new content), "unchanged" (304, or the same bytes as validator["sha256"])
+    or "failed"; validator holds the ETag, Last-Modified and SHA-256 to send
+    next time. A failed fetch returns the validator it was given: the
+    headers of an error or of an unreadable body must not make the next
+    poll answer 304 for content that was never saved.
+    """
+    original = dict(validator or {})
+    validator = dict(original)
+    headers = {}
+    # Validators only mean something while the file they describe exists
+    if os.path.exists(os.path.join(base_dir, f"{name}.json")):
+        if validator.get("etag"):
+            headers["If-None-Match"] = validator["etag"]
+        if validator.get("last_modified"):
+            headers["If-Modified-Since"] = validator["last_modified"]
+    else:
+        validator.pop("sha256", None)
 
-def fetch_endpoint(name: str, url: str) -> dict | list | None:
-    """Fetch a single API endpoint."""
     print(f"  📡 Fetching {name}...")
+    download_path = os.path.join(base_dir, f".{name}.download")
     try:
-        response = requests.get(url, headers=HEADERS, timeout=30)
-        response.raise_for_status()
-        data = response.json()
-        size_kb = len(response.content) / 1024
-        print(f"  ✅ {name}: {size_kb:.1f} KB")
-        return data
-    except requests.exceptions.RequestException as e:
+        response, digest, size = CLIENT.download(url, download_path, headers=headers)
+        if response.status_code not in (200, 304):
+            response.raise_for_status()
+            raise requests.exceptions.HTTPError(f"unexpected status {response.status_code}", response=response)
+        for key, header in (("etag", "ETag"), ("last_modified", "Last-Modified")):
+            if response.headers.get(header):
+                validator[key] = response.headers[header]
+        if response.status_code == 304:
+            print(f"  ⏸️ {name}: not modified")
+            return "unchanged", None, validator
+        if digest == validator.get("sha256"):
+            os.remove(download_path)
+            print(f"  ⏸️ {name}: unchanged ({size / 1024:.1f} KB)")
+            return "unchanged", None, validator
+        with open(download_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        os.remove(download_path)
+        validator["sha256"] = digest
+        print(f"  ✅ {name}: {size / 1024:.1f} KB")
+        return "changed", data, validator
+    except (requests.exceptions.RequestException, ValueError) as e:
+        if os.path.exists(download_path):
+            os.remove(download_path)
         print(f"  ❌ {name} failed: {e}")
-        return None
+        return "failed", None, original
 
 
-def save_json(data, filepath: str):
-    """Save data to JSON file."""
+def save_json(data, filepath: str) -> bool:
+    """Save data to JSON file; False (and no write) if it already holds the same JSON."""
     os.makedirs(os.path.dirname(filepath), exist_ok=True)
+    text = json.dumps(data, ensure_ascii=False, indent=2)
+    if os.path.exists(filepath):
+        with open(filepath, "r", encoding="utf-8") as f:
+            if f.read() == text:
+                return False
     with open(filepath, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+        f.write(text)
+    return True
 
 
-def fetch_all():
-    """Fetch all 7 API endpoints and save to data/ect_api/"""
+def load_metadata(base_dir: str = BASE_DIR) -> dict:
+    """_metadata.json of the previous fetch ({} if there is none)."""
+    try:
+        with open(os.path.join(base_dir, METADATA_NAME), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def fetch_all(force: bool = False, names: list | None = None, endpoints: dict = API_ENDPOINTS,
+              base_dir: str = BASE_DIR) -> dict:
+    """
+    Fetch all 7 API endpoints (or those in `names`) and save the changed
+    ones to base_dir (data/ect_api/). Returns {name: data} of the endpoints
+    that changed. With force, the stored validators are ignored and every
+    endpoint is downloaded.
+    """
     print("=" * 60)
     print(f"🗳️  ECT Election 69 Data Fetcher")
     print(f"📅 Fetch time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     print("=" * 60)
 
-    os.makedirs(BASE_DIR, exist_ok=True)
+    os.makedirs(base_dir, exist_ok=True)
+    validators = load_metadata(base_dir).get("validators", {})
 
     results = {}
-    success_count = 0
+    unchanged = []
     fail_count = 0
 
-    for name, url in API_ENDPOINTS.items():
-        data = fetch_endpoint(name, url)
-        if data is not None:
-            filepath = os.path.join(BASE_DIR, f"{name}.json")
-            save_json(data, filepath)
-            results[name] = data
-            success_count += 1
+    for name, url in endpoints.items():
+        if names is not None and name not in names:
+            continue
+        status, data, validator = fetch_endpoint(name, url, None if force else validators.get(name), base_dir)
+        if status != "failed":
+            # A failure keeps the validators of the content still on disk
+            validators[name] = validator
+        if status == "changed":
+            filepath = os.path.join(base_dir, f"{name}.json")
+            # New bytes can still parse to the same JSON (e.g. key order, whitespace)
+            if save_json(data, filepath):
+                results[name] = data
+            else:
+                unchanged.append(name)
+        elif status == "unchanged":
+            unchanged.append(name)
         else:
             fail_count += 1
-        time.sleep(0.5)  # Rate limiting
 
     # Save metadata
     metadata = {
         "fetched_at": datetime.now().isoformat(),
-        "endpoints": {name: url for name, url in API_ENDPOINTS.items()},
-        "success": success_count,
+        "endpoints": {name: url for name, url in endpoints.items()},
+        "success": len(results) + len(unchanged),
         "failed": fail_count,
+        "changed": sorted(results),
+        "validators": validators,
     }
-    save_json(metadata, os.path.join(BASE_DIR, "_metadata.json"))
+    save_json(metadata, os.path.join(base_dir, METADATA_NAME))
 
     print("\n" + "=" * 60)
-    print(f"📊 Results: {success_count} success, {fail_count} failed")
-    print(f"📁 Data saved to: {BASE_DIR}")
+    print(f"📊 Results: {len(results)} changed, {len(unchanged)} unchanged, {fail_count} failed")
+    if results:
+        print(f"🔄 Changed: {', '.join(sorted(results))}")
+    print(f"📁 Data saved to: {base_dir}")
     print("=" * 60)
 
     return results
 
 
 if __name__ == "__main__":
-    fetch_all()
+    parser = argparse.ArgumentParser(description="Fetch the ECT election 69 API endpoints into data/ect_api")
+    parser.add_argument("--force", action="store_true",
+                        help="ignore the stored ETag / Last-Modified / SHA-256 and download everything")
+    parser.add_argument("--base-url",
+                        help="serve both ECT hosts from this URL, e.g. a local mock_server.py")
+    parser.add_argument("--out-dir", default=BASE_DIR,
+                        help="directory for the JSON files and _metadata.json (default: data/ect_api)")
+    args = parser.parse_args()
+    endpoints = api_endpoints(args.base_url, args.base_url) if args.base_url else API_ENDPOINTS
+    fetch_all(force=args.force, endpoints=endpoints, base_dir=args.out_dir)
@@ -2,10 +2,33 @@ import requests
 import time
 import json
 import os
+import asyncio
+import argparse
+import re
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from crawl_journal import CrawlJournal
+from http_client import RETRIES, HttpClient, retryable
+from snapshot_archive import SnapshotArchive
 
 # Configuration
-# Note: Change timestamp part (2026-02-09-19-03-03-086) to fetch updated data
+# Snapshot version: main() replaces it with the newest version named on
+# SNAPSHOT_PAGE (or --version); this one is the fallback
 TIMESTAMP_VERSION = "2026-02-12-10-20-03-344"
+BASE_URL = "https://election69-data.thaipbs.or.th"
+SNAPSHOT_PAGE = "https://www.thaipbs.or.th/election69/result/en/geo?region=all&view=area"
+VERSION_PATTERN = re.compile(r"\d{4}-\d{2}-\d{2}-\d{2}-\d{2}-\d{2}-\d{3}")
+
+ENDPOINTS = {
+    "mp": "result-ect-unofficial-constituency",
+    "pl": "result-ect-unofficial-party-list",
+}
+
+# Manifest of the areas to fetch (see load_manifest)
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+AREA_CODE_FILE = os.path.join(DATA_DIR, "area_code", "area_code.json")
+ECT_CONSTITUENCY_FILE = os.path.join(DATA_DIR, "ect_api", "info_constituency.json")
+ECT_PROVINCE_FILE = os.path.join(DATA_DIR, "ect_api", "info_province.json")
 
 HEADERS = {
     "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
@@ -13,22 +36,51 @@ HEADERS = {
     "Referer": "https://www.thaipbs.or.th/"
 }
 
-def fetch_json_data(endpoint_type, area_code):
+# Sequential mode and snapshot discovery; AsyncFetcher has its own pool
+CLIENT = HttpClient(HEADERS, timeout=10)
+
+def area_url(endpoint_type, area_code, base_url=BASE_URL, version=None):
+    """
+    URL of one area's 'mp' (constituency) or 'pl' (party-list) results.
+    """
+    return f"{base_url}/{ENDPOINTS[endpoint_type]}/{version or TIMESTAMP_VERSION}/areas/AREA-{area_code}.json"
+
+def discover_version(page_url=SNAPSHOT_PAGE, base_url=BASE_URL, probe_code=1001):
+    """
+    Newest snapshot version named on the results page whose data exists
+    (the probe area's MP file answers 200); None if there is none.
+    """
+    try:
+        html = CLIENT.get(page_url).text
+    except requests.exceptions.RequestException as e:
+        print(f"  ⚠️ Snapshot discovery failed: {e}")
+        return None
+    # Versions are timestamps: newest first
+    for version in sorted(set(VERSION_PATTERN.findall(html)), reverse=True):
+        try:
+            response = CLIENT.get(area_url("mp", probe_code, base_url, version))
+        except requests.exceptions.RequestException:
+            continue
+        if response.status_code == 200:
+            return version
+    return None
+
+def fetch_json_data(endpoint_type, area_code, base_url=BASE_URL, client=CLIENT):
     """
-    Fetches JSON data for either 'mp' (constituency) or 'pl' (party-list).
+    Fetches JSON data for either 'mp' (constituency) or 'pl' (party-list):
+    the entries, None if the area does not exist (403 and other non-200
+    statuses), "ERROR" if it still fails after the client's retries.
     """
-    if endpoint_type == "mp":
-        url = f"https://election69-data.thaipbs.or.th/result-ect-unofficial-constituency/{TIMESTAMP_VERSION}/areas/AREA-{area_code}.json"
-    else:  # pl(party-list)
-        url = f"https://election69-data.thaipbs.or.th/result-ect-unofficial-party-list/{TIMESTAMP_VERSION}/areas/AREA-{area_code}.json"
+    url = area_url(endpoint_type, area_code, base_url)
     
     try:
-        response = requests.get(url, headers=HEADERS, timeout=10)
+        response = client.get(url)
         
+        if retryable(response.status_code):
+            response.raise_for_status()
         if response.status_code != 200:
             return None
             
-        response.raise_for_status()
         data = response.json()
         return data.get("entries", [])
             
@@ -60,45 +112,316 @@ def save_to_json(data_type, area_code, entries):
         print(f"Failed to save {data_type.upper()} for Area {area_code}: {e}")
         return False
 
-def main():
-    start_code = 1001
-    max_code = 9999
-    
-    mp_success = 0
-    pl_success = 0
-    current_code = start_code
-    
-    while current_code <= max_code:
-        # 1. Fetch MP Data (Primary check for valid area codes)
-        mp_entries = fetch_json_data("mp", current_code)
-        
+def store(data_type, area_code, entries, counts, journal=None):
+    """
+    Saves fetched entries (not "ERROR") and records the outcome in the
+    crawl journal.
+    """
+    if entries == "ERROR":
+        if journal is not None:
+            journal.record(data_type, area_code, "error")
+        return
+    if save_to_json(data_type, area_code, entries):
+        counts[data_type] += 1
+        if journal is not None:
+            journal.record(data_type, area_code, "done")
+
+def pending(journal, area_code):
+    """
+    Endpoints of an area still to fetch: both without a journal, none when
+    an earlier run of this snapshot finished it (see CrawlJournal.pending).
+    """
+    return journal.pending(area_code) if journal is not None else ["mp", "pl"]
+
+class AsyncFetcher:
+    """
+    Concurrent area fetches over one keep-alive connection pool.
+
+    requests is blocking, so each fetch runs on a thread pool of
+    `concurrency` threads sharing an HttpClient pool of the same size: at
+    most `concurrency` requests are in flight, TCP/TLS connections are
+    reused, and the client applies the `rps` budget and the retries.
+    """
+    def __init__(self, concurrency=8, rps=10.0, retries=RETRIES, base_url=BASE_URL):
+        self.base_url = base_url
+        self.client = HttpClient(HEADERS, timeout=10, retries=retries, rps=rps or None,
+                                 pool_size=concurrency)
+        self.executor = ThreadPoolExecutor(max_workers=concurrency)
+
+    async def fetch(self, endpoint_type, area_code):
+        """
+        Entries of one area, None if it does not exist, "ERROR" once the
+        retries are used up (see fetch_json_data).
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.executor, partial(fetch_json_data, endpoint_type, area_code, self.base_url, self.client))
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        self.client.close()
+
+def load_manifest():
+    """
+    Sorted area codes listed in data/area_code/area_code.json and in the ECT
+    constituency list (data/ect_api/info_constituency.json, whose prov_id is
+    mapped to the 2-digit province code by info_province.json). Missing
+    files contribute nothing.
+    """
+    codes = set()
+    if os.path.exists(AREA_CODE_FILE):
+        with open(AREA_CODE_FILE, "r", encoding="utf-8") as f:
+            area_codes = {int(item["code"]) for item in json.load(f).get("areas", [])}
+        print(f"  📋 {os.path.basename(AREA_CODE_FILE)}: {len(area_codes)} areas")
+        codes |= area_codes
+    if os.path.exists(ECT_CONSTITUENCY_FILE) and os.path.exists(ECT_PROVINCE_FILE):
+        with open(ECT_PROVINCE_FILE, "r", encoding="utf-8") as f:
+            prov_codes = {p["prov_id"]: p["province_id"] for p in json.load(f).get("province", [])}
+        with open(ECT_CONSTITUENCY_FILE, "r", encoding="utf-8") as f:
+            constituencies = json.load(f)
+        # cons_no 0 is not a constituency
+        ect_codes = {int(prov_codes[c["prov_id"]]) * 100 + c["cons_no"]
+                     for c in constituencies if c.get("cons_no", 0) > 0 and c.get("prov_id") in prov_codes}
+        print(f"  📋 {os.path.basename(ECT_CONSTITUENCY_FILE)}: {len(ect_codes)} areas")
+        codes |= ect_codes
+    return sorted(codes)
+
+def probe_starts(codes):
+    """
+    First code after the last listed area of each province block, for
+    probing areas added since the manifest was written.
+    """
+    last = {}
+    for code in codes:
+        last[code // 100] = max(last.get(code // 100, 0), code)
+    return [code + 1 for block, code in sorted(last.items()) if (code + 1) % 100 != 0]
+
+async def scrape_block(fetcher, start_code, counts, pl_tasks, journal=None):
+    """
+    Walks the areas from `start_code` to the end of its province block
+    (XX99) until the first missing one. Each area's PL fetch runs alongside
+    the next MP fetch.
+    """
+    async def fetch_pl(area_code):
+        store("pl", area_code, await fetcher.fetch("pl", area_code), counts, journal)
+        print(f"Saved MP & PL data for {area_code}")
+
+    for current_code in range(start_code, (start_code // 100) * 100 + 100):
+        kinds = pending(journal, current_code)
+        if not kinds and journal.missing(current_code):
+            print(f"  Area {current_code} is invalid (journal). Block {start_code // 100} done")
+            return
+        if "mp" in kinds:
+            mp_entries = await fetcher.fetch("mp", current_code)
+            if mp_entries is None:
+                if journal is not None:
+                    journal.record("mp", current_code, "missing")
+                print(f"  Area {current_code} is invalid. Block {start_code // 100} done")
+                return
+            store("mp", current_code, mp_entries, counts, journal)
+        if "pl" in kinds:
+            pl_tasks.append(asyncio.create_task(fetch_pl(current_code)))
+
+async def scrape_area(fetcher, area_code, counts, journal=None):
+    """
+    Fetches the MP and PL data of one listed area together (only the ones
+    the journal does not have yet).
+    """
+    kinds = pending(journal, area_code)
+    if not kinds:
+        return
+    fetched = dict(zip(kinds, await asyncio.gather(*(fetcher.fetch(kind, area_code) for kind in kinds))))
+    if "mp" in fetched and fetched["mp"] is None:
+        if journal is not None:
+            # A listed area exists: a 403 is a failure to retry, not the end of a block
+            journal.record("mp", area_code, "error")
+        print(f"  Area {area_code} is in the manifest but was not found")
+        return
+    for kind, entries in fetched.items():
+        store(kind, area_code, entries, counts, journal)
+    print(f"Saved MP & PL data for {area_code}")
+
+async def scrape_async(concurrency, rps, retries, base_url, codes=None, probe=False, fetcher=None,
+                       journal=None):
+    """
+    Fetches the listed areas (or, without a manifest, every province block
+    10..99) concurrently; returns the saved counts. A given `fetcher` is
+    used instead of a new one and left open for the caller's next crawl.
+    With a `journal`, the areas it has for this snapshot are skipped and
+    every fetch is recorded.
+    """
+    owned = fetcher is None
+    fetcher = fetcher or AsyncFetcher(concurrency, rps, retries, base_url)
+    counts = {"mp": 0, "pl": 0}
+    pl_tasks = []
+    starts = [block * 100 + 1 for block in range(10, 100)] if not codes else probe_starts(codes) if probe else []
+    try:
+        await asyncio.gather(*(scrape_area(fetcher, code, counts, journal) for code in codes or []),
+                             *(scrape_block(fetcher, start, counts, pl_tasks, journal) for start in starts))
+        await asyncio.gather(*pl_tasks)
+    finally:
+        if owned:
+            fetcher.close()
+    return counts
+
+def fetch_area(area_code, base_url, counts, journal=None, listed=False):
+    """
+    Fetches and saves one area's MP and PL data; False if it has no MP data.
+    No MP data is journaled as "missing" for a probed code and as "error"
+    for a `listed` (manifest) area, which the next run fetches again.
+    """
+    kinds = pending(journal, area_code)
+    if not kinds:
+        # Finished by an earlier run of this snapshot
+        return not journal.missing(area_code)
+
+    # 1. Fetch MP Data (Primary check for valid area codes)
+    if "mp" in kinds:
+        mp_entries = fetch_json_data("mp", area_code, base_url)
         if mp_entries is None:
+            if journal is not None:
+                journal.record("mp", area_code, "error" if listed else "missing")
+            return False
+        store("mp", area_code, mp_entries, counts, journal)
+
+    # 2. Fetch Party List (PL) Data
+    if "pl" in kinds:
+        store("pl", area_code, fetch_json_data("pl", area_code, base_url), counts, journal)
+
+    print(f"Saved MP & PL data for {area_code}")
+    # Small delay between areas
+    time.sleep(0.1)
+    return True
+
+def walk_block(start_code, base_url, counts, journal=None):
+    """
+    Fetches areas from `start_code` up to the first missing one in its block.
+    """
+    current_code = start_code
+    while current_code % 100 != 0:
+        if not fetch_area(current_code, base_url, counts, journal):
             # Skip logic: if response is 403(no more data in this province), go to next XX01 block
             next_block = ((current_code // 100) + 1) * 100 + 1
             print(f"  Area {current_code} is invalid. Skipping to block: {next_block}")
-            current_code = next_block
-            continue
-            
-        if mp_entries != "ERROR":
-            if save_to_json("mp", current_code, mp_entries):
-                mp_success += 1
-
-        # 2. Fetch Party List (PL) Data
-        pl_entries = fetch_json_data("pl", current_code)
-        
-        if pl_entries != "ERROR":
-            if save_to_json("pl", current_code, pl_entries):
-                pl_success += 1
-                
-        print(f"Saved MP & PL data for {current_code}")
-        
+            return
         current_code += 1
-        # Small delay between areas
-        time.sleep(0.1)
-    
+
+def scrape_sequential(base_url, codes=None, probe=False, journal=None):
+    counts = {"mp": 0, "pl": 0}
+    if not codes:
+        for block in range(10, 100):
+            walk_block(block * 100 + 1, base_url, counts, journal)
+        return counts
+
+    for area_code in codes:
+        if not fetch_area(area_code, base_url, counts, journal, listed=True):
+            print(f"  Area {area_code} is in the manifest but was not found")
+    if probe:
+        for start_code in probe_starts(codes):
+            walk_block(start_code, base_url, counts, journal)
+    return counts
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Download ThaiPBS MP / party-list results per area into data/mp and data/pl"
+    )
+    parser.add_argument(
+        "--async", dest="use_async", action="store_true",
+        help="fetch areas concurrently (rate-limited by --rps)"
+    )
+    parser.add_argument(
+        "--concurrency", type=int, default=8,
+        help="async: maximum requests in flight (default: 8)"
+    )
+    parser.add_argument(
+        "--rps", type=float, default=10.0,
+        help="async: requests per second budget, 0 for no limit (default: 10)"
+    )
+    parser.add_argument(
+        "--retries", type=int, default=RETRIES,
+        help=f"retries per request with jittered backoff (default: {RETRIES})"
+    )
+    parser.add_argument(
+        "--no-manifest", action="store_true",
+        help="ignore the area manifest and probe every block 1001-9999 as before"
+    )
+    parser.add_argument(
+        "--probe", action="store_true",
+        help="also probe past the last listed area of each province for areas missing from the manifest"
+    )
+    parser.add_argument(
+        "--version",
+        help="snapshot version to fetch, e.g. 2026-02-12-10-20-03-344 (default: newest on the results page)"
+    )
+    parser.add_argument(
+        "--snapshot-page", default=SNAPSHOT_PAGE,
+        help="page scanned for snapshot versions (default: ThaiPBS results page)"
+    )
+    parser.add_argument(
+        "--no-archive", action="store_true",
+        help="do not add the fetched files to the snapshot archive (data/snapshots)"
+    )
+    parser.add_argument(
+        "--base-url", default=BASE_URL,
+        help="results host, e.g. a local stub server (default: %(default)s)"
+    )
+    parser.add_argument(
+        "--restart", action="store_true",
+        help="ignore the crawl journal (data/crawl_journal.jsonl) and fetch every area again"
+    )
+    args = parser.parse_args()
+    CLIENT.retries = args.retries
+
+    codes = [] if args.no_manifest else load_manifest()
+    if codes:
+        print(f"  📋 Manifest: {len(codes)} areas ({2 * len(codes)} requests)")
+    elif not args.no_manifest:
+        print("  ⚠️ No area manifest found; probing every block")
+
+    global TIMESTAMP_VERSION
+    if args.version:
+        TIMESTAMP_VERSION = args.version
+    else:
+        version = discover_version(args.snapshot_page, args.base_url, codes[0] if codes else 1001)
+        if version:
+            TIMESTAMP_VERSION = version
+        else:
+            print(f"  ⚠️ No snapshot version found; using {TIMESTAMP_VERSION}")
+    print(f"  🕒 Snapshot version: {TIMESTAMP_VERSION}")
+
+    # Areas an interrupted run of this snapshot already saved are skipped
+    journal = CrawlJournal(TIMESTAMP_VERSION)
+    if args.restart:
+        journal.reset()
+    start = time.perf_counter()
+    try:
+        if args.use_async:
+            counts = asyncio.run(scrape_async(args.concurrency, args.rps, args.retries, args.base_url,
+                                              codes, args.probe, journal=journal))
+        else:
+            counts = scrape_sequential(args.base_url, codes, args.probe, journal)
+    finally:
+        journal.close()
+
     print("\n--- Download Complete ---")
-    print(f"Total MP Files Saved: {mp_success}")
-    print(f"Total PL Files Saved: {pl_success}")
+    print(f"Total MP Files Saved: {counts['mp']}")
+    print(f"Total PL Files Saved: {counts['pl']}")
+    if journal.skipped:
+        print(f"Already fetched (journal): {journal.skipped['mp']} MP / {journal.skipped['pl']} PL files")
+    print(f"Elapsed: {time.perf_counter() - start:.1f}s")
+
+    if not args.no_archive:
+        # Only a finished crawl is archived, and only with the files it saved for this
+        # version: areas that failed still hold an older snapshot's file in data/
+        incomplete = journal.incomplete(codes)
+        files = journal.files()
+        if incomplete or not files:
+            print(f"⚠️ Snapshot {TIMESTAMP_VERSION} not archived: {len(incomplete)} area files incomplete, "
+                  f"{len(files)} saved (run again to fetch only the missing ones)")
+        else:
+            # Unchanged area files are already in the archive; only the changed ones are added
+            written, written_bytes = SnapshotArchive().add(TIMESTAMP_VERSION, files)
+            print(f"🗄️ Snapshot {TIMESTAMP_VERSION} archived: {written} new files ({written_bytes / 1024:.0f} KB)")
 
 if __name__ == "__main__":
     main()
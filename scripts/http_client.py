@@ -0,0 +1,210 @@
+"""
+HTTP Client - connection pool กลางของ scraper ทุกตัว
+===================================================
+ect_api_fetcher.py, election_scraper.py and news_scraper.py fetch through
+HttpClient, so they all get
+- one keep-alive requests.Session per host (up to `pool_size` connections),
+- retries of connection errors, timeouts, 429 and 5xx with full-jitter
+  exponential backoff that honours Retry-After,
+- per-host rate limits (token bucket, requests per second),
+- gzip/deflate responses (and brotli when the brotli package is installed),
+- streaming downloads straight to disk.
+
+    client = HttpClient({"Accept": "application/json"}, rps=2)
+    response = client.get(url)                       # final response after retries
+    response, sha256, size = client.download(url, "data/x.json")
+
+The client is safe to share between threads (election_scraper.py --async
+runs its requests on a thread pool).
+"""
+
+import hashlib
+import os
+import random
+import threading
+import time
+from collections import deque
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import brotli  # noqa: F401 - urllib3 decodes "br" responses when it is installed
+except ImportError:
+    try:
+        import brotlicffi as brotli  # noqa: F401
+    except ImportError:
+        brotli = None
+
+ACCEPT_ENCODING = "gzip, deflate, br" if brotli else "gzip, deflate"
+
+# Attempt n > 0 waits a random time up to BACKOFF_BASE * 2^n (capped)
+RETRIES = 3
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 10.0
+TIMEOUT = 15
+POOL_SIZE = 10
+LATENCY_SAMPLES = 100_000  # latest get() durations kept in HttpClient.latencies
+
+# Failures worth another attempt
+RETRY_EXCEPTIONS = (
+    requests.exceptions.ConnectionError,
+    requests.exceptions.Timeout,
+    requests.exceptions.ChunkedEncodingError,
+)
+
+
+def retryable(status_code):
+    """True for statuses that may succeed on a later attempt (429, 5xx)."""
+    return status_code == 429 or status_code >= 500
+
+
+def backoff(attempt, response=None):
+    """
+    Seconds to wait before retry `attempt` (1, 2, ...). Full jitter, so
+    clients retrying together do not stay in step; at least Retry-After.
+    """
+    delay = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+    retry_after = response.headers.get("Retry-After", "") if response is not None else ""
+    if retry_after.isdigit():
+        delay = max(delay, float(retry_after))
+    return delay
+
+
+class RateLimiter:
+    """
+    Token bucket: `rate` requests per second on average, in bursts of up to
+    `burst`. Each acquire() reserves the next free slot under the lock and
+    sleeps outside it, so waiting threads do not serialise on the lock.
+    """
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+        if wait > 0:
+            time.sleep(wait)
+
+
+class HttpClient:
+    """
+    Pooled, rate-limited, retrying GETs. `rps` limits every host (None for
+    no limit); `rate_limits` ({host: rps}) overrides it per host.
+
+    stats counts requests sent and retries; latencies holds the seconds
+    each get() took until the final response's headers, retries, backoff
+    and rate-limit waits included.
+    """
+    def __init__(self, headers=None, timeout=TIMEOUT, retries=RETRIES, rps=None,
+                 rate_limits=None, pool_size=POOL_SIZE):
+        self.headers = dict(headers or {})
+        self.headers.setdefault("Accept-Encoding", ACCEPT_ENCODING)
+        self.timeout = timeout
+        self.retries = retries
+        self.rps = rps
+        self.rate_limits = dict(rate_limits or {})
+        self.pool_size = pool_size
+        self.stats = {"requests": 0, "retries": 0}
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+        self._hosts = {}  # host -> (Session, RateLimiter or None)
+        self._lock = threading.Lock()
+
+    def _host(self, url):
+        host = urlsplit(url).netloc
+        with self._lock:
+            if host not in self._hosts:
+                session = requests.Session()
+                session.headers.update(self.headers)
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                rate = self.rate_limits.get(host, self.rps)
+                self._hosts[host] = (session, RateLimiter(rate) if rate else None)
+            return self._hosts[host]
+
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def get(self, url, **kwargs):
+        """
+        Response of GET `url`. Connection errors, timeouts, 429 and 5xx are
+        retried; after the last attempt the 429/5xx response is returned, or
+        the connection error raised.
+        """
+        session, limiter = self._host(url)
+        kwargs.setdefault("timeout", self.timeout)
+        started = time.perf_counter()
+        response = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                self._count("retries")
+                time.sleep(backoff(attempt, response))
+            if limiter is not None:
+                limiter.acquire()
+            self._count("requests")
+            try:
+                response = session.get(url, **kwargs)
+            except RETRY_EXCEPTIONS:
+                if attempt == self.retries:
+                    raise
+                response = None
+                continue
+            if not retryable(response.status_code) or attempt == self.retries:
+                self.latencies.append(time.perf_counter() - started)
+                return response
+            response.close()
+
+    def download(self, url, path, chunk_size=1 << 16, **kwargs):
+        """
+        Streams the body of GET `url` into `path` (written to path.part and
+        renamed, so `path` is never half-written); returns (response, sha256
+        of the body, bytes). For any status but 200, `path` is left alone and
+        (response, None, 0) returned. A transfer cut off mid-body is retried.
+        """
+        for attempt in range(self.retries + 1):
+            response = self.get(url, stream=True, **kwargs)
+            if response.status_code != 200:
+                response.close()
+                return response, None, 0
+            digest = hashlib.sha256()
+            size = 0
+            part = f"{path}.part"
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            try:
+                with response, open(part, "wb") as f:
+                    for chunk in response.iter_content(chunk_size):
+                        f.write(chunk)
+                        digest.update(chunk)
+                        size += len(chunk)
+            except RETRY_EXCEPTIONS:
+                os.remove(part)
+                if attempt == self.retries:
+                    raise
+                self._count("retries")
+                time.sleep(backoff(attempt + 1))
+                continue
+            os.replace(part, path)
+            return response, digest.hexdigest(), size
+
+    def close(self):
+        with self._lock:
+            for session, _ in self._hosts.values():
+                session.close()
+            self._hosts.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
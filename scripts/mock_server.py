@@ -0,0 +1,250 @@
+"""
+Mock Server - ThaiPBS + กกต. API จำลองจากไฟล์ใน data/ สำหรับทดสอบ / benchmark แบบ offline
+=====================================================================================
+Replays data/mp, data/pl and data/ect_api under the URL layout of the live
+hosts, all on one local port:
+
+    /election69/result/en/geo                                   results page naming every snapshot version
+    /result-ect-unofficial-constituency/<version>/areas/AREA-<code>.json    data/mp/<code>.json
+    /result-ect-unofficial-party-list/<version>/areas/AREA-<code>.json      data/pl/<code>.json
+    /data/data/refs/info_*.json, /data/records/stats_*.json     data/ect_api (ETag / Last-Modified, 304)
+
+An unknown version or area answers 403, as ThaiPBS does. Every response
+can be slowed down and made to fail:
+
+    --latency MS --jitter MS     delay before the response (+ exponential jitter with that mean)
+    --bandwidth KB/S             per-connection transfer rate
+    --error-rate P               share of 503 responses (with --retry-after S)
+    --forbidden-rate P           share of spurious 403 responses
+    --rotate S --rotate-areas N  a new snapshot version every S seconds, with N areas' votes changed
+
+    python scripts/mock_server.py --port 8800 --latency 80 --jitter 40 --error-rate 0.02
+    python scripts/election_scraper.py --async --no-archive --base-url http://127.0.0.1:8800 \\
+        --snapshot-page http://127.0.0.1:8800/election69/result/en/geo
+    python scripts/ect_api_fetcher.py --base-url http://127.0.0.1:8800 --out-dir /tmp/ect
+
+Responses are gzipped when the client accepts it. MockServer can also run
+inside another script (bench_fetch.py) on a background thread.
+"""
+
+import argparse
+import copy
+import gzip
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+from ect_api_fetcher import API_ENDPOINTS
+from election_scraper import DATA_DIR, ENDPOINTS, SNAPSHOT_PAGE, TIMESTAMP_VERSION
+
+PAGE_PATH = urlsplit(SNAPSHOT_PAGE).path
+AREA_PATH = re.compile(r"/(?P<endpoint>[\w-]+)/(?P<version>[\w-]+)/areas/AREA-(?P<code>\d+)\.json$")
+ECT_PATHS = {urlsplit(url).path: name for name, url in API_ENDPOINTS.items()}
+CHUNK = 16 * 1024
+
+
+class MockServer:
+    """
+    ThreadingHTTPServer over the files of `data_dir`; start() serves it on a
+    background thread, url is its base URL. hits counts responses by status
+    and bytes_sent the body bytes written.
+    """
+    def __init__(self, data_dir=DATA_DIR, host="127.0.0.1", port=0, latency=0.0, jitter=0.0,
+                 bandwidth=None, error_rate=0.0, forbidden_rate=0.0, retry_after=None,
+                 rotate=None, rotate_areas=10, seed=0, compress=True):
+        self.data_dir = data_dir
+        self.latency = latency / 1000
+        self.jitter = jitter / 1000
+        self.bandwidth = bandwidth * 1024 if bandwidth else None
+        self.error_rate = error_rate
+        self.forbidden_rate = forbidden_rate
+        self.retry_after = retry_after
+        self.rotate = rotate
+        self.rotate_areas = rotate_areas
+        self.compress = compress
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.hits = Counter()
+        self.bytes_sent = 0
+        self.started = time.monotonic()
+        # Snapshot versions, oldest first; overrides[version] = {(kind, code): entries}
+        self.versions = [TIMESTAMP_VERSION]
+        self.overrides = {TIMESTAMP_VERSION: {}}
+        self._bodies = {}  # (path, gzip) -> bytes of the static files
+        self.httpd = ThreadingHTTPServer((host, port), _Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.mock = self
+        self.url = f"http://{host}:{self.httpd.server_address[1]}"
+
+    # ── content ──────────────────────────────────────────────────
+
+    def _read(self, path):
+        with open(path, "rb") as f:
+            return f.read()
+
+    def _rotate(self):
+        """Add the versions due since the last request (one per `rotate` seconds)."""
+        if not self.rotate:
+            return
+        with self.lock:
+            due = int((time.monotonic() - self.started) // self.rotate) + 1
+            while len(self.versions) < due:
+                previous = self.versions[-1]
+                base = datetime.strptime(TIMESTAMP_VERSION[:19], "%Y-%m-%d-%H-%M-%S")
+                version = (base + timedelta(seconds=self.rotate * len(self.versions))).strftime(
+                    "%Y-%m-%d-%H-%M-%S") + "-000"
+                overrides = dict(self.overrides[previous])
+                codes = sorted(os.path.basename(p)[:-len(".json")]
+                               for p in os.listdir(os.path.join(self.data_dir, "mp")))
+                for code in self.rng.sample(codes, min(self.rotate_areas, len(codes))):
+                    for kind in ("mp", "pl"):
+                        entries = copy.deepcopy(overrides.get((kind, code)) or self._entries(kind, code))
+                        for entry in entries:
+                            entry["voteTotal"] = entry.get("voteTotal", 0) + self.rng.randint(0, 50)
+                        overrides[kind, code] = entries
+                self.versions.append(version)
+                self.overrides[version] = overrides
+
+    def _entries(self, kind, code):
+        path = os.path.join(self.data_dir, kind, f"{code}.json")
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f).get("entries", [])
+
+    def area_body(self, kind, version, code):
+        """JSON bytes of one area in one snapshot, None if there is no such area."""
+        entries = self.overrides.get(version, {}).get((kind, code))
+        if entries is None:
+            if not os.path.exists(os.path.join(self.data_dir, kind, f"{code}.json")):
+                return None
+            entries = self._entries(kind, code)
+        return json.dumps({"entries": entries}, ensure_ascii=False).encode("utf-8")
+
+    def static_body(self, path, compress):
+        key = (path, compress)
+        if key not in self._bodies:
+            body = self._read(path)
+            self._bodies[key] = gzip.compress(body, mtime=0) if compress else body
+        return self._bodies[key]
+
+    # ── lifecycle ────────────────────────────────────────────────
+
+    def start(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; with Nagle on, delayed ACKs add ~40 ms to each
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        mock = self.server.mock
+        mock._rotate()
+        if mock.latency or mock.jitter:
+            time.sleep(mock.latency + (mock.rng.expovariate(1 / mock.jitter) if mock.jitter else 0))
+        roll = mock.rng.random()
+        if roll < mock.error_rate:
+            headers = [("Retry-After", str(mock.retry_after))] if mock.retry_after is not None else []
+            return self._send(503, b"", headers)
+        if roll < mock.error_rate + mock.forbidden_rate:
+            return self._send(403)
+
+        path = urlsplit(self.path).path
+        gzip_ok = mock.compress and "gzip" in self.headers.get("Accept-Encoding", "")
+        if path == PAGE_PATH:
+            links = "".join(f'<script src="/_next/data/{v}/page.js"></script>' for v in mock.versions)
+            return self._send(200, f"<html><head>{links}</head></html>".encode("utf-8"),
+                              [("Content-Type", "text/html")])
+
+        match = AREA_PATH.match(path)
+        if match:
+            kind = next((k for k, endpoint in ENDPOINTS.items() if endpoint == match["endpoint"]), None)
+            body = None
+            if kind and match["version"] in mock.overrides:
+                body = mock.area_body(kind, match["version"], match["code"])
+            if body is None:
+                return self._send(403)
+            return self._send(200, gzip.compress(body, mtime=0) if gzip_ok else body,
+                              [("Content-Type", "application/json")] + ([("Content-Encoding", "gzip")] if gzip_ok else []))
+
+        name = ECT_PATHS.get(path)
+        file_path = os.path.join(mock.data_dir, "ect_api", f"{name}.json") if name else None
+        if not file_path or not os.path.exists(file_path):
+            return self._send(404)
+        raw = mock.static_body(file_path, False)
+        etag = '"%s"' % hashlib.sha256(raw).hexdigest()[:32]
+        last_modified = formatdate(os.path.getmtime(file_path), usegmt=True)
+        validators = [("ETag", etag), ("Last-Modified", last_modified)]
+        if self.headers.get("If-None-Match") == etag or (
+                "If-None-Match" not in self.headers and self.headers.get("If-Modified-Since") == last_modified):
+            return self._send(304, b"", validators)
+        return self._send(200, mock.static_body(file_path, True) if gzip_ok else raw,
+                          [("Content-Type", "application/json")] + validators
+                          + ([("Content-Encoding", "gzip")] if gzip_ok else []))
+
+    def _send(self, status, body=b"", headers=()):
+        mock = self.server.mock
+        self.send_response(status)
+        for key, value in headers:
+            self.send_header(key, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if mock.bandwidth:
+            for i in range(0, len(body), CHUNK):
+                self.wfile.write(body[i:i + CHUNK])
+                time.sleep(len(body[i:i + CHUNK]) / mock.bandwidth)
+        else:
+            self.wfile.write(body)
+        with mock.lock:
+            mock.hits[status] += 1
+            mock.bytes_sent += len(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the ThaiPBS and ECT hosts, served from data/")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8800)
+    parser.add_argument("--data-dir", default=DATA_DIR, help="tree with mp/, pl/ and ect_api/ (default: data)")
+    parser.add_argument("--latency", type=float, default=0.0, help="response delay in ms (default: 0)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="mean extra exponential delay in ms (default: 0)")
+    parser.add_argument("--bandwidth", type=float, help="per-connection KB/s (default: unlimited)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of 503 responses (default: 0)")
+    parser.add_argument("--retry-after", type=int, help="Retry-After seconds sent with a 503")
+    parser.add_argument("--forbidden-rate", type=float, default=0.0, help="share of spurious 403 responses (default: 0)")
+    parser.add_argument("--rotate", type=float, help="publish a new snapshot version every N seconds")
+    parser.add_argument("--rotate-areas", type=int, default=10,
+                        help="areas whose votes change in each new snapshot (default: 10)")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the failure / rotation randomness")
+    parser.add_argument("--no-gzip", action="store_true", help="never compress responses")
+    args = parser.parse_args()
+
+    server = MockServer(args.data_dir, args.host, args.port, args.latency, args.jitter, args.bandwidth,
+                        args.error_rate, args.forbidden_rate, args.retry_after, args.rotate,
+                        args.rotate_areas, args.seed, not args.no_gzip)
+    print(f"🧪 Mock ThaiPBS + ECT server on {server.url} (data: {args.data_dir})")
+    print(f"   Snapshot page: {server.url}{PAGE_PATH}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        print(f"\n👋 Stopped: {dict(server.hits)}")
+
+
+if __name__ == "__main__":
+    main()
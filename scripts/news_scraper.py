@@ -17,10 +17,10 @@ from bs4 import BeautifulSoup
 import json
 import os
 import re
-import time
 import argparse
 from datetime import datetime
 from urllib.parse import urljoin, quote
+from http_client import HttpClient
 
 # ─── Configuration ───────────────────────────────────────────────
 OUTPUT_DIR = os.path.join(os.path.dirname(__file__), "..", "data", "news")
@@ -45,26 +45,23 @@ ELECTION_KEYWORDS = [
     "กล้าธรรม", "ไทยสร้างไทย", "พลังประชารัฐ",
 ]
 
-REQUEST_DELAY = 1.5  # seconds between requests
+REQUEST_DELAY = 1.5  # seconds between requests to the same site
+
+# Keep-alive session per site, spaced REQUEST_DELAY apart, 3 attempts per page
+CLIENT = HttpClient(HEADERS, timeout=15, retries=2, rps=1 / REQUEST_DELAY)
 
 
 # ─── Helper Functions ────────────────────────────────────────────
-def safe_request(url, max_retries=3):
-    """Make HTTP request with retry logic."""
-    for attempt in range(max_retries):
-        try:
-            resp = requests.get(url, headers=HEADERS, timeout=15)
-            resp.raise_for_status()
-            return resp
-        except requests.exceptions.RequestException as e:
-            if attempt < max_retries - 1:
-                wait = 2 ** attempt
-                print(f"  ⚠️  Retry {attempt+1}/{max_retries} for {url} (wait {wait}s)")
-                time.sleep(wait)
-            else:
-                print(f"  ❌ Failed after {max_retries} attempts: {url}")
-                print(f"     Error: {e}")
-                return None
+def safe_request(url):
+    """Make HTTP request through the shared client (retries, per-site delay)."""
+    try:
+        resp = CLIENT.get(url)
+        resp.raise_for_status()
+        return resp
+    except requests.exceptions.RequestException as e:
+        print(f"  ❌ Failed: {url}")
+        print(f"     Error: {e}")
+        return None
 
 
 def is_election_related(title, summary=""):
@@ -175,7 +172,6 @@ def scrape_khaosod(pages=2, keyword=None):
         print(f"    Found {len(article_links)} article links")
 
         for link in article_links:
-            time.sleep(REQUEST_DELAY)
             article = scrape_khaosod_article(link, source_name)
             if article:
                 articles.append(article)
@@ -304,7 +300,6 @@ def scrape_thairath(pages=2, keyword=None):
         print(f"    Found {len(article_links)} article links")
 
         for link in article_links:
-            time.sleep(REQUEST_DELAY)
             article = scrape_thairath_article(link, source_name)
             if article:
                 articles.append(article)
@@ -416,7 +411,6 @@ def scrape_matichon(pages=2, keyword=None):
         print(f"    Found {len(article_links)} article links")
 
         for link in article_links:
-            time.sleep(REQUEST_DELAY)
             article = scrape_matichon_article(link, source_name)
             if article:
                 articles.append(article)
@@ -522,7 +516,6 @@ def scrape_thaipbs(pages=2, keyword=None):
         print(f"    Found {len(article_links)} article links")
 
         for link in list(article_links)[:30]:
-            time.sleep(REQUEST_DELAY)
             article = scrape_thaipbs_article(link, source_name)
             if article:
                 articles.append(article)
@@ -670,7 +663,6 @@ def scrape_pptv(pages=1, keyword=None):
         print(f"    Found {len(article_links)} article links")
 
         for link in list(article_links)[:20]:  # Limit to 20 per page
-            time.sleep(REQUEST_DELAY)
             article = scrape_pptv_article(link, source_name)
             if article:
                 articles.append(article)
@@ -0,0 +1,120 @@
+"""
+Snapshot Archive - เก็บ data/mp + data/pl ของทุก snapshot แบบไม่ซ้ำซ้อน
+=====================================================================
+Each ThaiPBS snapshot version (e.g. 2026-02-12-10-20-03-344) is stored as
+
+    data/snapshots/versions/<version>.json    {"version", "archived_at",
+                                               "files": {"mp/1001.json": sha256, ...}}
+    data/snapshots/objects/ab/<sha256>.gz      gzip of the file's exact bytes
+
+Files are addressed by the SHA-256 of their content, so an area file that
+did not change since an earlier snapshot is stored once, and each new
+snapshot only adds the files that changed. Version strings are timestamps,
+so the newest sorts last.
+
+    archive = SnapshotArchive()
+    archive.add(version, {"mp/1001.json": b"..."})
+    archive.checkout("latest", "/tmp/snap")   # writes /tmp/snap/mp, /tmp/snap/pl
+"""
+
+import glob
+import gzip
+import hashlib
+import json
+import os
+from datetime import datetime
+
+ARCHIVE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "snapshots")
+
+
+class SnapshotArchive:
+    def __init__(self, root=ARCHIVE_DIR):
+        self.root = root
+
+    def _object_path(self, digest):
+        return os.path.join(self.root, "objects", digest[:2], f"{digest}.gz")
+
+    def _version_path(self, version):
+        return os.path.join(self.root, "versions", f"{version}.json")
+
+    def versions(self):
+        """Archived versions, oldest first."""
+        paths = glob.glob(os.path.join(self.root, "versions", "*.json"))
+        return sorted(os.path.basename(p)[:-len(".json")] for p in paths)
+
+    def resolve(self, version):
+        """`version` itself, or the newest one for "latest"."""
+        versions = self.versions()
+        if version == "latest":
+            if not versions:
+                raise FileNotFoundError(f"No snapshots archived in {self.root}")
+            return versions[-1]
+        if version not in versions:
+            raise FileNotFoundError(f"Snapshot {version} not found in {self.root}")
+        return version
+
+    def add(self, version, files):
+        """
+        Archive {relative path: bytes} as snapshot `version`; returns
+        (objects written, bytes written). Existing objects are reused.
+        """
+        listing = {}
+        written = 0
+        written_bytes = 0
+        for relpath, content in sorted(files.items()):
+            digest = hashlib.sha256(content).hexdigest()
+            listing[relpath] = digest
+            path = self._object_path(digest)
+            if os.path.exists(path):
+                continue
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "wb") as f:
+                # No name or mtime: the same content always gives the same object bytes
+                with gzip.GzipFile(filename="", fileobj=f, mode="wb", mtime=0) as gz:
+                    gz.write(content)
+            os.replace(tmp, path)
+            written += 1
+            written_bytes += os.path.getsize(path)
+
+        os.makedirs(os.path.dirname(self._version_path(version)), exist_ok=True)
+        with open(self._version_path(version), "w", encoding="utf-8") as f:
+            json.dump({"version": version, "archived_at": datetime.now().isoformat(),
+                       "files": listing}, f, ensure_ascii=False, indent=2)
+        return written, written_bytes
+
+    def listing(self, version):
+        """{relative path: sha256} of a snapshot ("latest" for the newest)."""
+        with open(self._version_path(self.resolve(version)), "r", encoding="utf-8") as f:
+            return json.load(f)["files"]
+
+    def read(self, digest):
+        with gzip.open(self._object_path(digest), "rb") as f:
+            return f.read()
+
+    def checkout(self, version, dest):
+        """
+        Write the files of a snapshot under `dest` (dest/mp, dest/pl);
+        returns the resolved version. A complete earlier checkout is kept.
+        """
+        version = self.resolve(version)
+        marker = os.path.join(dest, ".snapshot")
+        if os.path.exists(marker):
+            with open(marker, "r", encoding="utf-8") as f:
+                if f.read() == version:
+                    return version
+            os.remove(marker)
+        listing = self.listing(version)
+        # Drop files of an earlier checkout that this snapshot does not have
+        for sub in {relpath.split("/")[0] for relpath in listing}:
+            for path in glob.glob(os.path.join(dest, sub, "*.json")):
+                if f"{sub}/{os.path.basename(path)}" not in listing:
+                    os.remove(path)
+        for relpath, digest in listing.items():
+            path = os.path.join(dest, relpath)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as f:
+                f.write(self.read(digest))
+        with open(marker, "w", encoding="utf-8") as f:
+            f.write(version)
+        return version
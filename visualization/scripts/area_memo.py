@@ -0,0 +1,70 @@
+"""
+Per-area records recomputed only for the areas whose inputs changed.
+
+While results are still coming in, a new snapshot changes only some of the
+data/mp and data/pl files. A section that builds one record per area
+(voteBuyingAnalysis, areaDetails, ballotImbalance, digit histograms) keeps
+its records from the last run under <cache_dir>/areas/<section>.pickle:
+
+    {'code': code fingerprint of the record function,
+     'areas': {area code: (digest of the area's inputs, record)}}
+
+    digest = sha256(pickle(key(area code)))
+
+key(code) summarises everything the record function reads about one area:
+its file hashes (AreaStore.area_hash) plus its entries in other per-area
+lookups. An area is recomputed when its digest changed. Every area is
+recomputed when the record function's code (or a global it uses) changed.
+Aggregates over areas are summed again from the records, which is cheap;
+only the per-area work is skipped.
+"""
+import hashlib
+import os
+import pickle
+
+from stage_runner import code_fingerprint
+
+
+class AreaMemo:
+    """Per-area record cache under `cache_dir`; None computes every record."""
+
+    def __init__(self, cache_dir=None):
+        self.cache_dir = cache_dir
+
+    def map(self, name, fn, codes, key):
+        """[fn(code) for code in codes], reusing last run's unchanged records."""
+        if self.cache_dir is None:
+            return [fn(code) for code in codes]
+        path = os.path.join(self.cache_dir, f'{name}.pickle')
+        fingerprint = code_fingerprint(fn)
+        previous = {}
+        try:
+            with open(path, 'rb') as f:
+                saved = pickle.load(f)
+            if saved.get('code') == fingerprint:
+                previous = saved['areas']
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            pass
+
+        areas, records, recomputed = {}, [], 0
+        for code in codes:
+            digest = hashlib.sha256(
+                pickle.dumps(key(code), protocol=pickle.HIGHEST_PROTOCOL)).hexdigest()
+            old = previous.get(code)
+            if old is not None and old[0] == digest:
+                record = old[1]
+            else:
+                record = fn(code)
+                recomputed += 1
+            areas[code] = (digest, record)
+            records.append(record)
+
+        if recomputed or set(areas) != set(previous):
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp = f'{path}.{os.getpid()}.tmp'
+            with open(tmp, 'wb') as f:
+                pickle.dump({'code': fingerprint, 'areas': areas}, f,
+                            protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, path)
+        print(f"  ♻️ {name}: {recomputed}/{len(codes)} areas recomputed")
+        return records
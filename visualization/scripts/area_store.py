@@ -0,0 +1,99 @@
+"""
+In-memory store of per-area constituency (MP) and party-list (PL) results.
+
+Every data/mp/{area}.json and data/pl/{area}.json file is read and parsed
+exactly once; all analysis sections of prepare_data.py share the parsed
+entries, winners and totals instead of reopening the files.
+"""
+import glob
+import hashlib
+import json
+import os
+
+
+class AreaStore:
+    """Parsed MP / PL entries for every area, keyed by area code ("1001")."""
+
+    def __init__(self, mp_dir, pl_dir, cache=None):
+        self.mp_dir = mp_dir
+        self.pl_dir = pl_dir
+        self.files_read = 0
+        self.bytes_read = 0
+        self.mp_hashes = {}  # areaCode -> SHA-256 of the MP / PL file
+        self.pl_hashes = {}
+
+        if cache is not None:
+            # ParseCache: unchanged files come from its columnar tables
+            parsed, parsed_bytes = cache.files_parsed, cache.bytes_parsed
+            self.mp = cache.load_entries_dir(mp_dir)
+            self.pl = cache.load_entries_dir(pl_dir)
+            self.files_read = cache.files_parsed - parsed
+            self.bytes_read = cache.bytes_parsed - parsed_bytes
+            for hashes, directory in ((self.mp_hashes, mp_dir), (self.pl_hashes, pl_dir)):
+                for path in sorted(glob.glob(os.path.join(directory, '*.json'))):
+                    hashes[self._code(path)] = cache.file_hash(path)
+            self._build_indexes()
+            return
+
+        self.mp = {}  # areaCode -> list of raw MP entries (file order)
+        self.pl = {}  # areaCode -> list of raw PL entries (file order)
+        for path in sorted(glob.glob(os.path.join(mp_dir, '*.json'))):
+            code = self._code(path)
+            self.mp[code], self.mp_hashes[code] = self._read_entries(path)
+        for path in sorted(glob.glob(os.path.join(pl_dir, '*.json'))):
+            code = self._code(path)
+            self.pl[code], self.pl_hashes[code] = self._read_entries(path)
+
+        self._build_indexes()
+
+    @staticmethod
+    def _code(path):
+        return os.path.basename(path).replace('.json', '')
+
+    def _read_entries(self, path):
+        with open(path, 'rb') as f:
+            raw = f.read()
+        self.files_read += 1
+        self.bytes_read += len(raw)
+        return json.loads(raw).get('entries', []), hashlib.sha256(raw).hexdigest()
+
+    def _build_indexes(self):
+        self.mp_codes = sorted(self.mp)
+        self.pl_codes = sorted(self.pl)
+        # Areas with both ballots, in MP-file order (the main iteration order)
+        self.paired_codes = [ac for ac in self.mp_codes if ac in self.pl]
+
+        self.winners = {}      # areaCode -> MP entry with rank 1 (or None)
+        self.mp_totals = {}    # areaCode -> sum of MP candidate votes
+        self.pl_totals = {}    # areaCode -> sum of PL party votes
+        self._pl_by_rank = {}  # areaCode -> PL entries sorted by rank (lazy)
+        for ac, entries in self.mp.items():
+            self.winners[ac] = next((e for e in entries if e['rank'] == 1), None)
+            self.mp_totals[ac] = sum(e['voteTotal'] for e in entries)
+        for ac, entries in self.pl.items():
+            self.pl_totals[ac] = sum(e['voteTotal'] for e in entries)
+
+    def area_hash(self, area_code):
+        """Content hash of the area's MP and PL files ('' for a missing file)."""
+        return f"{self.mp_hashes.get(area_code, '')}:{self.pl_hashes.get(area_code, '')}"
+
+    def has_mp(self, area_code):
+        return area_code in self.mp
+
+    def has_pl(self, area_code):
+        return area_code in self.pl
+
+    def winner(self, area_code):
+        """MP entry ranked 1 in the area, or None."""
+        return self.winners.get(area_code)
+
+    def winner_num(self, area_code):
+        """Ballot number of the MP winner (last two digits of candidateCode)."""
+        w = self.winners.get(area_code)
+        return int(w['candidateCode'][-2:]) if w else None
+
+    def pl_by_rank(self, area_code):
+        """PL entries sorted by rank (stable, cached)."""
+        if area_code not in self._pl_by_rank:
+            self._pl_by_rank[area_code] = sorted(self.pl.get(area_code, []), key=lambda x: x['rank'])
+        return self._pl_by_rank[area_code]
@@ -0,0 +1,175 @@
+"""
+Scaling benchmark: how each pipeline stage grows with areas and parties.
+
+    python scripts/bench_scaling.py --areas 400 1600 6400
+    python scripts/bench_scaling.py --areas 400 --parties 60 250 500 --trace-memory
+    python scripts/bench_scaling.py --areas 400 4000 40000 -- --mc-iterations 10000
+
+For every (areas, parties) size, synth_election.py writes a data tree under
+--work-dir (reused while its parameters match). prepare_data.py then runs
+on it in a fresh process with --no-cache, so every stage is computed, and
+the per-stage wall time, CPU time and peak memory are read back from the
+run's pipeline_profile.json. Arguments after `--` go to prepare_data.py.
+
+The report has one table per metric (stage × size) and, per stage, the
+exponent b of wall ≈ a · n^b fitted by least squares on log-log axes along
+each swept dimension: b ≈ 1 is linear, b > SUPERLINEAR is flagged. Stages
+under MIN_FIT_SECONDS at every size are too noisy to fit. Everything is
+also written to <work-dir>/scaling_report.json.
+"""
+import argparse
+import datetime
+import json
+import os
+import subprocess
+import sys
+
+import numpy as np
+
+from instrument import format_bytes
+from prepare_data import CACHE_DIR, PROFILE_NAME
+from synth_election import MANIFEST, generate
+
+PREPARE_DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'prepare_data.py')
+SUPERLINEAR = 1.2
+MIN_FIT_SECONDS = 0.02
+
+
+def dataset(work_dir, areas, parties, candidates, seed):
+    """Path of the synthetic data tree of one size, generated if missing."""
+    path = os.path.join(work_dir, f'data-a{areas}-p{parties}-c{candidates:g}-s{seed}')
+    try:
+        with open(os.path.join(path, MANIFEST), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if (manifest['areas'], manifest['parties'], manifest['candidates'],
+                manifest['seed']) == (areas, parties, candidates, seed):
+            return path
+    except (OSError, ValueError, KeyError):
+        pass
+    print(f"  🧪 Generating {areas:,} areas × {parties} parties...")
+    generate(path, areas, parties, candidates, seed=seed)
+    return path
+
+
+def run_pipeline(data_dir, out_dir, trace_memory, extra_args):
+    """pipeline_profile.json of one --no-cache run of prepare_data.py on `data_dir`."""
+    profile_file = os.path.join(out_dir, PROFILE_NAME)
+    cmd = [sys.executable, PREPARE_DATA, '--no-cache', '--output', os.path.join(out_dir, 'election_data.json'),
+           '--profile', profile_file, *extra_args]
+    if trace_memory:
+        cmd.append('--trace-memory')
+    env = dict(os.environ, ELECTION_DATA_DIR=data_dir, PYTHONHASHSEED='0')
+    proc = subprocess.run(cmd, env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        sys.stderr.write(proc.stdout[-2000:] + proc.stderr[-4000:])
+        raise SystemExit(f'❌ prepare_data.py failed on {data_dir}')
+    with open(profile_file, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def exponent(sizes, seconds):
+    """Least-squares slope of log(seconds) over log(sizes); None if too small to fit."""
+    if len(sizes) < 2 or max(seconds) < MIN_FIT_SECONDS:
+        return None
+    return float(np.polyfit(np.log(sizes), np.log(np.maximum(seconds, 1e-6)), 1)[0])
+
+
+def table(title, stages, sizes, value, fmt):
+    label = lambda s: f'{s[0]:,}×{s[1]}'
+    lines = [f'  {title}', f"  {'stage':<22}" + ''.join(f'{label(s):>13}' for s in sizes)]
+    for stage in stages:
+        lines.append(f'  {stage:<22}' + ''.join(f'{fmt(value(stage, s)):>13}' for s in sizes))
+    return '\n'.join(lines)
+
+
+def main(areas, parties, candidates=9.0, seed=42, repeat=1, trace_memory=False,
+         work_dir=os.path.join(CACHE_DIR, 'bench'), extra_args=()):
+    sizes = [(a, p) for p in parties for a in areas]
+    runs = {}
+    for a, p in sizes:
+        data_dir = dataset(work_dir, a, p, candidates, seed)
+        out_dir = os.path.join(work_dir, f'out-a{a}-p{p}')
+        profiles = []
+        for r in range(repeat):
+            print(f"  ⏱️ prepare_data.py on {a:,} areas × {p} parties (run {r + 1}/{repeat})...")
+            profiles.append(run_pipeline(data_dir, out_dir, trace_memory, extra_args))
+        # Fastest repeat per stage; memory is the same in every repeat
+        stages = {}
+        for profile in profiles:
+            for row in profile['stages']:
+                best = stages.get(row['stage'])
+                if best is None or row['wallSeconds'] < best['wallSeconds']:
+                    stages[row['stage']] = row
+        runs[(a, p)] = {
+            'areas': a, 'parties': p,
+            'totalWallSeconds': min(profile['totalWallSeconds'] for profile in profiles),
+            'maxRssBytes': max(profile['maxRssBytes'] or 0 for profile in profiles) or None,
+            'stages': stages,
+        }
+
+    stage_names = list(runs[sizes[0]]['stages'])
+    wall = lambda stage, size: runs[size]['stages'].get(stage, {}).get('wallSeconds')
+    fits = {}
+    for stage in stage_names:
+        fits[stage] = {}
+        if len(areas) > 1:
+            fits[stage]['areas'] = exponent(areas, [wall(stage, (a, parties[0])) or 0 for a in areas])
+        if len(parties) > 1:
+            fits[stage]['parties'] = exponent(parties, [wall(stage, (areas[0], p)) or 0 for p in parties])
+    # Slowest stage at the largest size first
+    stage_names.sort(key=lambda stage: -(wall(stage, sizes[-1]) or 0))
+
+    print(table('Wall seconds (areas × parties)', stage_names + ['total'], sizes,
+                lambda stage, size: runs[size]['totalWallSeconds'] if stage == 'total' else wall(stage, size),
+                lambda v: '-' if v is None else f'{v:.3f}'))
+    if trace_memory:
+        print(table('Peak traced memory', stage_names, sizes,
+                    lambda stage, size: runs[size]['stages'].get(stage, {}).get('peakMemoryBytes'), format_bytes))
+    print(table('Process max RSS', ['pipeline'], sizes,
+                lambda stage, size: runs[size]['maxRssBytes'], format_bytes))
+    for dim in ('areas', 'parties'):
+        fitted = [(stage, fits[stage][dim]) for stage in stage_names if fits[stage].get(dim) is not None]
+        if not fitted:
+            continue
+        print(f'  Scaling exponent in {dim} (wall ≈ a·{dim}^b)')
+        for stage, b in sorted(fitted, key=lambda item: -item[1]):
+            flag = '  ⚠️ super-linear' if b > SUPERLINEAR else ''
+            print(f'  {stage:<22} b = {b:5.2f}{flag}')
+
+    report = {
+        'generatedAt': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'candidates': candidates, 'seed': seed, 'repeat': repeat,
+        'traceMemory': trace_memory, 'pipelineArgs': list(extra_args),
+        'runs': [dict(run, stages=list(run['stages'].values())) for run in runs.values()],
+        'exponents': fits,
+    }
+    os.makedirs(work_dir, exist_ok=True)
+    report_path = os.path.join(work_dir, 'scaling_report.json')
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"✅ Scaling report: {report_path}")
+
+
+if __name__ == '__main__':
+    argv = sys.argv[1:]
+    extra = argv[argv.index('--') + 1:] if '--' in argv else []
+    argv = argv[:argv.index('--')] if '--' in argv else argv
+    parser = argparse.ArgumentParser(
+        description='Per-stage time and memory of prepare_data.py on synthetic data of growing size',
+        epilog='arguments after -- are passed to prepare_data.py')
+    parser.add_argument('--areas', type=int, nargs='+', default=[400, 1600, 6400],
+                        help='area counts to run (default: 400 1600 6400)')
+    parser.add_argument('--parties', type=int, nargs='+', default=[60],
+                        help='party counts to run (default: 60)')
+    parser.add_argument('--candidates', type=float, default=9.0,
+                        help='mean constituency candidates per area (default: 9)')
+    parser.add_argument('--seed', type=int, default=42, help='synthetic data seed (default: 42)')
+    parser.add_argument('--repeat', type=int, default=1,
+                        help='runs per size; the fastest time per stage is kept (default: 1)')
+    parser.add_argument('--trace-memory', action='store_true',
+                        help='also record peak memory per stage (slower runs)')
+    parser.add_argument('--work-dir', default=os.path.join(CACHE_DIR, 'bench'),
+                        help='synthetic data, outputs and report (default: visualization/.cache/bench)')
+    args = parser.parse_args(argv)
+    main(sorted(args.areas), sorted(args.parties), args.candidates, args.seed, args.repeat,
+         args.trace_memory, args.work_dir, extra)
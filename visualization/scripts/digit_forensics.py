@@ -0,0 +1,148 @@
+"""
+Batch digit tests over every vote count of every area in one pass.
+
+The input is a flat int array of vote counts plus the area index of each
+count. Digit positions are extracted with integer ops: the power of ten below
+each count is found with searchsorted, so no float log10 is involved. Per-area
+histograms come from a single np.bincount over (area, digit) keys. Chi-square
+statistics and exact p-values are then computed for all areas at once.
+
+    first digit   counts > 0     Benford:  P(d) = log10(1 + 1/d), d = 1..9
+    second digit  counts >= 10   Benford:  P(k) = Σ_d1 log10(1 + 1/(10·d1 + k))
+    last digit    counts >= 10   uniform:  P(k) = 1/10
+"""
+import math
+
+import numpy as np
+
+BENFORD_FIRST = np.array([math.log10(1 + 1 / d) for d in range(1, 10)])
+BENFORD_SECOND = np.array([
+    sum(math.log10(1 + 1 / (10 * d1 + k)) for d1 in range(1, 10)) for k in range(10)
+])
+# None = uniform over the 10 digits, expected count total / 10.0
+UNIFORM_LAST = None
+
+_POW10 = 10 ** np.arange(19, dtype=np.int64)
+
+
+def digit_positions(values):
+    """(first, second, last) digit of each int64 count.
+
+    first is 0 for counts <= 0, second is -1 for counts < 10.
+    """
+    values = np.asarray(values, dtype=np.int64)
+    positive = np.maximum(values, 1)
+    n_digits = np.searchsorted(_POW10, positive, side='right')  # 1 for 1..9
+    first = np.where(values > 0, positive // _POW10[n_digits - 1], 0)
+    second = np.where(values >= 10, (positive // _POW10[np.maximum(n_digits - 2, 0)]) % 10, -1)
+    last = values % 10
+    return first, second, last
+
+
+def area_histograms(area_idx, digits, mask, n_areas, n_digits):
+    """(n_areas, n_digits) int64 counts of `digits` where `mask` is set."""
+    keys = area_idx[mask] * n_digits + digits[mask]
+    return np.bincount(keys, minlength=n_areas * n_digits).reshape(n_areas, n_digits)
+
+
+def chi_square(counts, probs):
+    """Goodness-of-fit chi-square of each row of `counts` against `probs`.
+
+    probs=None tests against the uniform distribution (expected total / D).
+    Benford statistics accumulate their terms digit by digit, like a scalar
+    `chi2 += (o - e) ** 2 / e` loop. The uniform statistic sums each row
+    with the builtin sum(), which is compensated since Python 3.12.
+    """
+    counts = np.atleast_2d(counts)
+    totals = counts.sum(axis=1)
+    n_digits = counts.shape[1]
+    if probs is None:
+        expected = totals / float(n_digits)
+        safe = np.where(expected > 0, expected, 1.0)[:, None]
+        terms = (counts - expected[:, None]) ** 2 / safe
+        return np.array([sum(row) for row in terms.tolist()], dtype=np.float64)
+    chi2 = np.zeros(len(counts))
+    for d in range(n_digits):
+        expected = probs[d] * totals
+        safe = np.where(expected > 0, expected, 1.0)
+        chi2 += np.where(expected > 0, (counts[:, d] - expected) ** 2 / safe, 0.0)
+    return chi2
+
+
+_erfc = np.frompyfunc(math.erfc, 1, 1)
+
+
+def chi2_sf(x, df):
+    """Exact chi-square survival function P(X >= x) for integer df >= 1.
+
+    Closed form of the regularized upper incomplete gamma Q(df/2, x/2):
+      even df = 2m:     e^(-x/2) Σ_{k<m} (x/2)^k / k!
+      odd  df = 2m + 1: erfc(√(x/2)) + e^(-x/2) Σ_{k<m} (x/2)^(k+½) / Γ(k+3/2)
+    Terms are evaluated in log space so large x underflows cleanly to 0.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    half = np.maximum(x, 0.0) / 2
+    log_half = np.log(np.where(half > 0, half, 1.0))
+    m = df // 2
+    if df % 2 == 0:
+        sf = np.zeros_like(half)
+        offset = 0.0
+    else:
+        sf = np.asarray(_erfc(np.sqrt(half)), dtype=np.float64)
+        offset = 0.5
+    for k in range(m):
+        a = k + offset
+        term = np.exp(-half + a * log_half - math.lgamma(a + 1))
+        sf += np.where(half > 0, term, 1.0 if a == 0 else 0.0)
+    return np.clip(np.where(x > 0, sf, 1.0), 0.0, 1.0)
+
+
+class DigitTest:
+    """Per-area digit histograms, chi-square and p-values for one digit test.
+
+    counts : (A, D) digit counts; digits[d] is the digit of column d
+    total : (A,) numbers tested per area
+    chi2, p_value : (A,) statistic and exact p-value (df = D - 1)
+    """
+
+    def __init__(self, counts, digits, probs):
+        self.counts = counts
+        self.digits = digits
+        self.probs = probs
+        self.df = counts.shape[1] - 1
+        self.total = counts.sum(axis=1)
+        self.chi2 = chi_square(counts, probs)
+        self.p_value = chi2_sf(self.chi2, self.df)
+
+    def global_test(self, rows):
+        """(counts, total, chi2, p_value) of the summed histogram of `rows`."""
+        counts = self.counts[rows].sum(axis=0)
+        chi2 = float(chi_square(counts, self.probs)[0])
+        return counts, int(counts.sum()), chi2, float(chi2_sf(chi2, self.df))
+
+
+def digit_histograms(values, area_idx, n_areas):
+    """(first, second, last) digit counts per area: (A, 9), (A, 10), (A, 10).
+
+    values : (N,) vote counts, area_idx : (N,) row of each count in 0..n_areas-1
+    """
+    values = np.asarray(values, dtype=np.int64)
+    area_idx = np.asarray(area_idx, dtype=np.int64)
+    first, second, last = digit_positions(values)
+    two_digit = values >= 10
+    first_counts = area_histograms(area_idx, first, values > 0, n_areas, 10)[:, 1:]
+    second_counts = area_histograms(area_idx, second, two_digit, n_areas, 10)
+    last_counts = area_histograms(area_idx, last, two_digit, n_areas, 10)
+    return first_counts, second_counts, last_counts
+
+
+def tests_from_counts(first_counts, second_counts, last_counts):
+    """First / second / last digit tests from per-area histograms (digit_histograms rows).
+
+    Returns {'first': DigitTest, 'second': DigitTest, 'last': DigitTest}.
+    """
+    return {
+        'first': DigitTest(first_counts, list(range(1, 10)), BENFORD_FIRST),
+        'second': DigitTest(second_counts, list(range(10)), BENFORD_SECOND),
+        'last': DigitTest(last_counts, list(range(10)), UNIFORM_LAST),
+    }
@@ -0,0 +1,283 @@
+"""
+Golden-output regression check for prepare_data.py.
+
+    python scripts/golden_check.py freeze                 # reference output
+    ... rework a stage ...
+    python scripts/golden_check.py check                  # diff + speedup
+    python scripts/golden_check.py check --tol 'klimekAnalysis.*=0.01'
+
+`freeze` runs prepare_data.py with --no-cache on a fixed dataset and seed
+(arguments after `--` are passed on and recorded) and keeps its
+election_data.json, pipeline_profile.json and run time in --golden-dir.
+`check` runs the candidate (this tree, or --script) with the same data and
+arguments, then compares the two documents section by section:
+
+    numbers   |candidate - golden| <= abs + rel * |golden|; (abs, rel) is
+              the first TOLERANCES pattern matching the field's path, e.g.
+              ensembleAnalysis[].entropyWeights.gap, else DEFAULT_TOLERANCE
+    lists     of records with an identity key (areaCode, partyCode, ...)
+              are matched by key, so a changed order alone is not a
+              difference (unless --strict-order); other lists element-wise
+    others    equal
+
+It prints the differences of each section, wall time per stage for both
+runs and the overall speedup, and exits with status 1 on any difference.
+"""
+import argparse
+import datetime
+import fnmatch
+import hashlib
+import json
+import math
+import os
+import shutil
+import subprocess
+import sys
+import time
+
+from prepare_data import CACHE_DIR, DATA_DIR, PROFILE_NAME
+
+PREPARE_DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'prepare_data.py')
+GOLDEN_FILE = 'golden.json'
+
+DEFAULT_TOLERANCE = (1e-9, 1e-9)  # (abs, rel)
+# First match wins; --tol patterns are tried before these
+TOLERANCES = [
+    # Scores are published to 0.1: allow one display step
+    ('*.suspicionScore', 0.1, 0.0),
+    ('*.rawScore', 0.1, 0.0),
+    ('*.finalScore', 0.1, 0.0),
+    # Permutation / Monte Carlo p-values: Monte Carlo error of 10k draws
+    ('ensembleAnalysis[].pValue', 0.01, 0.0),
+    ('ensembleAnalysis[].moranP', 0.02, 0.0),
+    ('nullModelAnalysis.*pValueMC', 0.01, 0.0),
+    ('nullModelAnalysis.meta.mcPValueGlobal', 0.01, 0.0),
+    # Published to 4 decimals
+    ('*entropyWeights.*', 1e-4, 0.0),
+    # Benford / digit χ² statistics (3 decimals)
+    ('*hi2', 1e-3, 1e-6),
+]
+IDENTITY_KEYS = ('areaCode', 'partyCode', 'province', 'provinceEng', 'region', 'number',
+                 'digit', 'bucket', 'party', 'party66', 'party69', 'fromParty', 'num')
+
+
+def data_digest(data_dir):
+    """sha256 over the relative paths and contents of every file under `data_dir`."""
+    h = hashlib.sha256()
+    for root, dirs, files in os.walk(data_dir):
+        dirs.sort()
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            h.update(os.path.relpath(path, data_dir).encode('utf-8') + b'\0')
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b''):
+                    h.update(chunk)
+    return h.hexdigest()
+
+
+def profile_args(script, path):
+    """['--profile', path] if `script` has that option; older trees write the
+    profile next to the output file, which is `path` as well."""
+    with open(script, 'r', encoding='utf-8') as f:
+        return ['--profile', path] if "'--profile'" in f.read() else []
+
+
+def run(script, data_dir, out_dir, args):
+    """(wall seconds, profile or None) of one --no-cache run writing to `out_dir`."""
+    profile_file = os.path.join(out_dir, PROFILE_NAME)
+    cmd = [sys.executable, script, '--no-cache', '--output', os.path.join(out_dir, 'election_data.json'),
+           *profile_args(script, profile_file), *args]
+    env = dict(os.environ, ELECTION_DATA_DIR=data_dir, PYTHONHASHSEED='0')
+    start = time.perf_counter()
+    proc = subprocess.run(cmd, env=env, capture_output=True, text=True)
+    wall = time.perf_counter() - start
+    if proc.returncode != 0:
+        sys.stderr.write(proc.stdout[-2000:] + proc.stderr[-4000:])
+        raise SystemExit(f'❌ {script} failed')
+    try:
+        with open(profile_file, 'r', encoding='utf-8') as f:
+            return wall, json.load(f)
+    except OSError:
+        return wall, None
+
+
+def tolerance(path, tolerances):
+    for pattern, abs_tol, rel_tol in tolerances:
+        if fnmatch.fnmatchcase(path, pattern):
+            return abs_tol, rel_tol
+    return DEFAULT_TOLERANCE
+
+
+def identity_key(golden, candidate):
+    """Key identifying the records of two lists of dicts, or None."""
+    if not golden or not all(isinstance(x, dict) for x in golden + candidate):
+        return None
+    for key in IDENTITY_KEYS:
+        for items in (golden, candidate):
+            values = [json.dumps(x.get(key), sort_keys=True) for x in items if key in x]
+            if len(values) != len(items) or len(set(values)) != len(values):
+                break
+        else:
+            return key
+    return None
+
+
+def compare(golden, candidate, pattern, shown, tolerances, strict_order, diffs):
+    """Append (path, message) for each difference between two JSON values."""
+    if isinstance(golden, dict) and isinstance(candidate, dict):
+        for key in golden:
+            if key not in candidate:
+                diffs.append((f'{shown}.{key}', 'missing'))
+            else:
+                compare(golden[key], candidate[key], f'{pattern}.{key}', f'{shown}.{key}',
+                        tolerances, strict_order, diffs)
+        for key in candidate.keys() - golden.keys():
+            diffs.append((f'{shown}.{key}', 'unexpected field'))
+    elif isinstance(golden, list) and isinstance(candidate, list):
+        key = identity_key(golden, candidate)
+        if key is None:
+            if len(golden) != len(candidate):
+                diffs.append((shown, f'length {len(candidate)} != {len(golden)}'))
+            for i, (g, c) in enumerate(zip(golden, candidate)):
+                compare(g, c, f'{pattern}[]', f'{shown}[{i}]', tolerances, strict_order, diffs)
+            return
+        by_key = {json.dumps(x[key], sort_keys=True): x for x in candidate}
+        golden_keys = [json.dumps(x[key], sort_keys=True) for x in golden]
+        missing = [k for k in golden_keys if k not in by_key]
+        extra = sorted(by_key.keys() - set(golden_keys))
+        if missing:
+            diffs.append((shown, f'{len(missing)} {key} missing: {", ".join(missing[:5])}'))
+        if extra:
+            diffs.append((shown, f'{len(extra)} unexpected {key}: {", ".join(extra[:5])}'))
+        if strict_order and not missing and not extra and golden_keys != list(by_key):
+            diffs.append((shown, f'order of {key} differs'))
+        for k, g in zip(golden_keys, golden):
+            if k in by_key:
+                compare(g, by_key[k], f'{pattern}[]', f'{shown}[{json.loads(k)}]',
+                        tolerances, strict_order, diffs)
+    elif (isinstance(golden, (int, float)) and isinstance(candidate, (int, float))
+          and not isinstance(golden, bool) and not isinstance(candidate, bool)):
+        if golden == candidate or (math.isnan(golden) and math.isnan(candidate)):
+            return
+        abs_tol, rel_tol = tolerance(pattern, tolerances)
+        if not abs(candidate - golden) <= abs_tol + rel_tol * abs(golden):
+            diffs.append((shown, f'{candidate!r} != {golden!r} (Δ {candidate - golden:+.6g}, '
+                                 f'tol {abs_tol:g} + {rel_tol:g}·|golden|)'))
+    elif golden != candidate:
+        diffs.append((shown, f'{json.dumps(candidate, ensure_ascii=False)[:80]} != '
+                             f'{json.dumps(golden, ensure_ascii=False)[:80]}'))
+
+
+def freeze(golden_dir, script, data_dir, args):
+    os.makedirs(golden_dir, exist_ok=True)
+    print(f"  ⏱️ Reference run: {script}")
+    wall, profile = run(script, data_dir, golden_dir, args)
+    meta = {
+        'frozenAt': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'script': script,
+        'dataDir': os.path.abspath(data_dir),
+        'dataDigest': data_digest(data_dir),
+        'args': list(args),
+        'wallSeconds': round(wall, 4),
+        'totalWallSeconds': profile['totalWallSeconds'] if profile else None,
+    }
+    with open(os.path.join(golden_dir, GOLDEN_FILE), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    print(f"✅ Golden output frozen in {golden_dir} ({wall:.2f} s)")
+
+
+def check(golden_dir, script, tolerances, strict_order=False, max_diffs=10):
+    with open(os.path.join(golden_dir, GOLDEN_FILE), 'r', encoding='utf-8') as f:
+        meta = json.load(f)
+    if data_digest(meta['dataDir']) != meta['dataDigest']:
+        raise SystemExit(f"❌ {meta['dataDir']} changed since the golden run; freeze again")
+    out_dir = os.path.join(golden_dir, 'candidate')
+    if os.path.isdir(out_dir):
+        shutil.rmtree(out_dir)
+    os.makedirs(out_dir)
+    print(f"  ⏱️ Candidate run: {script} {' '.join(meta['args'])}")
+    wall, profile = run(script, meta['dataDir'], out_dir, meta['args'])
+
+    with open(os.path.join(golden_dir, 'election_data.json'), 'r', encoding='utf-8') as f:
+        golden = json.load(f)
+    with open(os.path.join(out_dir, 'election_data.json'), 'r', encoding='utf-8') as f:
+        candidate = json.load(f)
+
+    total = 0
+    for section in list(golden) + [s for s in candidate if s not in golden]:
+        diffs = []
+        if section not in candidate:
+            diffs.append((section, 'missing section'))
+        elif section not in golden:
+            diffs.append((section, 'unexpected section'))
+        else:
+            compare(golden[section], candidate[section], section, section,
+                    tolerances, strict_order, diffs)
+        total += len(diffs)
+        if not diffs:
+            print(f"  ✅ {section}")
+            continue
+        print(f"  ❌ {section}: {len(diffs)} difference(s)")
+        for path, message in diffs[:max_diffs]:
+            print(f"       {path}: {message}")
+        if len(diffs) > max_diffs:
+            print(f"       ... {len(diffs) - max_diffs} more")
+
+    try:
+        with open(os.path.join(golden_dir, PROFILE_NAME), 'r', encoding='utf-8') as f:
+            golden_profile = json.load(f)
+    except OSError:
+        golden_profile = None
+    if golden_profile and profile:
+        before = {row['stage']: row['wallSeconds'] for row in golden_profile['stages']}
+        after = {row['stage']: row['wallSeconds'] for row in profile['stages']}
+        print(f"  {'stage':<22} {'golden s':>9} {'candidate s':>12} {'speedup':>8}")
+        for stage in sorted(before.keys() & after.keys(), key=lambda s: -before[s]):
+            speedup = f'{before[stage] / after[stage]:.2f}x' if after[stage] > 0 else '-'
+            print(f"  {stage:<22} {before[stage]:>9.3f} {after[stage]:>12.3f} {speedup:>8}")
+    print(f"  ⚡ Speedup: {meta['wallSeconds'] / wall:.2f}x "
+          f"({meta['wallSeconds']:.2f} s → {wall:.2f} s per run)")
+    if total:
+        print(f"❌ {total} difference(s) from the golden output")
+        return 1
+    print("✅ Output matches the golden output")
+    return 0
+
+
+def parse_tolerance(text):
+    """'PATTERN=ABS[,REL]' → (pattern, abs, rel)."""
+    pattern, _, values = text.rpartition('=')
+    if not pattern:
+        raise argparse.ArgumentTypeError(f'expected PATTERN=ABS[,REL], got {text!r}')
+    abs_tol, _, rel_tol = values.partition(',')
+    return pattern, float(abs_tol), float(rel_tol or 0.0)
+
+
+if __name__ == '__main__':
+    argv = sys.argv[1:]
+    extra = argv[argv.index('--') + 1:] if '--' in argv else []
+    argv = argv[:argv.index('--')] if '--' in argv else argv
+    parser = argparse.ArgumentParser(description='Compare prepare_data.py output with a frozen golden run',
+                                     epilog='arguments after -- are passed to prepare_data.py by freeze')
+    parser.add_argument('command', choices=['freeze', 'check'])
+    parser.add_argument('--golden-dir', default=os.path.join(CACHE_DIR, 'golden'),
+                        help='golden output and metadata (default: visualization/.cache/golden)')
+    parser.add_argument('--script', default=PREPARE_DATA,
+                        help='prepare_data.py to run (default: this tree\'s)')
+    parser.add_argument('--data-dir', default=DATA_DIR,
+                        help='freeze: data/ tree to run on, e.g. from synth_election.py (default: data/)')
+    parser.add_argument('--tol', action='append', type=parse_tolerance, default=[],
+                        metavar='PATTERN=ABS[,REL]',
+                        help='check: tolerance for fields whose path matches PATTERN (repeatable)')
+    parser.add_argument('--strict-order', action='store_true',
+                        help='check: also report records listed in a different order')
+    parser.add_argument('--max-diffs', type=int, default=10,
+                        help='check: differences shown per section (default: 10)')
+    args = parser.parse_args(argv)
+    if args.command == 'freeze':
+        freeze(args.golden_dir, args.script, args.data_dir, extra)
+    else:
+        if extra:
+            parser.error('check reuses the arguments recorded by freeze')
+        sys.exit(check(args.golden_dir, args.script, args.tol + TOLERANCES,
+                       args.strict_order, args.max_diffs))
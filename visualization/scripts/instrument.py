@@ -0,0 +1,121 @@
+"""
+Per-stage resource measurements for the pipeline profile.
+
+For each stage (run or loaded from the stage cache) the runner records
+
+    wallSeconds      time.perf_counter() around the stage
+    cpuSeconds       time.process_time() of the process that ran it
+    filesRead        files opened for reading (the builtin `open` audit
+    bytesRead        event, which also covers np.load), and their sizes
+    peakMemoryBytes  tracemalloc high-water mark above the memory held when
+                     the stage started; None unless memory tracing is on,
+                     since tracemalloc slows the pipeline ~2.5x
+    maxRssBytes      the process's peak resident set size after the stage
+                     (resource.getrusage; None where unavailable)
+
+Stages running in pool workers are measured inside the worker.
+"""
+import os
+import sys
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+_io = None  # [files, bytes] of the innermost active Measure in this process
+_hooked = False
+
+
+def _audit(event, args):
+    if event != 'open' or _io is None:
+        return
+    path, mode, flags = args
+    if not isinstance(path, (str, bytes, os.PathLike)):
+        return
+    if mode is not None:
+        if any(c in mode for c in 'wax+'):
+            return
+    elif flags & (os.O_WRONLY | os.O_RDWR):
+        return
+    try:
+        size = os.stat(path).st_size
+    except OSError:
+        return
+    _io[0] += 1
+    _io[1] += size
+
+
+def _max_rss():
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+
+class Measure:
+    """Context manager collecting the metrics of one stage into `.metrics`."""
+
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.metrics = None
+
+    def __enter__(self):
+        global _io, _hooked
+        if not _hooked:
+            sys.addaudithook(_audit)
+            _hooked = True
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+            self._base = tracemalloc.get_traced_memory()[0]
+        self._outer = _io
+        _io = [0, 0]
+        self._wall = time.perf_counter()
+        self._cpu = time.process_time()
+        return self
+
+    def __exit__(self, *exc):
+        global _io
+        files, nbytes = _io
+        _io = self._outer
+        if _io is not None:  # nested: reads also count for the enclosing Measure
+            _io[0] += files
+            _io[1] += nbytes
+        peak = None
+        if self.trace_memory and tracemalloc.is_tracing():
+            peak = max(0, tracemalloc.get_traced_memory()[1] - self._base)
+        self.metrics = {
+            'wallSeconds': time.perf_counter() - self._wall,
+            'cpuSeconds': time.process_time() - self._cpu,
+            'peakMemoryBytes': peak,
+            'maxRssBytes': _max_rss(),
+            'filesRead': files,
+            'bytesRead': nbytes,
+        }
+
+
+def format_bytes(n):
+    if n is None:
+        return '-'
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if abs(n) < 1024 or unit == 'GB':
+            return f'{n:.0f} {unit}' if unit == 'B' else f'{n:.1f} {unit}'
+        n /= 1024
+
+
+def summary_table(rows):
+    """Text table of profile rows, slowest stage first."""
+    header = f"  {'stage':<22} {'status':<7} {'wall s':>7} {'cpu s':>7} {'peak mem':>10} {'files':>6} {'read':>10}"
+    lines = [header, '  ' + '─' * (len(header) - 2)]
+    for row in sorted(rows, key=lambda r: r['wallSeconds'], reverse=True):
+        lines.append(
+            f"  {row['stage']:<22} {row['status']:<7} {row['wallSeconds']:>7.3f} "
+            f"{row['cpuSeconds']:>7.3f} {format_bytes(row['peakMemoryBytes']):>10} "
+            f"{row['filesRead']:>6} {format_bytes(row['bytesRead']):>10}"
+        )
+    return '\n'.join(lines)
@@ -0,0 +1,63 @@
+"""
+Write public/election_data.json, re-rendering only the parts that changed.
+
+json.dump(..., indent=2) always runs the pure-Python encoder, which is
+several times slower than the C encoder used for compact output. Between
+two snapshots of the count, most of the document is unchanged. So the
+indented text of every item of a top-level list, and of every other
+top-level value, is cached under
+
+    sha1(indent prefix + compact C-encoder JSON of the value)
+
+Only values missing from the cache go through the indenting encoder. The
+text is assembled exactly as json.dump(doc, f, ensure_ascii=False,
+indent=2) lays it out, so the file is byte-identical either way. JSON
+strings never contain a raw newline, so re-indenting rendered text with
+str.replace('\n', ...) is safe.
+"""
+import hashlib
+import json
+import os
+import pickle
+
+
+def write_json(path, doc, cache_dir=None):
+    """json.dump(doc, f, ensure_ascii=False, indent=2) to `path`, with a text cache."""
+    if cache_dir is None:
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(doc, f, ensure_ascii=False, indent=2)
+        return
+
+    cache_path = os.path.join(cache_dir, 'output', 'json-text.pickle')
+    try:
+        with open(cache_path, 'rb') as f:
+            cached = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError):
+        cached = {}
+    used = {}
+
+    def text(value, indent):
+        key = hashlib.sha1((indent + json.dumps(value, ensure_ascii=False)).encode('utf-8')).digest()
+        rendered = cached.get(key)
+        if rendered is None:
+            rendered = json.dumps(value, ensure_ascii=False, indent=2).replace('\n', '\n' + indent)
+        used[key] = rendered
+        return rendered
+
+    parts = []
+    for key, value in doc.items():
+        if isinstance(value, list) and value:
+            body = '[\n    ' + ',\n    '.join([text(item, '    ') for item in value]) + '\n  ]'
+        else:
+            body = text(value, '  ')
+        parts.append(json.dumps(key, ensure_ascii=False) + ': ' + body)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('{\n  ' + ',\n  '.join(parts) + '\n}' if parts else '{}')
+
+    # Keep only the text of this document
+    if used.keys() != cached.keys():
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        tmp = f'{cache_path}.{os.getpid()}.tmp'
+        with open(tmp, 'wb') as f:
+            pickle.dump(used, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, cache_path)
@@ -0,0 +1,293 @@
+"""
+Content-addressed cache of decoded pipeline inputs.
+
+Every source file is identified by the SHA-256 of its bytes. Decoded results
+are stored under that hash, so an unchanged input is loaded from the cache and
+a changed input invalidates only the entries built from it.
+
+Layout under the cache directory:
+
+    files.json              path -> [size, mtime_ns, sha256] (skip re-hashing)
+    json/<sha256>.pickle    decoded JSON document (dicts / lists)
+    derived/<name>-<key>.pickle
+                            small result computed from one input file; key
+                            hashes the file, the builder's code and params
+    tables/<key>/           one directory of per-area result files as
+                            column .npy arrays
+    dirs/<name>.json        last table key and per-file hashes of a directory
+
+A per-area directory (data/mp, data/pl) is stored as one columnar table:
+entries of all files concatenated, one .npy per field (strings stored as a
+lookup table plus int32 index), and `codes` / `offsets` arrays delimiting
+each file's rows. When some files change, rows of
+the unchanged files are copied from the previous table and only the changed
+files are parsed again.
+"""
+import glob
+import hashlib
+import json
+import os
+import pickle
+import shutil
+from itertools import repeat
+
+import numpy as np
+
+from stage_runner import code_fingerprint
+
+CACHE_VERSION = 2
+
+
+class ParseCache:
+    """Load JSON inputs through a hash-keyed cache under `cache_dir`."""
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        self.hits = 0
+        self.misses = 0
+        self.files_parsed = 0
+        self.bytes_parsed = 0
+        self._index_path = os.path.join(cache_dir, 'files.json')
+        self._index = {}
+        self._index_dirty = False
+        try:
+            with open(self._index_path, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+            if index.get('version') == CACHE_VERSION:
+                self._index = index.get('files', {})
+        except (OSError, ValueError):
+            pass
+
+    # ── hashing ──────────────────────────────────────────────────
+
+    def file_hash(self, path):
+        """SHA-256 of a file; reuses the stored hash while size and mtime match."""
+        key = os.path.abspath(path)
+        st = os.stat(path)
+        known = self._index.get(key)
+        if known and known[0] == st.st_size and known[1] == st.st_mtime_ns:
+            return known[2]
+        with open(path, 'rb') as f:
+            digest = hashlib.sha256(f.read()).hexdigest()
+        self._index[key] = [st.st_size, st.st_mtime_ns, digest]
+        self._index_dirty = True
+        return digest
+
+    def save_index(self):
+        """Write the path -> hash index if any file was (re-)hashed."""
+        if not self._index_dirty:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        _atomic_write_bytes(
+            self._index_path,
+            json.dumps({'version': CACHE_VERSION, 'files': self._index}).encode('utf-8'),
+        )
+        self._index_dirty = False
+
+    # ── whole documents ──────────────────────────────────────────
+
+    def load_json(self, path):
+        """Decoded JSON document, from json/<sha256>.pickle when present."""
+        digest = self.file_hash(path)
+        cached = os.path.join(self.cache_dir, 'json', f'{digest}.pickle')
+        try:
+            with open(cached, 'rb') as f:
+                doc = pickle.load(f)
+            self.hits += 1
+            return doc
+        except (OSError, pickle.UnpicklingError, EOFError):
+            pass
+        with open(path, 'rb') as f:
+            raw = f.read()
+        doc = json.loads(raw)
+        self.misses += 1
+        self.files_parsed += 1
+        self.bytes_parsed += len(raw)
+        os.makedirs(os.path.dirname(cached), exist_ok=True)
+        _atomic_write_bytes(cached, pickle.dumps(doc, protocol=pickle.HIGHEST_PROTOCOL))
+        return doc
+
+    def load_derived(self, path, name, build, params=None):
+        """build(path) memoised under derived/<name>-<key>.pickle.
+
+        For small results computed from one input file (e.g. the province
+        adjacency derived from the map polygons). The key covers the file's
+        hash, code_fingerprint(build) and `params` (values build closes
+        over), so editing the builder or its parameters rebuilds the entry.
+        """
+        key = hashlib.sha256('\0'.join([
+            self.file_hash(path), code_fingerprint(build), repr(sorted((params or {}).items())),
+        ]).encode('utf-8')).hexdigest()
+        cached = os.path.join(self.cache_dir, 'derived', f'{name}-{key}.pickle')
+        try:
+            with open(cached, 'rb') as f:
+                value = pickle.load(f)
+            self.hits += 1
+            return value
+        except (OSError, pickle.UnpicklingError, EOFError):
+            pass
+        value = build(path)
+        self.misses += 1
+        os.makedirs(os.path.dirname(cached), exist_ok=True)
+        _atomic_write_bytes(cached, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+        return value
+
+    # ── per-area result directories ──────────────────────────────
+
+    def load_entries_dir(self, directory):
+        """{code: entries} for every <code>.json in `directory`.
+
+        Equivalent to json.load(f).get('entries', []) per file, served from a
+        columnar table keyed on the hashes of all files in the directory.
+        """
+        paths = sorted(glob.glob(os.path.join(directory, '*.json')))
+        codes = [os.path.basename(p).replace('.json', '') for p in paths]
+        hashes = [self.file_hash(p) for p in paths]
+        key = hashlib.sha256(
+            ''.join(f'{c}:{h}\n' for c, h in zip(codes, hashes)).encode('utf-8')
+        ).hexdigest()
+
+        table_dir = os.path.join(self.cache_dir, 'tables', key)
+        table = _read_table(table_dir)
+        if table is not None:
+            self.hits += len(paths)
+            return table
+
+        # Reuse rows of unchanged files from the directory's previous table
+        manifest_path = os.path.join(
+            self.cache_dir, 'dirs',
+            hashlib.sha1(os.path.abspath(directory).encode('utf-8')).hexdigest()[:16] + '.json',
+        )
+        previous, previous_hashes, previous_key = {}, {}, None
+        try:
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+            previous_key = manifest['key']
+            previous_hashes = manifest['files']
+            previous = _read_table(os.path.join(self.cache_dir, 'tables', previous_key)) or {}
+        except (OSError, ValueError, KeyError):
+            pass
+
+        result = {}
+        for path, code, digest in zip(paths, codes, hashes):
+            if code in previous and previous_hashes.get(code) == digest:
+                result[code] = previous[code]
+                self.hits += 1
+                continue
+            with open(path, 'rb') as f:
+                raw = f.read()
+            result[code] = json.loads(raw).get('entries', [])
+            self.misses += 1
+            self.files_parsed += 1
+            self.bytes_parsed += len(raw)
+
+        if _write_table(table_dir, result):
+            os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+            _atomic_write_bytes(manifest_path, json.dumps(
+                {'key': key, 'files': dict(zip(codes, hashes))}).encode('utf-8'))
+            if previous_key and previous_key != key:
+                shutil.rmtree(os.path.join(self.cache_dir, 'tables', previous_key),
+                              ignore_errors=True)
+        return result
+
+
+# ── columnar table encoding ──────────────────────────────────────
+
+def _encode_column(values):
+    """{suffix: array} for a list of JSON scalars, or None if not columnar.
+
+    Strings are dictionary-encoded: `.lut` holds the distinct values and
+    `.npy` the int32 index of each row. A float column keeps an `.int` mask
+    of rows that were JSON integers (votePercent is 0 or 100 in some files)
+    so they decode back to int.
+    """
+    kinds = {type(v) for v in values}
+    try:
+        if kinds <= {str}:
+            lut, index = np.unique(np.array(values, dtype=str), return_inverse=True)
+            return {'lut': lut, 'npy': index.astype(np.int32)}
+        if kinds <= {int}:
+            return {'npy': np.array(values, dtype=np.int64)}
+        if kinds <= {int, float}:
+            return {'npy': np.array(values, dtype=np.float64),
+                    'int': np.array([type(v) is int for v in values], dtype=bool)}
+    except OverflowError:
+        pass
+    return None
+
+
+def _write_table(table_dir, result):
+    """Store {code: entries} as column arrays; False if entries are not flat."""
+    codes = list(result)
+    fields = []
+    for entries in result.values():
+        for e in entries:
+            for k in e:
+                if k not in fields:
+                    fields.append(k)
+    rows = [e for code in codes for e in result[code]]
+    if (rows and not fields) or any(tuple(e) != tuple(fields) for e in rows):
+        return False
+    columns = []
+    for k in fields:
+        encoded = _encode_column([e[k] for e in rows])
+        if encoded is None:
+            return False
+        columns.append(encoded)
+
+    tmp_dir = table_dir + '.tmp'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    offsets = np.zeros(len(codes) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(result[c]) for c in codes])
+    np.save(os.path.join(tmp_dir, 'codes.npy'), np.array(codes, dtype=str))
+    np.save(os.path.join(tmp_dir, 'offsets.npy'), offsets)
+    for i, encoded in enumerate(columns):
+        for suffix, array in encoded.items():
+            np.save(os.path.join(tmp_dir, f'col{i}.{suffix}.npy'), array)
+    meta = {
+        'version': CACHE_VERSION,
+        'fields': [{'name': k, 'parts': sorted(c)} for k, c in zip(fields, columns)],
+    }
+    with open(os.path.join(tmp_dir, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+    shutil.rmtree(table_dir, ignore_errors=True)
+    os.replace(tmp_dir, table_dir)
+    return True
+
+
+def _read_table(table_dir):
+    """{code: entries} rebuilt from a table directory, or None if missing."""
+    try:
+        with open(os.path.join(table_dir, 'meta.json'), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get('version') != CACHE_VERSION:
+            return None
+
+        def part(name):
+            return np.load(os.path.join(table_dir, f'{name}.npy'))
+
+        codes = part('codes').tolist()
+        offsets = part('offsets').tolist()
+        names, columns = [], []
+        for i, field in enumerate(meta['fields']):
+            values = part(f'col{i}.npy').tolist()
+            if 'lut' in field['parts']:
+                lut = part(f'col{i}.lut').tolist()
+                values = [lut[j] for j in values]
+            if 'int' in field['parts']:
+                for r in np.flatnonzero(part(f'col{i}.int')).tolist():
+                    values[r] = int(values[r])
+            names.append(field['name'])
+            columns.append(values)
+    except (OSError, ValueError, KeyError):
+        return None
+    rows = list(map(dict, map(zip, repeat(names), zip(*columns))))
+    return {code: rows[offsets[i]:offsets[i + 1]] for i, code in enumerate(codes)}
+
+
+def _atomic_write_bytes(path, data):
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
@@ -0,0 +1,70 @@
+"""
+Chunked permutation test for the ensemble suspicion score.
+
+Null model: every feature column is shuffled independently across areas and
+the entropy-weighted sum is recomputed, giving one null score per area per
+permutation. All null scores are pooled, and an area's p-value is the share
+of pooled null scores >= its observed score.
+
+Permutations are generated `block_size` at a time as (block, areas) matrices.
+Each block only updates exceedance counts per distinct observed score, so
+memory is O(block_size × areas) however many permutations are run. Nothing
+close to n_permutations × areas is ever stored or sorted.
+"""
+import numpy as np
+
+from rng_streams import block_seed, block_sizes, map_blocks
+
+
+def exceedance_counts(null_scores, observed_sorted):
+    """# of `null_scores` >= each value of ascending `observed_sorted`."""
+    # k = how many observed values are <= each null score; a null score
+    # reaches observed_sorted[i] exactly when k > i
+    k = np.searchsorted(observed_sorted, np.ravel(null_scores), side='right')
+    hist = np.bincount(k, minlength=len(observed_sorted) + 1)
+    return np.cumsum(hist[::-1])[::-1][1:]
+
+
+def _exceedance_block(task):
+    """Exceedance counts of one block of permutations drawn from its own seed."""
+    features, weights, observed_sorted, size, seq = task
+    rng = np.random.default_rng(seq)
+    scores = np.zeros((size, features.shape[1]))
+    for row, w in zip(features, weights):
+        scores += rng.permuted(np.tile(row, (size, 1)), axis=1) * w
+    return exceedance_counts(scores, observed_sorted)
+
+
+def permutation_p_values(features, weights, observed, n_permutations,
+                         block_size=1000, seed=42, progress=None, jobs=1):
+    """Pooled permutation p-value of each observed score.
+
+    features : (F, A) feature matrix, one row per weighted feature
+    weights : (F,) feature weights, summed in row order
+    observed : (N,) scores to test
+    seed : int or np.random.SeedSequence; block k draws from its k-th child,
+        so the result is the same for any `jobs` worker-process count
+    Returns (N,) float p-values = exceedances / (n_permutations × A).
+    `progress(done, total)` is called after every block when given.
+    """
+    stage = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+    features = np.asarray(features, dtype=np.float64)
+    observed = np.asarray(observed, dtype=np.float64)
+    n_areas = features.shape[1]
+    uniq, inverse = np.unique(observed, return_inverse=True)
+    exceed = np.zeros(len(uniq), dtype=np.int64)
+
+    sizes = block_sizes(n_permutations, block_size)
+    tasks = [(features, weights, uniq, size, block_seed(stage, k))
+             for k, size in enumerate(sizes)]
+    done = 0
+    for size, counts in zip(sizes, map_blocks(_exceedance_block, tasks, jobs)):
+        exceed += counts
+        done += size
+        if progress:
+            progress(done, n_permutations)
+
+    null_len = n_permutations * n_areas
+    if null_len == 0:
+        return np.ones(len(observed))
+    return exceed[inverse] / null_len
@@ -1,21 +1,70 @@
 """
 Pre-process election data into a single JSON file for React visualization.
 """
+import argparse
+import datetime
 import json
+import math
 import os
-import glob
+import statistics as stat_module
+import sys
+import tempfile
+
+import numpy as np
+
+from area_memo import AreaMemo
+from area_store import AreaStore
+from digit_forensics import BENFORD_FIRST, BENFORD_SECOND, digit_histograms, tests_from_counts
+from instrument import Measure, summary_table
+from json_output import write_json
+from klimek import bin_edges, fingerprint, kde_surface, scott_bandwidth
+from local_moran import fdr_bh, local_moran
+from parse_cache import ParseCache
+from permutation_test import permutation_p_values
+from rng_streams import stage_seed
+from robust_scaler import RobustScaler, robust_z_scores
+from spatial_weights import SpatialWeights, province_adjacency
+from stage_runner import Stage, StageRunner
+from twin_null_model import group_stats, lift_z, simulate_null_z
+from vote_matrix import VoteMatrix
 
 BASE_DIR = os.path.join(os.path.dirname(__file__), '..', '..')
-MP_DIR = os.path.join(BASE_DIR, 'data', 'mp')
-PL_DIR = os.path.join(BASE_DIR, 'data', 'pl')
-AREA_CODE_FILE = os.path.join(BASE_DIR, 'data', 'area_code', 'area_code.json')
-CANDIDATE_FILE = os.path.join(BASE_DIR, 'data', 'candidates', 'candidate-data.json')
-CONSTITUENCY_FILE = os.path.join(BASE_DIR, 'data', 'constituency.json')
-PARTYLIST_FILE = os.path.join(BASE_DIR, 'data', 'party_list.json')
-REFERENDUM_FILE = os.path.join(BASE_DIR, 'data', 'referendum.json')
-FOCUS_AREAS_FILE = os.path.join(BASE_DIR, 'data', 'focus_areas.json')
-ELECTION66_LEADING_FILE = os.path.join(BASE_DIR, 'data', 'election66_leading_candidates.json')
+# ELECTION_DATA_DIR points the pipeline at another data/ tree of the same
+# layout, e.g. one written by synth_election.py
+DATA_DIR = os.environ.get('ELECTION_DATA_DIR') or os.path.join(BASE_DIR, 'data')
+MP_DIR = os.path.join(DATA_DIR, 'mp')
+PL_DIR = os.path.join(DATA_DIR, 'pl')
+AREA_CODE_FILE = os.path.join(DATA_DIR, 'area_code', 'area_code.json')
+CANDIDATE_FILE = os.path.join(DATA_DIR, 'candidates', 'candidate-data.json')
+CONSTITUENCY_FILE = os.path.join(DATA_DIR, 'constituency.json')
+PARTYLIST_FILE = os.path.join(DATA_DIR, 'party_list.json')
+REFERENDUM_FILE = os.path.join(DATA_DIR, 'referendum.json')
+FOCUS_AREAS_FILE = os.path.join(DATA_DIR, 'focus_areas.json')
+ELECTION66_LEADING_FILE = os.path.join(DATA_DIR, 'election66_leading_candidates.json')
+ECT_STATS_CONS_FILE = os.path.join(DATA_DIR, 'ect_api', 'stats_cons.json')
+ECT_INFO_PROVINCE_FILE = os.path.join(DATA_DIR, 'ect_api', 'info_province.json')
+SNAPSHOT_ARCHIVE_DIR = os.path.join(DATA_DIR, 'snapshots')  # written by scripts/election_scraper.py
+PROVINCES_GEOJSON_FILE = os.path.join(os.path.dirname(__file__), '..', 'public', 'thailand-provinces.json')
 OUTPUT_FILE = os.path.join(os.path.dirname(__file__), '..', 'public', 'election_data.json')
+PROFILE_NAME = 'pipeline_profile.json'  # default --profile: in the cache directory, not public/
+CACHE_DIR = os.path.join(os.path.dirname(__file__), '..', '.cache')
+
+# Twin-number Monte Carlo null model: 100k shuffles resolve p-values to 1e-5,
+# well below the Bonferroni alpha of 0.0025
+MC_ITERATIONS = 100_000
+MC_BATCH_SIZE = 5_000
+# Ensemble permutation test: the null is pooled over all areas, so 10k
+# permutations already give 4M null scores per p-value
+N_PERMUTATIONS = 10_000
+PERM_BLOCK_SIZE = 1_000
+# Local Moran's I: conditional permutations per area (p resolves to 0.001)
+# and the Benjamini–Hochberg FDR level for calling a spatial cluster
+MORAN_PERMUTATIONS = 999
+MORAN_BLOCK_SIZE = 333
+MORAN_FDR_ALPHA = 0.05
+# Klimek fingerprint grid (bins per axis) shown by the frontend heatmap
+KLIMEK_BINS = 20
+SEED = 42
 
 PARTY_META = {
     'PARTY-0001': {'name': 'ไทยทรัพย์ทวี', 'num': 1, 'color': '#aaaaaa'},
@@ -80,6 +129,87 @@ PARTY_META = {
     'PARTY-0060': {'name': 'สัมมาธิปไตย', 'num': 60, 'color': '#aaaaaa'},
 }
 
+THAI_TO_GEO = {
+    'กระบี่': 'Krabi',
+    'กรุงเทพมหานคร': 'Bangkok Metropolis',
+    'กาญจนบุรี': 'Kanchanaburi',
+    'กาฬสินธุ์': 'Kalasin',
+    'กำแพงเพชร': 'Kamphaeng Phet',
+    'ขอนแก่น': 'Khon Kaen',
+    'จันทบุรี': 'Chanthaburi',
+    'ฉะเชิงเทรา': 'Chachoengsao',
+    'ชลบุรี': 'Chon Buri',
+    'ชัยนาท': 'Chai Nat',
+    'ชัยภูมิ': 'Chaiyaphum',
+    'ชุมพร': 'Chumphon',
+    'ตรัง': 'Trang',
+    'ตราด': 'Trat',
+    'ตาก': 'Tak',
+    'นครนายก': 'Nakhon Nayok',
+    'นครปฐม': 'Nakhon Pathom',
+    'นครพนม': 'Nakhon Phanom',
+    'นครราชสีมา': 'Nakhon Ratchasima',
+    'นครศรีธรรมราช': 'Nakhon Si Thammarat',
+    'นครสวรรค์': 'Nakhon Sawan',
+    'นนทบุรี': 'Nonthaburi',
+    'นราธิวาส': 'Narathiwat',
+    'น่าน': 'Nan',
+    'บึงกาฬ': 'Bueng Kan',
+    'บุรีรัมย์': 'Buri Ram',
+    'ปทุมธานี': 'Pathum Thani',
+    'ประจวบคีรีขันธ์': 'Prachuap Khiri Khan',
+    'ปราจีนบุรี': 'Prachin Buri',
+    'ปัตตานี': 'Pattani',
+    'พระนครศรีอยุธยา': 'Phra Nakhon Si Ayutthaya',
+    'พะเยา': 'Phayao',
+    'พังงา': 'Phangnga',
+    'พัทลุง': 'Phatthalung',
+    'พิจิตร': 'Phichit',
+    'พิษณุโลก': 'Phitsanulok',
+    'ภูเก็ต': 'Phuket',
+    'มหาสารคาม': 'Maha Sarakham',
+    'มุกดาหาร': 'Mukdahan',
+    'ยะลา': 'Yala',
+    'ยโสธร': 'Yasothon',
+    'ระนอง': 'Ranong',
+    'ระยอง': 'Rayong',
+    'ราชบุรี': 'Ratchaburi',
+    'ร้อยเอ็ด': 'Roi Et',
+    'ลพบุรี': 'Lop Buri',
+    'ลำปาง': 'Lampang',
+    'ลำพูน': 'Lamphun',
+    'ศรีสะเกษ': 'Si Sa Ket',
+    'สกลนคร': 'Sakon Nakhon',
+    'สงขลา': 'Songkhla',
+    'สตูล': 'Satun',
+    'สมุทรปราการ': 'Samut Prakan',
+    'สมุทรสงคราม': 'Samut Songkhram',
+    'สมุทรสาคร': 'Samut Sakhon',
+    'สระบุรี': 'Saraburi',
+    'สระแก้ว': 'Sa Kaeo',
+    'สิงห์บุรี': 'Sing Buri',
+    'สุพรรณบุรี': 'Suphan Buri',
+    'สุราษฎร์ธานี': 'Surat Thani',
+    'สุรินทร์': 'Surin',
+    'สุโขทัย': 'Sukhothai',
+    'หนองคาย': 'Nong Khai',
+    'หนองบัวลำภู': 'Nong Bua Lam Phu',
+    'อำนาจเจริญ': 'Amnat Charoen',
+    'อุดรธานี': 'Udon Thani',
+    'อุตรดิตถ์': 'Uttaradit',
+    'อุทัยธานี': 'Uthai Thani',
+    'อุบลราชธานี': 'Ubon Ratchathani',
+    'อ่างทอง': 'Ang Thong',
+    'เชียงราย': 'Chiang Rai',
+    'เชียงใหม่': 'Chiang Mai',
+    'เพชรบุรี': 'Phetchaburi',
+    'เพชรบูรณ์': 'Phetchabun',
+    'เลย': 'Loei',
+    'แพร่': 'Phrae',
+    'แม่ฮ่องสอน': 'Mae Hong Son',
+}
+
+
 def get_party_name(party_code):
     return PARTY_META.get(party_code, {}).get('name', party_code)
 
@@ -92,15 +222,35 @@ def get_party_num(party_code):
     except:
         return 0
 
-def main():
+def load_json(path, cache=None):
+    """Decoded JSON file, through the parse cache when one is given."""
+    if cache is not None:
+        return cache.load_json(path)
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def get_province(area_name):
+    """Province part of an area name ("<province> เขต <n>")."""
+    return area_name.split(' เขต')[0] if ' เขต' in area_name else area_name
+
+
+def population_weight(eligible_voters, all_eligible):
+    """Areas with very few voters → weight down to reduce false positives."""
+    if not all_eligible:
+        return 1.0
+    median_pop = stat_module.median(all_eligible)
+    ratio = eligible_voters / median_pop if median_pop > 0 else 1.0
+    return max(0.5, min(1.2, 0.7 + 0.3 * ratio))
+
+
+def stage_inputs(cache, mp_dir, pl_dir):
     # Load area codes
-    with open(AREA_CODE_FILE, 'r', encoding='utf-8') as f:
-        area_data = json.load(f)
+    area_data = load_json(AREA_CODE_FILE, cache)
     area_name_map = {item['code']: item['name'] for item in area_data['areas']}
 
     # Load candidate data
-    with open(CANDIDATE_FILE, 'r', encoding='utf-8') as f:
-        candidate_raw = json.load(f)
+    candidate_raw = load_json(CANDIDATE_FILE, cache)
     # Build lookup: candidateCode -> candidate info
     candidate_lookup = {}
     for c in candidate_raw['candidates']:
@@ -117,8 +267,7 @@ def main():
     # Provides top-3 candidates per area with vote counts from 2566 election
     election66_lookup = {}  # (firstName, lastName, areaCode) -> {votes66, pct66, rank66, ...}
     if os.path.exists(ELECTION66_LEADING_FILE):
-        with open(ELECTION66_LEADING_FILE, 'r', encoding='utf-8') as f:
-            e66_raw = json.load(f)
+        e66_raw = load_json(ELECTION66_LEADING_FILE, cache)
         for area_item in e66_raw.get('data', []):
             ac = area_item.get('areaRefCode', '')
             for r in area_item.get('leadingCandidateResults', []):
@@ -138,75 +287,41 @@ def main():
     else:
         print(f"  ⚠️ Election 66 data not found: {ELECTION66_LEADING_FILE}")
 
-    # Extract province from area name
-    def get_province(area_name):
-        return area_name.split(' เขต')[0] if ' เขต' in area_name else area_name
-
-    # Process all areas
-    areas = []
-    vote_buying_analysis = []
-    party_vote_totals = {}  # partyCode -> total PL votes
-    province_data = {}
-
-    mp_files = sorted(glob.glob(os.path.join(MP_DIR, '*.json')))
-
-    for mp_file in mp_files:
-        area_code = os.path.basename(mp_file).replace('.json', '')
-        pl_file = os.path.join(PL_DIR, f'{area_code}.json')
-
-        if not os.path.exists(pl_file):
-            continue
+    # Parse every data/mp and data/pl file once; all sections below share it
+    store = AreaStore(mp_dir, pl_dir, cache=cache)
+    print(f"  📂 AreaStore: {len(store.mp_codes)} MP / {len(store.pl_codes)} PL areas "
+          f"({store.files_read} files parsed, {store.bytes_read / 1024:.0f} KB)")
+    # Dense area × party / area × number arrays shared by the numeric sections
+    vm = VoteMatrix(store)
+    paired_rows = vm.rows(store.paired_codes)
+
+    return {
+        'area_name_map': area_name_map,
+        'candidate_raw': candidate_raw,
+        'candidates_by_area': candidates_by_area,
+        'election66_lookup': election66_lookup,
+        'store': store,
+        'vm': vm,
+        'paired_rows': paired_rows,
+    }
 
-        with open(mp_file, 'r', encoding='utf-8') as f:
-            mp_data = json.load(f)
-        with open(pl_file, 'r', encoding='utf-8') as f:
-            pl_data = json.load(f)
 
+def stage_vote_buying(store, area_name_map, memo):
+    def area_record(area_code):
+        """(vote buying analysis or None, rank distribution rows) of one area."""
+        pl_entries_raw = store.pl[area_code]
         area_name = area_name_map.get(area_code, f'เขต {area_code}')
         province = get_province(area_name)
 
-        # MP entries
-        mp_entries = []
-        for entry in mp_data['entries']:
-            mp_entries.append({
-                'candidateCode': entry['candidateCode'],
-                'partyCode': entry['partyCode'],
-                'partyName': get_party_name(entry['partyCode']),
-                'partyColor': get_party_color(entry['partyCode']),
-                'rank': entry['rank'],
-                'voteTotal': entry['voteTotal'],
-                'votePercent': entry['votePercent'],
-                'candidateNum': int(entry['candidateCode'][-2:]),
-            })
-
-        # PL entries (top 10)
-        pl_entries = []
-        for entry in sorted(pl_data['entries'], key=lambda x: x['rank'])[:10]:
-            pl_entries.append({
-                'partyCode': entry['partyCode'],
-                'partyName': get_party_name(entry['partyCode']),
-                'partyColor': get_party_color(entry['partyCode']),
-                'partyNum': get_party_num(entry['partyCode']),
-                'rank': entry['rank'],
-                'voteTotal': entry['voteTotal'],
-                'votePercent': entry['votePercent'],
-            })
-
-        # Accumulate PL votes
-        for entry in pl_data['entries']:
-            pc = entry['partyCode']
-            if pc not in party_vote_totals:
-                party_vote_totals[pc] = 0
-            party_vote_totals[pc] += entry['voteTotal']
-
         # Vote buying analysis
-        winner = next((e for e in mp_data['entries'] if e['rank'] == 1), None)
+        analysis = None
+        winner = store.winner(area_code)
         if winner:
             candidate_num = int(winner['candidateCode'][-2:])
             target_party_id = f'PARTY-{str(candidate_num).zfill(4)}'
             winner_party_id = winner['partyCode']
 
-            top_pl = sorted(pl_data['entries'], key=lambda x: x['rank'])[:7]
+            top_pl = store.pl_by_rank(area_code)[:7]
             top_pl_codes = [p['partyCode'] for p in top_pl]
 
             is_in_top_7 = target_party_id in top_pl_codes
@@ -214,9 +329,9 @@ def main():
             is_suspicious = is_in_top_7 and is_cross_party
 
             # Get target party rank and votes in PL
-            target_pl_entry = next((p for p in pl_data['entries'] if p['partyCode'] == target_party_id), None)
+            target_pl_entry = next((p for p in pl_entries_raw if p['partyCode'] == target_party_id), None)
 
-            vote_buying_analysis.append({
+            analysis = {
                 'areaCode': area_code,
                 'areaName': area_name,
                 'province': province,
@@ -235,54 +350,51 @@ def main():
                 'targetPlPercent': target_pl_entry['votePercent'] if target_pl_entry else 0,
                 'winnerVotes': winner['voteTotal'],
                 'winnerPercent': winner['votePercent'],
-            })
-
-            # Province aggregation
-            if province not in province_data:
-                province_data[province] = {'total': 0, 'suspicious': 0}
-            province_data[province]['total'] += 1
-            if is_suspicious:
-                province_data[province]['suspicious'] += 1
-
-        areas.append({
-            'areaCode': area_code,
-            'areaName': area_name,
-            'province': province,
-            'mpEntries': mp_entries[:5],  # top 5 only
-            'plEntries': pl_entries,
-        })
+            }
 
-    # Rank distribution for parties 1-5
-    rank_distribution = []
-    for mp_file in mp_files:
-        area_code = os.path.basename(mp_file).replace('.json', '')
-        pl_file = os.path.join(PL_DIR, f'{area_code}.json')
-        if not os.path.exists(pl_file):
-            continue
+        # Rank distribution for parties 1-5
+        ranks = []
+        winner_num = store.winner_num(area_code)
+        if winner_num is not None:
+            party_ranks = {entry['partyCode']: entry['rank'] for entry in pl_entries_raw}
+            for p_num in range(1, 6):
+                p_id = f'PARTY-{str(p_num).zfill(4)}'
+                if p_id in party_ranks:
+                    ranks.append({
+                        'partyNum': p_num,
+                        'partyName': get_party_name(p_id),
+                        'rank': party_ranks[p_id],
+                        'isSuspicious': winner_num == p_num,
+                        'areaCode': area_code,
+                    })
+        return analysis, ranks
+
+    # Process all areas; only areas whose files changed since the last run
+    # are analysed again
+    records = memo.map('vote_buying', area_record, store.paired_codes,
+                       key=lambda ac: (store.area_hash(ac), area_name_map.get(ac)))
+    vote_buying_analysis = [analysis for analysis, _ in records if analysis]
+    rank_distribution = [row for _, ranks in records for row in ranks]
+
+    # Province aggregation
+    province_data = {}
+    for item in vote_buying_analysis:
+        province = item['province']
+        if province not in province_data:
+            province_data[province] = {'total': 0, 'suspicious': 0}
+        province_data[province]['total'] += 1
+        if item['isSuspicious']:
+            province_data[province]['suspicious'] += 1
 
-        with open(mp_file, 'r', encoding='utf-8') as f:
-            mp_data = json.load(f)
-        with open(pl_file, 'r', encoding='utf-8') as f:
-            pl_data = json.load(f)
+    return {
+        'vote_buying_analysis': vote_buying_analysis,
+        'province_data': province_data,
+        'rank_distribution': rank_distribution,
+    }
 
-        winner = next((e for e in mp_data['entries'] if e['rank'] == 1), None)
-        if not winner:
-            continue
-        winner_num = int(winner['candidateCode'][-2:])
-
-        party_ranks = {entry['partyCode']: entry['rank'] for entry in pl_data['entries']}
-
-        for p_num in range(1, 6):
-            p_id = f'PARTY-{str(p_num).zfill(4)}'
-            if p_id in party_ranks:
-                rank_distribution.append({
-                    'partyNum': p_num,
-                    'partyName': get_party_name(p_id),
-                    'rank': party_ranks[p_id],
-                    'isSuspicious': winner_num == p_num,
-                    'areaCode': area_code,
-                })
 
+def stage_deep_dive(vote_buying_analysis, store, area_name_map, candidates_by_area, vm,
+                    province_data, memo):
     # ===== DEEP DIVE: Scatter data (MP winner votes vs target PL votes) =====
     scatter_data = []
     for item in vote_buying_analysis:
@@ -303,18 +415,9 @@ def main():
             })
 
     # ===== DEEP DIVE: Area detail with MP vs PL side-by-side =====
-    area_details = []
-    for mp_file in mp_files:
-        area_code = os.path.basename(mp_file).replace('.json', '')
-        pl_file = os.path.join(PL_DIR, f'{area_code}.json')
-        if not os.path.exists(pl_file):
-            continue
-
-        with open(mp_file, 'r', encoding='utf-8') as f:
-            mp_data = json.load(f)
-        with open(pl_file, 'r', encoding='utf-8') as f:
-            pl_data = json.load(f)
+    vote_buying_by_area = {a['areaCode']: a for a in vote_buying_analysis}
 
+    def area_detail(area_code):
         area_name = area_name_map.get(area_code, f'เขต {area_code}')
 
         # Get candidate info for this area
@@ -323,7 +426,7 @@ def main():
 
         # Build MP lookup: candidateNum -> entry
         mp_by_num = {}
-        for entry in mp_data['entries']:
+        for entry in store.mp[area_code]:
             num = int(entry['candidateCode'][-2:])
             cand = cand_by_num.get(num)
             mp_by_num[num] = {
@@ -340,7 +443,7 @@ def main():
 
         # Build PL lookup: partyNum -> entry
         pl_by_num = {}
-        for entry in pl_data['entries']:
+        for entry in store.pl[area_code]:
             num = get_party_num(entry['partyCode'])
             pl_by_num[num] = {
                 'rank': entry['rank'],
@@ -362,14 +465,14 @@ def main():
                 'pl': pl_entry,
             })
 
-        winner = next((e for e in mp_data['entries'] if e['rank'] == 1), None)
-        winner_num = int(winner['candidateCode'][-2:]) if winner else None
+        winner = store.winner(area_code)
+        winner_num = store.winner_num(area_code)
         winner_cand = cand_by_num.get(winner_num) if winner_num else None
 
         # Find the vote buying analysis for this area
-        area_analysis = next((a for a in vote_buying_analysis if a['areaCode'] == area_code), None)
+        area_analysis = vote_buying_by_area.get(area_code)
 
-        area_details.append({
+        return {
             'areaCode': area_code,
             'areaName': area_name,
             'province': get_province(area_name),
@@ -382,14 +485,20 @@ def main():
             'isSuspicious': area_analysis['isSuspicious'] if area_analysis else False,
             'targetPartyNum': area_analysis['targetPartyNum'] if area_analysis else None,
             'combined': combined,
-        })
+        }
+
+    def area_detail_key(area_code):
+        area_analysis = vote_buying_by_area.get(area_code)
+        return (store.area_hash(area_code), area_name_map.get(area_code),
+                candidates_by_area.get(area_code),
+                (area_analysis['isSuspicious'], area_analysis['targetPartyNum']) if area_analysis else None)
+
+    area_details = memo.map('area_details', area_detail, store.paired_codes, key=area_detail_key)
 
     # ===== DEEP DIVE: Candidate number frequency per party =====
     candidate_numbers = []
-    for mp_file in mp_files:
-        with open(mp_file, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        for entry in data['entries']:
+    for area_code in store.mp_codes:
+        for entry in store.mp[area_code]:
             pc = entry['partyCode']
             if pc in ['PARTY-0009', 'PARTY-0027', 'PARTY-0037', 'PARTY-0042', 'PARTY-0046']:
                 candidate_numbers.append({
@@ -468,25 +577,22 @@ def main():
 
     # ===== DEEP DIVE: Vote correlation (PL target party votes vs median PL votes) =====
     vote_anomaly = []
+    # Upper median of PL votes for small parties (excluding big 4) in every area
+    big_parties = {'PARTY-0046', 'PARTY-0027', 'PARTY-0009', 'PARTY-0037', 'PARTY-0006', 'PARTY-0029'}
+    big_cols = np.isin(np.array(vm.party_codes), list(big_parties))
+    small_mask = vm.pl_present & (vm.pl_votes > 0) & ~big_cols
+    small_sorted = np.sort(np.where(small_mask, vm.pl_votes, np.iinfo(np.int64).max), axis=1)
+    small_n = small_mask.sum(axis=1)
+    median_small_by_row = np.where(small_n > 0, small_sorted[np.arange(len(small_n)), small_n // 2], 0)
+
     for item in vote_buying_analysis:
         if not item['isSuspicious']:
             continue
         area_code = item['areaCode']
-        pl_file = os.path.join(PL_DIR, f'{area_code}.json')
-        if not os.path.exists(pl_file):
+        if not store.has_pl(area_code):
             continue
-        with open(pl_file, 'r', encoding='utf-8') as f:
-            pl_data = json.load(f)
-
-        # Compute median votes for non-top-4 parties (excluding big 4)
-        big_parties = {'PARTY-0046', 'PARTY-0027', 'PARTY-0009', 'PARTY-0037', 'PARTY-0006', 'PARTY-0029'}
-        small_party_votes = [e['voteTotal'] for e in pl_data['entries'] if e['partyCode'] not in big_parties and e['voteTotal'] > 0]
-        small_party_votes.sort()
-        if small_party_votes:
-            mid = len(small_party_votes) // 2
-            median_small = small_party_votes[mid]
-        else:
-            median_small = 0
+
+        median_small = int(median_small_by_row[vm.area_index[area_code]])
 
         target_votes = item['targetPlVotes']
         anomaly_ratio = round(target_votes / median_small, 1) if median_small > 0 else 0
@@ -546,87 +652,21 @@ def main():
             'suspiciousPercent': round(data['suspicious'] / data['total'] * 100, 1) if data['total'] > 0 else 0,
         })
 
-    # ===== Province Map Data (for GeoJSON choropleth) =====
-    THAI_TO_GEO = {
-        'กระบี่': 'Krabi',
-        'กรุงเทพมหานคร': 'Bangkok Metropolis',
-        'กาญจนบุรี': 'Kanchanaburi',
-        'กาฬสินธุ์': 'Kalasin',
-        'กำแพงเพชร': 'Kamphaeng Phet',
-        'ขอนแก่น': 'Khon Kaen',
-        'จันทบุรี': 'Chanthaburi',
-        'ฉะเชิงเทรา': 'Chachoengsao',
-        'ชลบุรี': 'Chon Buri',
-        'ชัยนาท': 'Chai Nat',
-        'ชัยภูมิ': 'Chaiyaphum',
-        'ชุมพร': 'Chumphon',
-        'ตรัง': 'Trang',
-        'ตราด': 'Trat',
-        'ตาก': 'Tak',
-        'นครนายก': 'Nakhon Nayok',
-        'นครปฐม': 'Nakhon Pathom',
-        'นครพนม': 'Nakhon Phanom',
-        'นครราชสีมา': 'Nakhon Ratchasima',
-        'นครศรีธรรมราช': 'Nakhon Si Thammarat',
-        'นครสวรรค์': 'Nakhon Sawan',
-        'นนทบุรี': 'Nonthaburi',
-        'นราธิวาส': 'Narathiwat',
-        'น่าน': 'Nan',
-        'บึงกาฬ': 'Bueng Kan',
-        'บุรีรัมย์': 'Buri Ram',
-        'ปทุมธานี': 'Pathum Thani',
-        'ประจวบคีรีขันธ์': 'Prachuap Khiri Khan',
-        'ปราจีนบุรี': 'Prachin Buri',
-        'ปัตตานี': 'Pattani',
-        'พระนครศรีอยุธยา': 'Phra Nakhon Si Ayutthaya',
-        'พะเยา': 'Phayao',
-        'พังงา': 'Phangnga',
-        'พัทลุง': 'Phatthalung',
-        'พิจิตร': 'Phichit',
-        'พิษณุโลก': 'Phitsanulok',
-        'ภูเก็ต': 'Phuket',
-        'มหาสารคาม': 'Maha Sarakham',
-        'มุกดาหาร': 'Mukdahan',
-        'ยะลา': 'Yala',
-        'ยโสธร': 'Yasothon',
-        'ระนอง': 'Ranong',
-        'ระยอง': 'Rayong',
-        'ราชบุรี': 'Ratchaburi',
-        'ร้อยเอ็ด': 'Roi Et',
-        'ลพบุรี': 'Lop Buri',
-        'ลำปาง': 'Lampang',
-        'ลำพูน': 'Lamphun',
-        'ศรีสะเกษ': 'Si Sa Ket',
-        'สกลนคร': 'Sakon Nakhon',
-        'สงขลา': 'Songkhla',
-        'สตูล': 'Satun',
-        'สมุทรปราการ': 'Samut Prakan',
-        'สมุทรสงคราม': 'Samut Songkhram',
-        'สมุทรสาคร': 'Samut Sakhon',
-        'สระบุรี': 'Saraburi',
-        'สระแก้ว': 'Sa Kaeo',
-        'สิงห์บุรี': 'Sing Buri',
-        'สุพรรณบุรี': 'Suphan Buri',
-        'สุราษฎร์ธานี': 'Surat Thani',
-        'สุรินทร์': 'Surin',
-        'สุโขทัย': 'Sukhothai',
-        'หนองคาย': 'Nong Khai',
-        'หนองบัวลำภู': 'Nong Bua Lam Phu',
-        'อำนาจเจริญ': 'Amnat Charoen',
-        'อุดรธานี': 'Udon Thani',
-        'อุตรดิตถ์': 'Uttaradit',
-        'อุทัยธานี': 'Uthai Thani',
-        'อุบลราชธานี': 'Ubon Ratchathani',
-        'อ่างทอง': 'Ang Thong',
-        'เชียงราย': 'Chiang Rai',
-        'เชียงใหม่': 'Chiang Mai',
-        'เพชรบุรี': 'Phetchaburi',
-        'เพชรบูรณ์': 'Phetchabun',
-        'เลย': 'Loei',
-        'แพร่': 'Phrae',
-        'แม่ฮ่องสอน': 'Mae Hong Son',
+    return {
+        'scatter_data': scatter_data,
+        'area_details': area_details,
+        'candidate_numbers': candidate_numbers,
+        'region_summary': region_summary,
+        'vote_anomaly': vote_anomaly,
+        'suspicious_by_party': suspicious_by_party,
+        'target_party_counts': target_party_counts,
+        'province_summary': province_summary,
     }
 
+
+def stage_province_map(vote_buying_analysis, province_data):
+    # ===== Province Map Data (for GeoJSON choropleth) =====
+
     # Aggregate seat results per province (party -> seat count)
     province_party_seats = {}  # province_thai -> {partyCode -> count}
     province_total_voters = {}
@@ -678,6 +718,14 @@ def main():
     total_areas = len(vote_buying_analysis)
     total_suspicious = sum(1 for x in vote_buying_analysis if x['isSuspicious'])
 
+    return {
+        'province_map_data': province_map_data,
+        'total_areas': total_areas,
+        'total_suspicious': total_suspicious,
+    }
+
+
+def stage_candidates(candidate_raw, store, area_name_map, candidates_by_area, election66_lookup):
     # ===== CANDIDATE DATA: Party Switcher Analysis =====
     # party66RefCode is the party-list ballot number from the 2566 election
     # Official source: https://election66-data.thaipbs.or.th/election-result/master/parties.json
@@ -795,16 +843,13 @@ def main():
     winner_retention = []
     retention_by_party = {}
 
-    for mp_file in mp_files:
-        area_code = os.path.basename(mp_file).replace('.json', '')
-        with open(mp_file, 'r', encoding='utf-8') as f:
-            mp_data = json.load(f)
+    for area_code in store.mp_codes:
         area_name = area_name_map.get(area_code, f'เขต {area_code}')
 
-        winner = next((e for e in mp_data['entries'] if e['rank'] == 1), None)
+        winner = store.winner(area_code)
         if not winner:
             continue
-        winner_num = int(winner['candidateCode'][-2:])
+        winner_num = store.winner_num(area_code)
         winner_party = get_party_name(winner['partyCode'])
         winner_color = get_party_color(winner['partyCode'])
 
@@ -865,13 +910,10 @@ def main():
     lost_66_winners = []
     for c in all_66_winners:
         area_code = c['areaCode'].replace('AREA-', '')
-        mp_file = os.path.join(MP_DIR, f'{area_code}.json')
-        if not os.path.exists(mp_file):
+        if not store.has_mp(area_code):
             continue
-        with open(mp_file, 'r', encoding='utf-8') as f:
-            mp_data = json.load(f)
         # Check if this candidate won
-        cand_entry = next((e for e in mp_data['entries'] if int(e['candidateCode'][-2:]) == c['number']), None)
+        cand_entry = next((e for e in store.mp[area_code] if int(e['candidateCode'][-2:]) == c['number']), None)
         if cand_entry and cand_entry['rank'] != 1:
             area_name = area_name_map.get(area_code, f'เขต {area_code}')
             lost_66_winners.append({
@@ -893,14 +935,11 @@ def main():
     # to show how party-switchers' votes changed between elections.
     # ═══════════════════════════════════════════════════════════════
     switcher_vote_comparison = []
-    for mp_file in mp_files:
-        area_code = os.path.basename(mp_file).replace('.json', '')
-        with open(mp_file, 'r', encoding='utf-8') as f:
-            mp_data = json.load(f)
+    for area_code in store.mp_codes:
         area_name = area_name_map.get(area_code, f'เขต {area_code}')
         area_cands = candidates_by_area.get(area_code, [])
 
-        for entry69 in mp_data['entries']:
+        for entry69 in store.mp[area_code]:
             num = int(entry69['candidateCode'][-2:])
             cand = next((c for c in area_cands if c['number'] == num), None)
             if not cand:
@@ -950,28 +989,37 @@ def main():
     svc_lost = sum(1 for s in switcher_vote_comparison if s['pctDelta'] < 0)
     print(f"  🔄 Switcher Vote Comparison: {svc_total} matched ({svc_switched} switched party), {svc_gained} gained %, {svc_lost} lost %")
 
+    return {
+        'party_switcher_data': party_switcher_data,
+        'switcher_to_list': switcher_to_list,
+        'winner_retention': winner_retention,
+        'retention_summary': retention_summary,
+        'all_66_winners': all_66_winners,
+        'lost_66_winners': lost_66_winners,
+        'switcher_vote_comparison': switcher_vote_comparison,
+    }
+
+
+def stage_thaipbs_inputs(cache):
     # ===== NEW DATA: Constituency, Party-list, Referendum from ThaiPBS API =====
     constituency_data = {}
     partylist_data = {}
     referendum_data = {}
 
     if os.path.exists(CONSTITUENCY_FILE):
-        with open(CONSTITUENCY_FILE, 'r', encoding='utf-8') as f:
-            raw = json.load(f)
+        raw = load_json(CONSTITUENCY_FILE, cache)
         for item in raw.get('data', []):
             ac = item['areaCode'].replace('AREA-', '')
             constituency_data[ac] = item
 
     if os.path.exists(PARTYLIST_FILE):
-        with open(PARTYLIST_FILE, 'r', encoding='utf-8') as f:
-            raw = json.load(f)
+        raw = load_json(PARTYLIST_FILE, cache)
         for item in raw.get('data', []):
             ac = item['areaCode'].replace('AREA-', '')
             partylist_data[ac] = item
 
     if os.path.exists(REFERENDUM_FILE):
-        with open(REFERENDUM_FILE, 'r', encoding='utf-8') as f:
-            raw = json.load(f)
+        raw = load_json(REFERENDUM_FILE, cache)
         for item in raw.get('data', []):
             ac = item['areaCode'].replace('AREA-', '')
             referendum_data[ac] = item
@@ -979,8 +1027,7 @@ def main():
     # ===== Focus Areas (ThaiPBS editorial groupings) =====
     focus_area_tags = {}  # areaCode -> list of tags
     if os.path.exists(FOCUS_AREAS_FILE):
-        with open(FOCUS_AREAS_FILE, 'r', encoding='utf-8') as f:
-            fa_raw = json.load(f)
+        fa_raw = load_json(FOCUS_AREAS_FILE, cache)
         for group in fa_raw.get('groups', []):
             tag = group.get('tag', '')
             for ac_full in group.get('areaCodes', []):
@@ -989,6 +1036,15 @@ def main():
                     focus_area_tags[ac] = []
                 focus_area_tags[ac].append(tag)
 
+    return {
+        'constituency_data': constituency_data,
+        'partylist_data': partylist_data,
+        'referendum_data': referendum_data,
+        'focus_area_tags': focus_area_tags,
+    }
+
+
+def stage_turnout_anomaly(constituency_data, area_name_map):
     # ===== NEW TAB: Turnout Anomaly =====
     turnout_anomaly = []
     all_turnout_pcts = []
@@ -1018,6 +1074,12 @@ def main():
         })
     turnout_anomaly.sort(key=lambda x: abs(x['deviation']), reverse=True)
 
+    return {
+        'turnout_anomaly': turnout_anomaly,
+    }
+
+
+def stage_vote_splitting(constituency_data, partylist_data, area_name_map):
     # ===== NEW TAB: Vote Splitting (MP winner vs PL winner mismatch) =====
     vote_splitting = []
     for ac in constituency_data:
@@ -1052,48 +1114,39 @@ def main():
         })
     vote_splitting.sort(key=lambda x: (not x['isSplit'], -abs(x['mpWinnerPercent'] - x['plWinnerPercent'])))
 
+    return {
+        'vote_splitting': vote_splitting,
+    }
+
+
+def stage_mp_pl(vm, paired_rows, store, area_name_map, constituency_data):
     # ===== NEW TAB: MP vs Party-List Vote Comparison (ส้มหล่น Analysis) =====
     # Compare actual vote counts per party: MP candidate votes vs PL party votes in each district
-    mp_pl_party_totals = {}  # partyCode -> {mpVotes, plVotes}
     mp_pl_per_area = []
 
-    for mp_file in mp_files:
-        area_code = os.path.basename(mp_file).replace('.json', '')
-        pl_file = os.path.join(PL_DIR, f'{area_code}.json')
-        if not os.path.exists(pl_file):
-            continue
-
-        with open(mp_file, 'r', encoding='utf-8') as f:
-            mp_raw = json.load(f)
-        with open(pl_file, 'r', encoding='utf-8') as f:
-            pl_raw = json.load(f)
+    # Per-party MP / PL votes for every paired area (one MP candidate per party per area)
+    mp_pv = vm.mp_votes[paired_rows]
+    pl_pv = vm.pl_votes[paired_rows]
+    present_pv = vm.mp_present[paired_rows] | vm.pl_present[paired_rows]
+    diff_pv = pl_pv - mp_pv
+    top10_pv = np.zeros_like(present_pv)  # party is in the area's top-10 PL surplus list
 
+    for k, area_code in enumerate(store.paired_codes):
         area_name = area_name_map.get(area_code, f'เขต {area_code}')
         province = get_province(area_name)
 
-        # Build per-party MP vote map (one candidate per party per area)
-        mp_party_votes = {}
-        for entry in mp_raw['entries']:
-            pc = entry['partyCode']
-            mp_party_votes[pc] = mp_party_votes.get(pc, 0) + entry['voteTotal']
+        total_mp = int(vm.mp_total[paired_rows[k]])
+        total_pl = int(vm.pl_total[paired_rows[k]])
 
-        # Build per-party PL vote map
-        pl_party_votes = {}
-        for entry in pl_raw['entries']:
-            pc = entry['partyCode']
-            pl_party_votes[pc] = entry['voteTotal']
-
-        # Union of all parties in this area
-        all_parties = set(mp_party_votes.keys()) | set(pl_party_votes.keys())
-
-        total_mp = sum(mp_party_votes.values())
-        total_pl = sum(pl_party_votes.values())
-
-        # Per-area breakdown (top parties only)
+        # Parties in this area sorted by PL surplus (largest first), top 10 kept
+        cols = np.flatnonzero(present_pv[k])
+        cols = cols[np.argsort(-diff_pv[k, cols], kind='stable')][:10]
+        top10_pv[k, cols] = True
         area_parties = []
-        for pc in all_parties:
-            mv = mp_party_votes.get(pc, 0)
-            pv = pl_party_votes.get(pc, 0)
+        for j in cols:
+            pc = vm.party_codes[j]
+            mv = int(mp_pv[k, j])
+            pv = int(pl_pv[k, j])
             diff = pv - mv
             area_parties.append({
                 'partyCode': pc,
@@ -1104,14 +1157,6 @@ def main():
                 'diff': diff,
                 'diffPercent': round(diff / mv * 100, 1) if mv > 0 else (100.0 if pv > 0 else 0),
             })
-            # Accumulate national totals
-            if pc not in mp_pl_party_totals:
-                mp_pl_party_totals[pc] = {'mpVotes': 0, 'plVotes': 0}
-            mp_pl_party_totals[pc]['mpVotes'] += mv
-            mp_pl_party_totals[pc]['plVotes'] += pv
-
-        # Sort by absolute diff (largest PL surplus first)
-        area_parties.sort(key=lambda x: x['diff'], reverse=True)
 
         # Winner info
         cd = constituency_data.get(area_code, {})
@@ -1126,14 +1171,19 @@ def main():
             'totalDiff': total_pl - total_mp,
             'mpWinnerParty': get_party_name(mp_winner_code),
             'mpWinnerColor': get_party_color(mp_winner_code),
-            'parties': area_parties[:10],  # top 10 per area
+            'parties': area_parties,  # top 10 per area
         })
 
     # Build national party summary: sorted by PL surplus (ส้มหล่น)
+    national_mp = mp_pv.sum(axis=0)
+    national_pl = pl_pv.sum(axis=0)
+    areas_pl_higher = (top10_pv & (diff_pv > 0)).sum(axis=0)
+    areas_pl_lower = (top10_pv & (diff_pv < 0)).sum(axis=0)
     mp_pl_party_summary = []
-    for pc, totals in mp_pl_party_totals.items():
-        mv = totals['mpVotes']
-        pv = totals['plVotes']
+    for j in np.flatnonzero(present_pv.any(axis=0)):
+        pc = vm.party_codes[j]
+        mv = int(national_mp[j])
+        pv = int(national_pl[j])
         diff = pv - mv
         mp_pl_party_summary.append({
             'partyCode': pc,
@@ -1143,9 +1193,9 @@ def main():
             'totalPlVotes': pv,
             'diff': diff,
             'diffPercent': round(diff / mv * 100, 1) if mv > 0 else (100.0 if pv > 0 else 0),
-            # Count areas where this party has PL > MP
-            'areasPlHigher': sum(1 for a in mp_pl_per_area for p in a['parties'] if p['partyCode'] == pc and p['diff'] > 0),
-            'areasPlLower': sum(1 for a in mp_pl_per_area for p in a['parties'] if p['partyCode'] == pc and p['diff'] < 0),
+            # Count areas where this party has PL > MP (within each area's top 10)
+            'areasPlHigher': int(areas_pl_higher[j]),
+            'areasPlLower': int(areas_pl_lower[j]),
         })
 
     # Sort by PL surplus (descending) = ส้มหล่น ranking
@@ -1170,30 +1220,33 @@ def main():
         print(f"     Top gainer: {mp_pl_party_summary[0]['partyName']} (+{mp_pl_party_summary[0]['diff']:,} votes)")
         print(f"     Top loser: {mp_pl_party_summary[-1]['partyName']} ({mp_pl_party_summary[-1]['diff']:,} votes)")
 
+    return {
+        'mp_pl_per_area': mp_pl_per_area,
+        'mp_pv': mp_pv,
+        'pl_pv': pl_pv,
+        'present_pv': present_pv,
+        'diff_pv': diff_pv,
+        'mp_pl_party_summary': mp_pl_party_summary,
+        'mp_pl_meta': mp_pl_meta,
+    }
+
+
+def stage_ballot_imbalance(store, area_name_map, vm, paired_rows, constituency_data, present_pv,
+                           diff_pv, mp_pv, pl_pv, memo):
     # ===== NEW TAB: Ballot Imbalance (บัตรเขย่ง) =====
     # Compare TOTAL vote count on MP ballot vs PL ballot per area
     # If someone stuffs MP ballots without matching PL, or vice versa, totals diverge
     import statistics as stats_module
 
-    ballot_imbalance = []
-    all_pct_diffs = []
-
-    for mp_file in mp_files:
-        area_code = os.path.basename(mp_file).replace('.json', '')
-        pl_file = os.path.join(PL_DIR, f'{area_code}.json')
-        if not os.path.exists(pl_file):
-            continue
-
-        with open(mp_file, 'r', encoding='utf-8') as f:
-            mp_raw = json.load(f)
-        with open(pl_file, 'r', encoding='utf-8') as f:
-            pl_raw = json.load(f)
+    row_of = {area_code: k for k, area_code in enumerate(store.paired_codes)}
 
+    def area_imbalance(area_code):
+        k = row_of[area_code]
         area_name = area_name_map.get(area_code, f'เขต {area_code}')
         province = get_province(area_name)
 
-        mp_total = sum(e['voteTotal'] for e in mp_raw['entries'])
-        pl_total = sum(e['voteTotal'] for e in pl_raw['entries'])
+        mp_total = int(vm.mp_total[paired_rows[k]])
+        pl_total = int(vm.pl_total[paired_rows[k]])
         diff = mp_total - pl_total
         avg_votes = (mp_total + pl_total) / 2 if (mp_total + pl_total) > 0 else 1
         diff_pct = round(diff / avg_votes * 100, 2)
@@ -1207,30 +1260,22 @@ def main():
         # Which ballot is higher?
         direction = 'mp' if diff > 0 else 'pl' if diff < 0 else 'equal'
 
-        # Per-party breakdown: which parties gained/lost most between MP and PL
-        mp_party = {}
-        for e in mp_raw['entries']:
-            mp_party[e['partyCode']] = mp_party.get(e['partyCode'], 0) + e['voteTotal']
-        pl_party = {}
-        for e in pl_raw['entries']:
-            pl_party[e['partyCode']] = e['voteTotal']
-
-        # Top 3 parties with biggest PL-MP diff (positive = PL gained)
+        # Top 5 parties with biggest |PL-MP| diff (positive = PL gained)
+        cols = np.flatnonzero(present_pv[k])
+        cols = cols[np.argsort(-np.abs(diff_pv[k, cols]), kind='stable')][:5]
         party_diffs = []
-        for pc in set(mp_party.keys()) | set(pl_party.keys()):
-            mv = mp_party.get(pc, 0)
-            pv = pl_party.get(pc, 0)
+        for j in cols:
+            pc = vm.party_codes[j]
             party_diffs.append({
                 'partyCode': pc,
                 'partyName': get_party_name(pc),
                 'partyColor': get_party_color(pc),
-                'mpVotes': mv,
-                'plVotes': pv,
-                'diff': pv - mv,
+                'mpVotes': int(mp_pv[k, j]),
+                'plVotes': int(pl_pv[k, j]),
+                'diff': int(diff_pv[k, j]),
             })
-        party_diffs.sort(key=lambda x: abs(x['diff']), reverse=True)
 
-        ballot_imbalance.append({
+        return {
             'areaCode': area_code,
             'areaName': area_name,
             'province': province,
@@ -1244,9 +1289,15 @@ def main():
             'turnoutPercent': turnout_pct,
             'winnerParty': get_party_name(winner_code),
             'winnerPartyColor': get_party_color(winner_code),
-            'topPartyDiffs': party_diffs[:5],
-        })
-        all_pct_diffs.append(diff_pct)
+            'topPartyDiffs': party_diffs,
+        }
+
+    # Per-area records of unchanged areas come from the last run; z-scores
+    # use the mean / σ over all areas and are added afterwards
+    ballot_imbalance = memo.map(
+        'ballot_imbalance', area_imbalance, store.paired_codes,
+        key=lambda ac: (store.area_hash(ac), area_name_map.get(ac), constituency_data.get(ac)))
+    all_pct_diffs = [item['diffPercent'] for item in ballot_imbalance]
 
     # Compute z-scores for outlier detection
     if len(all_pct_diffs) >= 2:
@@ -1325,6 +1376,15 @@ def main():
     print(f"     Mean Δ%={mean_pct:.3f}%, σ={std_pct:.3f}%")
     print(f"     MP > PL: {mp_higher_count} | PL > MP: {pl_higher_count} | Outliers (|z|>2): {outlier_count}")
 
+    return {
+        'ballot_imbalance': ballot_imbalance,
+        'histogram_data': histogram_data,
+        'province_imbalance_list': province_imbalance_list,
+        'ballot_imbalance_meta': ballot_imbalance_meta,
+    }
+
+
+def stage_winning_margins(constituency_data, area_name_map, candidates_by_area):
     # ===== NEW TAB: Winning Margin (closest & landslide races) =====
     winning_margins = []
     for ac, cd in constituency_data.items():
@@ -1363,6 +1423,12 @@ def main():
         })
     winning_margins.sort(key=lambda x: x['marginPercent'])
 
+    return {
+        'winning_margins': winning_margins,
+    }
+
+
+def stage_myagkov(cache, constituency_data, store, area_name_map):
     # ═══════════════════════════════════════════════════════════════
     # ── MYAGKOV-ORDESHOOK: Turnout vs Winner Vote-Share ──
     # In a clean election, higher turnout should NOT systematically
@@ -1370,21 +1436,16 @@ def main():
     # (r > 0.3) between turnout and the winner's % is a classic
     # ballot-stuffing fingerprint (Myagkov, Ordeshook & Shakin 2009).
     # ═══════════════════════════════════════════════════════════════
-    import math
 
     myagkov_points = []      # per-area scatter data
     myagkov_party_corr = []  # per-party Pearson r
     myagkov_flagged = []     # high-turnout + high-share outliers
 
     # Load ECT API stats_cons for actual voter turnout percentages
-    ECT_STATS_CONS_FILE = os.path.join(BASE_DIR, 'data', 'ect_api', 'stats_cons.json')
-    ECT_INFO_PROVINCE_FILE = os.path.join(BASE_DIR, 'data', 'ect_api', 'info_province.json')
     ect_turnout_map = {}  # areaCode (e.g. "1001") -> percent_turn_out
     if os.path.exists(ECT_STATS_CONS_FILE) and os.path.exists(ECT_INFO_PROVINCE_FILE):
-        with open(ECT_STATS_CONS_FILE, 'r', encoding='utf-8') as f:
-            ect_stats = json.load(f)
-        with open(ECT_INFO_PROVINCE_FILE, 'r', encoding='utf-8') as f:
-            ect_prov_info = json.load(f)
+        ect_stats = load_json(ECT_STATS_CONS_FILE, cache)
+        ect_prov_info = load_json(ECT_INFO_PROVINCE_FILE, cache)
         # Build prov_id -> province_id mapping dynamically from info_province
         PROV_ID_MAP = {}
         for p in ect_prov_info.get('province', []):
@@ -1415,11 +1476,8 @@ def main():
         turnout_pct = ect_turnout_map.get(ac, 0)
         if turnout_pct == 0:
             # Fallback: calculate from MP votes / eligible
-            mp_file_path = os.path.join(MP_DIR, f'{ac}.json')
-            if os.path.exists(mp_file_path) and eligible > 0:
-                with open(mp_file_path, 'r', encoding='utf-8') as f:
-                    mp_raw_tmp = json.load(f)
-                total_votes = sum(e['voteTotal'] for e in mp_raw_tmp.get('entries', []))
+            if store.has_mp(ac) and eligible > 0:
+                total_votes = store.mp_totals[ac]
                 turnout_pct = total_votes / eligible * 100 if eligible > 0 else 0
 
         top = cd.get('topEntries', [])
@@ -1541,6 +1599,15 @@ def main():
 
     print(f"  🔬 Myagkov-Ordeshook: {len(myagkov_points)} areas, overall r={overall_r}, flagged={len(myagkov_flagged)}")
 
+    return {
+        'myagkov_points': myagkov_points,
+        'myagkov_party_corr': myagkov_party_corr,
+        'myagkov_flagged': myagkov_flagged,
+        'myagkov_meta': myagkov_meta,
+    }
+
+
+def stage_spoiled_comparison(constituency_data, referendum_data, area_name_map, store):
     # ═══════════════════════════════════════════════════════════════
     # ── SPOILED BALLOT COMPARISON: MP Election vs Referendum ──
     # Both ballots cast on the same day by the same voters.
@@ -1572,12 +1639,9 @@ def main():
         ref_nonvalid_pct = ref_nonvalid / ref_total * 100
 
         # --- MP election data ---
-        mp_file_path = os.path.join(MP_DIR, f'{ac}.json')
-        if not os.path.exists(mp_file_path):
+        if not store.has_mp(ac):
             continue
-        with open(mp_file_path, 'r', encoding='utf-8') as f:
-            mp_raw = json.load(f)
-        mp_valid = sum(e['voteTotal'] for e in mp_raw['entries'])
+        mp_valid = store.mp_totals[ac]
 
         # Use refTotal as actual turnout (same voters)
         mp_nonvalid = max(0, ref_total - mp_valid)
@@ -1637,6 +1701,13 @@ def main():
     spoiled_comparison.sort(key=lambda x: x['delta'], reverse=True)
     print(f"  📊 Spoiled Comparison: {len(spoiled_comparison)} areas, avg MP non-valid={spoiled_comparison_meta.get('avgMpNonValid', 0)}%, avg Ref non-valid={spoiled_comparison_meta.get('avgRefNonValid', 0)}%, avg Δ={spoiled_comparison_meta.get('avgDelta', 0)}%")
 
+    return {
+        'spoiled_comparison': spoiled_comparison,
+        'spoiled_comparison_meta': spoiled_comparison_meta,
+    }
+
+
+def stage_election_comparison(constituency_data, store, referendum_data):
     # ═══════════════════════════════════════════════════════════════
     # ── NATIONAL ELECTION COMPARISON: 66 vs 69 ──
     # Election 66 data from Thai PBS API (seats-by-party.json summaryVote)
@@ -1663,11 +1734,8 @@ def main():
     e69_ref_no = 0
     e69_ref_good = 0
     for ac in constituency_data:
-        mp_path = os.path.join(MP_DIR, f'{ac}.json')
-        if os.path.exists(mp_path):
-            with open(mp_path, 'r', encoding='utf-8') as f:
-                mp_raw_69 = json.load(f)
-            e69_valid_mp += sum(e['voteTotal'] for e in mp_raw_69['entries'])
+        if store.has_mp(ac):
+            e69_valid_mp += store.mp_totals[ac]
         rd = referendum_data.get(ac)
         if rd:
             e69_ref_total += rd.get('totalVotes', 0)
@@ -1730,6 +1798,13 @@ def main():
     }
     print(f"  🗳️ Election Comparison: 66 turnout={e66_turnout}% | 69 turnout={e69_turnout}% | 66 nonvalid={e66_nonvalid}% | 69 MP nonvalid={e69_spoiled_mp}% | 69 Ref nonvalid={e69_spoiled_ref}%")
 
+    return {
+        'election_comparison': election_comparison,
+    }
+
+
+def stage_ensemble_features(constituency_data, vm, paired_rows, store, turnout_anomaly,
+                            referendum_data, memo):
     # ═══════════════════════════════════════════════════════════════
     # ── ENSEMBLE SUSPICION SCORE ──
     # Combines 10 statistical indicators to produce a suspicion score
@@ -1741,36 +1816,8 @@ def main():
     #  4. Competition        9. Voters per Station
     #  5. Consistency       10. Benford's Law (1st-digit)
     # ═══════════════════════════════════════════════════════════════
-    import statistics as stat_module
-    import random as rng_module
-    import math
-    import bisect
-    rng_module.seed(42)  # Reproducible results
-
     print("  🧪 Building Ensemble Model...")
 
-    def robust_z_score(value, values_list):
-        """Compute Robust Z-Score using Median and IQR instead of Mean/StdDev."""
-        if len(values_list) < 5:
-            return 0.0
-        sorted_vals = sorted(values_list)
-        n = len(sorted_vals)
-        q1 = sorted_vals[n // 4]
-        q3 = sorted_vals[3 * n // 4]
-        median = stat_module.median(sorted_vals)
-        iqr = q3 - q1
-        if iqr == 0:
-            return 0.0
-        return 0.6745 * (value - median) / (iqr / 2)
-
-    def population_weight(eligible_voters, all_eligible):
-        """Areas with very few voters → weight down to reduce false positives."""
-        if not all_eligible:
-            return 1.0
-        median_pop = stat_module.median(all_eligible)
-        ratio = eligible_voters / median_pop if median_pop > 0 else 1.0
-        return max(0.5, min(1.2, 0.7 + 0.3 * ratio))
-
     # Collect eligible voters for population weighting
     eligible_by_area = {}
     all_eligible_list = []
@@ -1783,52 +1830,40 @@ def main():
     # ── Component 1: MP-PL Gap ──
     gap_scores = {}
     all_gap_pcts = []
-    for mp_file in mp_files:
-        ac = os.path.basename(mp_file).replace('.json', '')
-        pl_file_path = os.path.join(PL_DIR, f'{ac}.json')
-        if not os.path.exists(pl_file_path):
-            continue
-        with open(mp_file, 'r', encoding='utf-8') as f:
-            mp_raw = json.load(f)
-        with open(pl_file_path, 'r', encoding='utf-8') as f:
-            pl_raw = json.load(f)
-
-        mp_winner_entry = sorted(mp_raw['entries'], key=lambda x: -x['voteTotal'])[0]
-        pl_votes_map = {e['partyCode']: e['voteTotal'] for e in pl_raw['entries']}
-        pl_for_winner = pl_votes_map.get(mp_winner_entry['partyCode'], 0)
-
-        if mp_winner_entry['voteTotal'] > 0:
-            gap_pct = (mp_winner_entry['voteTotal'] - pl_for_winner) / mp_winner_entry['voteTotal'] * 100
-        else:
-            gap_pct = 0
-        gap_pct = max(0, gap_pct)
+    # Top MP vote-getter per area vs the PL votes of the same party
+    gap_top_party = vm.top_party[paired_rows]
+    gap_mp_votes = vm.cand_votes[paired_rows].max(axis=1)
+    gap_pl_votes = vm.pl_votes[paired_rows, gap_top_party]
+    gap_raw = (gap_mp_votes - gap_pl_votes) / np.maximum(gap_mp_votes, 1) * 100
+    for k, ac in enumerate(store.paired_codes):
+        gap_pct = max(0, float(gap_raw[k])) if gap_mp_votes[k] > 0 else 0
         all_gap_pcts.append(gap_pct)
         gap_scores[ac] = {
             'gapPercent': gap_pct,
-            'mpVotes': mp_winner_entry['voteTotal'],
-            'plVotes': pl_for_winner,
-            'winnerPartyCode': mp_winner_entry['partyCode'],
+            'mpVotes': int(gap_mp_votes[k]),
+            'plVotes': int(gap_pl_votes[k]),
+            'winnerPartyCode': vm.party_codes[gap_top_party[k]],
         }
 
-    for ac in gap_scores:
-        rz = robust_z_score(gap_scores[ac]['gapPercent'], all_gap_pcts)
+    gap_rz = robust_z_scores([g['gapPercent'] for g in gap_scores.values()], all_gap_pcts)
+    for ac, rz in zip(gap_scores, gap_rz):
         gap_scores[ac]['robustZ'] = rz
         gap_scores[ac]['scaledScore'] = max(0, min(100, rz * 20))
 
     # ── Component 2: PL Deviation ──
+    # Per-party PL vote columns over the areas where the party is on the ballot
+    pl_rows = vm.rows(store.pl_codes)
+    pl_area_votes = vm.pl_votes[pl_rows]
+    pl_area_present = vm.pl_present[pl_rows]
     pl_by_party_all = {}
-    pl_by_area_all = {}
-    for pl_file_path in sorted(glob.glob(os.path.join(PL_DIR, '*.json'))):
-        ac = os.path.basename(pl_file_path).replace('.json', '')
-        with open(pl_file_path, 'r', encoding='utf-8') as f:
-            pl_raw = json.load(f)
-        pl_by_area_all[ac] = {}
-        for e in pl_raw['entries']:
-            pc = e['partyCode']
-            if pc not in pl_by_party_all:
-                pl_by_party_all[pc] = []
-            pl_by_party_all[pc].append(e['voteTotal'])
-            pl_by_area_all[ac][pc] = e['voteTotal']
+    pl_by_area_all = {ac: {} for ac in store.pl_codes}
+    for j, pc in enumerate(vm.party_codes):
+        col = pl_area_votes[pl_area_present[:, j], j]
+        if len(col):
+            pl_by_party_all[pc] = col.tolist()
+    for k, ac in enumerate(store.pl_codes):
+        for j in np.flatnonzero(pl_area_present[k]):
+            pl_by_area_all[ac][vm.party_codes[j]] = int(pl_area_votes[k, j])
 
     pl_baselines = {}
     for pc, votes in pl_by_party_all.items():
@@ -1843,20 +1878,27 @@ def main():
 
     small_party_codes = [pc for pc, b in pl_baselines.items() if b['median'] < 3000]
 
+    # Area × small-party robust z matrix, one scaler fitted per party column
+    small_cols = [vm.party_column(pc) for pc in small_party_codes]
+    dev_z = np.zeros((len(store.pl_codes), len(small_cols)))
+    for s_idx, (pc, j) in enumerate(zip(small_party_codes, small_cols)):
+        present = pl_area_present[:, j]
+        dev_z[present, s_idx] = RobustScaler().fit(pl_by_party_all[pc]).transform(pl_area_votes[present, j])
+    # First party (in small_party_codes order) reaching the area's max positive z
+    dev_best = dev_z.argmax(axis=1) if small_cols else np.zeros(len(store.pl_codes), dtype=np.int64)
+
     dev_scores = {}
-    for ac in pl_by_area_all:
+    for k, ac in enumerate(store.pl_codes):
         max_robust_z = 0
         top_dev_party = ''
         top_dev_votes = 0
         top_dev_baseline = 0
-        for pc in small_party_codes:
-            if pc in pl_by_area_all[ac] and pc in pl_baselines:
-                rz = robust_z_score(pl_by_area_all[ac][pc], pl_by_party_all[pc])
-                if rz > max_robust_z:
-                    max_robust_z = rz
-                    top_dev_party = pc
-                    top_dev_votes = pl_by_area_all[ac][pc]
-                    top_dev_baseline = pl_baselines[pc]['median']
+        if small_cols and dev_z[k, dev_best[k]] > 0:
+            pc = small_party_codes[dev_best[k]]
+            max_robust_z = float(dev_z[k, dev_best[k]])
+            top_dev_party = pc
+            top_dev_votes = pl_by_area_all[ac][pc]
+            top_dev_baseline = pl_baselines[pc]['median']
         dev_scores[ac] = {
             'robustZScore': max_robust_z,
             'scaledScore': min(max_robust_z * 15, 100),
@@ -1869,8 +1911,9 @@ def main():
     # ── Component 3: Turnout anomaly ──
     turnout_scores = {}
     all_turnout_for_robust = [t['deviation'] for t in turnout_anomaly]
-    for t in turnout_anomaly:
-        rz = abs(robust_z_score(t['deviation'], all_turnout_for_robust))
+    turnout_rz = robust_z_scores(all_turnout_for_robust, all_turnout_for_robust)
+    for t, rz in zip(turnout_anomaly, turnout_rz):
+        rz = abs(rz)
         turnout_scores[t['areaCode']] = {
             'deviation': t['deviation'],
             'robustZ': rz,
@@ -1878,15 +1921,10 @@ def main():
         }
 
     # ── Component 4: Competition / Concentration (Candidate Count) ──
-    candidate_counts = {}
-    all_candidate_counts = []
-    for mp_file in mp_files:
-        ac = os.path.basename(mp_file).replace('.json', '')
-        with open(mp_file, 'r', encoding='utf-8') as f:
-            mp_raw = json.load(f)
-        count = len(mp_raw['entries'])
-        candidate_counts[ac] = count
-        all_candidate_counts.append(count)
+    mp_rows = vm.rows(store.mp_codes)
+    candidate_count_arr = vm.cand_present[mp_rows].sum(axis=1)
+    candidate_counts = {ac: int(c) for ac, c in zip(store.mp_codes, candidate_count_arr)}
+    all_candidate_counts = [int(c) for c in candidate_count_arr]
 
     concentration_scores = {}
     all_concentrations = []
@@ -1900,10 +1938,10 @@ def main():
             all_concentrations.append(concentration)
             concentration_scores[ac] = concentration
 
-    for ac in list(concentration_scores.keys()):
+    concentration_rz = robust_z_scores(list(concentration_scores.values()), all_concentrations)
+    for ac, rz in zip(list(concentration_scores.keys()), concentration_rz):
         if not isinstance(concentration_scores[ac], dict):
             raw_val = concentration_scores[ac]
-            rz = robust_z_score(raw_val, all_concentrations)
             concentration_scores[ac] = {
                 'rawScore': raw_val,
                 'scaledScore': max(0, min(100, rz * 20)),
@@ -1913,28 +1951,17 @@ def main():
     # ── Component 5: Vote Consistency (MP total vs PL total) ──
     consistency_scores = {}
     all_consistency = []
-    for mp_file in mp_files:
-        ac = os.path.basename(mp_file).replace('.json', '')
-        pl_file_path = os.path.join(PL_DIR, f'{ac}.json')
-        if not os.path.exists(pl_file_path):
-            continue
-        with open(mp_file, 'r', encoding='utf-8') as f:
-            mp_raw = json.load(f)
-        with open(pl_file_path, 'r', encoding='utf-8') as f:
-            pl_raw = json.load(f)
-        total_mp = sum(e['voteTotal'] for e in mp_raw['entries'])
-        total_pl = sum(e['voteTotal'] for e in pl_raw['entries'])
-        if total_mp > 0:
-            diff_pct = abs(total_mp - total_pl) / total_mp * 100
-        else:
-            diff_pct = 0
+    cons_mp = vm.mp_total[paired_rows]
+    cons_raw = np.abs(cons_mp - vm.pl_total[paired_rows]) / np.maximum(cons_mp, 1) * 100
+    for k, ac in enumerate(store.paired_codes):
+        diff_pct = float(cons_raw[k]) if cons_mp[k] > 0 else 0
         all_consistency.append(diff_pct)
         consistency_scores[ac] = diff_pct
 
-    for ac in list(consistency_scores.keys()):
+    consistency_rz = robust_z_scores(list(consistency_scores.values()), all_consistency)
+    for ac, rz in zip(list(consistency_scores.keys()), consistency_rz):
         if not isinstance(consistency_scores[ac], dict):
             raw_val = consistency_scores[ac]
-            rz = robust_z_score(raw_val, all_consistency)
             consistency_scores[ac] = {
                 'diffPercent': raw_val,
                 'scaledScore': max(0, min(100, rz * 20)),
@@ -1954,12 +1981,9 @@ def main():
             bad_votes = rd.get('badVotes', 0)
         else:
             # Fallback to proxy if no referendum data
-            mp_file_path = os.path.join(MP_DIR, f'{ac}.json')
-            if not os.path.exists(mp_file_path) or ac not in eligible_by_area or eligible_by_area[ac] == 0:
+            if not store.has_mp(ac) or ac not in eligible_by_area or eligible_by_area[ac] == 0:
                 continue
-            with open(mp_file_path, 'r', encoding='utf-8') as f:
-                mp_raw = json.load(f)
-            total_valid = sum(e['voteTotal'] for e in mp_raw['entries'])
+            total_valid = store.mp_totals[ac]
             eligible = eligible_by_area[ac]
             turnout_pct = constituency_data.get(ac, {}).get('voteProgressPercent', 0)
             est_voters = eligible * turnout_pct / 100.0 if turnout_pct > 0 else total_valid
@@ -1968,28 +1992,27 @@ def main():
         all_spoiled_ratios.append(bad_pct)
         spoiled_scores[ac] = {'ratio': round(bad_pct, 2), 'spoiledEstimate': round(bad_votes), 'isOfficial': rd is not None}
 
-    for ac in spoiled_scores:
-        rz = robust_z_score(spoiled_scores[ac]['ratio'], all_spoiled_ratios)
+    spoiled_rz = robust_z_scores([s['ratio'] for s in spoiled_scores.values()], all_spoiled_ratios)
+    for ac, rz in zip(spoiled_scores, spoiled_rz):
         spoiled_scores[ac]['scaledScore'] = max(0, min(100, rz * 20))
 
     # ── Component 7 (NEW): Winner Dominance (HHI-based) ──
     # HHI = sum of squared vote shares. Higher HHI = less competitive
     dominance_scores = {}
     all_hhi = []
-    for mp_file in mp_files:
-        ac = os.path.basename(mp_file).replace('.json', '')
-        with open(mp_file, 'r', encoding='utf-8') as f:
-            mp_raw = json.load(f)
-        total = sum(e['voteTotal'] for e in mp_raw['entries'])
-        if total == 0:
+    dom_total = vm.mp_total[mp_rows]
+    dom_shares = vm.cand_votes[mp_rows] / np.maximum(dom_total, 1)[:, None]
+    dom_hhi = (dom_shares * dom_shares).sum(axis=1) * 10000  # Normalized HHI (0-10000)
+    dom_winner_share = dom_shares.max(axis=1) * 100
+    for k, ac in enumerate(store.mp_codes):
+        if dom_total[k] == 0:
             continue
-        shares = [e['voteTotal'] / total for e in mp_raw['entries']]
-        hhi = sum(s * s for s in shares) * 10000  # Normalized HHI (0-10000)
+        hhi = float(dom_hhi[k])
         all_hhi.append(hhi)
-        dominance_scores[ac] = {'hhi': hhi, 'winnerShare': max(shares) * 100}
+        dominance_scores[ac] = {'hhi': hhi, 'winnerShare': float(dom_winner_share[k])}
 
-    for ac in dominance_scores:
-        rz = robust_z_score(dominance_scores[ac]['hhi'], all_hhi)
+    dominance_rz = robust_z_scores([d['hhi'] for d in dominance_scores.values()], all_hhi)
+    for ac, rz in zip(dominance_scores, dominance_rz):
         dominance_scores[ac]['scaledScore'] = max(0, min(100, rz * 20))
 
     # ── Component 8: No-Vote Ratio (from Referendum) ──
@@ -2005,8 +2028,8 @@ def main():
             all_novote_ratios.append(no_pct)
             novote_scores[ac] = {'ratio': round(no_pct, 2), 'noVotes': no_votes}
 
-    for ac in novote_scores:
-        rz = robust_z_score(novote_scores[ac]['ratio'], all_novote_ratios)
+    novote_rz = robust_z_scores([n['ratio'] for n in novote_scores.values()], all_novote_ratios)
+    for ac, rz in zip(novote_scores, novote_rz):
         novote_scores[ac]['scaledScore'] = max(0, min(100, rz * 20))
 
     # ── Component 9: Voters per Station ──
@@ -2024,8 +2047,8 @@ def main():
             all_vps.append(vps)
             vps_scores[ac] = {'votersPerStation': round(vps, 1), 'eligible': eligible, 'stations': stations}
 
-    for ac in vps_scores:
-        rz = robust_z_score(vps_scores[ac]['votersPerStation'], all_vps)
+    vps_rz = robust_z_scores([v['votersPerStation'] for v in vps_scores.values()], all_vps)
+    for ac, rz in zip(vps_scores, vps_rz):
         # Use absolute z-score: both extremely high AND low are anomalous
         vps_scores[ac]['scaledScore'] = max(0, min(100, abs(rz) * 20))
 
@@ -2037,69 +2060,34 @@ def main():
     # We apply per-area Chi-square goodness-of-fit test
     print("  📐 Computing Benford's Law Analysis...")
 
-    BENFORD_EXPECTED = {d: math.log10(1 + 1/d) for d in range(1, 10)}
-
-    def first_digit(n):
-        """Extract the first digit of a positive integer."""
-        if n <= 0:
-            return None
-        while n >= 10:
-            n //= 10
-        return n
-
-    def chi_square_benford(digit_counts, total_count):
-        """Compute Chi-square statistic for Benford's Law goodness-of-fit.
-        Returns (chi2, p_value_approx) using simplified p-value estimation."""
-        if total_count < 10:
-            return 0.0, 1.0
-        chi2 = 0.0
-        for d in range(1, 10):
-            observed = digit_counts.get(d, 0)
-            expected = BENFORD_EXPECTED[d] * total_count
-            if expected > 0:
-                chi2 += (observed - expected) ** 2 / expected
-        # Degrees of freedom = 8 (9 digits - 1)
-        # Approximate p-value using Wilson-Hilferty transformation
-        df = 8
+    # All digit tests (1st / 2nd / last) come from the digit histograms of
+    # the MP + PL vote counts of each paired area; histograms of areas whose
+    # files did not change are reused, global tests sum the cached rows
+    def area_digits(area_code):
+        values = [entry.get('voteTotal', 0) for entry in store.mp[area_code] + store.pl[area_code]]
+        first, second, last = digit_histograms(values, np.zeros(len(values), dtype=np.int64), 1)
+        return first[0], second[0], last[0]
+
+    digit_hists = memo.map('digit_histograms', area_digits, store.paired_codes, key=store.area_hash)
+    digit_results = tests_from_counts(*(
+        np.array([h[i] for h in digit_hists], dtype=np.int64).reshape(len(digit_hists), width)
+        for i, width in enumerate((9, 10, 10))
+    ))
+
+    def chi2_p_rounded(chi2, p_value):
+        """(chi2, p) as stored in the output: rounded, or (0.0, 1.0) when chi2 is 0."""
         if chi2 <= 0:
             return 0.0, 1.0
-        # Normalized chi-square → approximate z-score
-        z = ((chi2 / df) ** (1/3) - (1 - 2/(9*df))) / math.sqrt(2/(9*df))
-        # Convert z to p-value using logistic approximation of normal CDF
-        p_approx = 1.0 / (1.0 + math.exp(1.7 * z))
-        return round(chi2, 3), round(max(0, min(1, p_approx)), 4)
+        return round(chi2, 3), round(max(0, min(1, p_value)), 4)
 
     # Collect first digits from all vote counts in each area (MP + PL)
     benford_scores = {}
     all_benford_chi2 = []
-    # Also collect global digit distribution
-    global_digit_counts = {d: 0 for d in range(1, 10)}
-    global_total = 0
-
-    for mp_file in mp_files:
-        area_code = os.path.basename(mp_file).replace('.json', '')
-        pl_file = os.path.join(PL_DIR, f'{area_code}.json')
-        if not os.path.exists(pl_file):
-            continue
+    fd_test = digit_results['first']
+    fd_rows = fd_test.total >= 10  # enough data points for reliable Benford analysis
 
-        with open(mp_file, 'r', encoding='utf-8') as f:
-            mp_data_b = json.load(f)
-        with open(pl_file, 'r', encoding='utf-8') as f:
-            pl_data_b = json.load(f)
-
-        # Collect all vote counts for this area
-        area_votes = []
-        for entry in mp_data_b.get('entries', []):
-            v = entry.get('voteTotal', 0)
-            if v > 0:
-                area_votes.append(v)
-        for entry in pl_data_b.get('entries', []):
-            v = entry.get('voteTotal', 0)
-            if v > 0:
-                area_votes.append(v)
-
-        if len(area_votes) < 10:
-            # Not enough data points for reliable Benford analysis
+    for k, area_code in enumerate(store.paired_codes):
+        if not fd_rows[k]:
             benford_scores[area_code] = {
                 'chi2': 0.0,
                 'pValue': 1.0,
@@ -2109,38 +2097,33 @@ def main():
             }
             continue
 
-        # Count first digits
-        digit_counts = {d: 0 for d in range(1, 10)}
-        for v in area_votes:
-            fd = first_digit(v)
-            if fd is not None and 1 <= fd <= 9:
-                digit_counts[fd] += 1
-                global_digit_counts[fd] += 1
-                global_total += 1
-
-        total_numbers = sum(digit_counts.values())
-        chi2, p_val = chi_square_benford(digit_counts, total_numbers)
+        chi2, p_val = chi2_p_rounded(float(fd_test.chi2[k]), float(fd_test.p_value[k]))
         all_benford_chi2.append(chi2)
 
         benford_scores[area_code] = {
             'chi2': chi2,
             'pValue': p_val,
-            'digitCounts': digit_counts,
-            'totalNumbers': total_numbers,
+            'digitCounts': dict(zip(fd_test.digits, fd_test.counts[k].tolist())),
+            'totalNumbers': int(fd_test.total[k]),
             'scaledScore': 0,  # Will be computed after collecting all
         }
 
+    # Global digit distribution over the areas tested above
+    global_fd_counts, global_total, global_fd_chi2, global_fd_p = fd_test.global_test(fd_rows)
+    global_digit_counts = dict(zip(fd_test.digits, global_fd_counts.tolist()))
+
     # Scale chi2 to 0-100 using robust z-score
     if all_benford_chi2:
+        chi2_scaler = RobustScaler().fit(all_benford_chi2)
         for ac in benford_scores:
             if benford_scores[ac]['totalNumbers'] >= 10:
-                rz = robust_z_score(benford_scores[ac]['chi2'], all_benford_chi2)
+                rz = float(chi2_scaler.transform([benford_scores[ac]['chi2']])[0])
                 benford_scores[ac]['scaledScore'] = max(0, min(100, rz * 20))
 
     # Compute global Benford distribution for frontend display
     global_benford_distribution = []
     for d in range(1, 10):
-        expected_pct = BENFORD_EXPECTED[d] * 100
+        expected_pct = BENFORD_FIRST[d - 1] * 100
         observed_pct = (global_digit_counts[d] / global_total * 100) if global_total > 0 else 0
         global_benford_distribution.append({
             'digit': d,
@@ -2150,13 +2133,38 @@ def main():
         })
 
     # Compute global chi-square
-    global_chi2, global_benford_p = chi_square_benford(global_digit_counts, global_total)
+    global_chi2, global_benford_p = chi2_p_rounded(global_fd_chi2, global_fd_p) if global_total >= 10 else (0.0, 1.0)
 
     benford_conform = sum(1 for b in benford_scores.values() if b['pValue'] > 0.05)
     benford_deviate = sum(1 for b in benford_scores.values() if b['pValue'] <= 0.05 and b['totalNumbers'] >= 10)
     print(f"  📐 Benford: conform={benford_conform}, deviate(p≤0.05)={benford_deviate}")
     print(f"  📐 Global χ²={global_chi2}, p={global_benford_p}, total numbers={global_total}")
 
+    return {
+        'eligible_by_area': eligible_by_area,
+        'all_eligible_list': all_eligible_list,
+        'gap_scores': gap_scores,
+        'dev_scores': dev_scores,
+        'turnout_scores': turnout_scores,
+        'candidate_counts': candidate_counts,
+        'concentration_scores': concentration_scores,
+        'consistency_scores': consistency_scores,
+        'spoiled_scores': spoiled_scores,
+        'dominance_scores': dominance_scores,
+        'novote_scores': novote_scores,
+        'vps_scores': vps_scores,
+        'digit_results': digit_results,
+        'benford_scores': benford_scores,
+        'global_total': global_total,
+        'global_benford_distribution': global_benford_distribution,
+        'global_chi2': global_chi2,
+        'global_benford_p': global_benford_p,
+        'benford_conform': benford_conform,
+        'benford_deviate': benford_deviate,
+    }
+
+
+def stage_null_model(mc_iterations, paired_rows, vm, mc_batch_size, seed, jobs):
     # ═══════════════════════════════════════════════════════════════════════
     # ── Monte Carlo Null Model: Twin-Number Effect Statistical Validation ──
     # ═══════════════════════════════════════════════════════════════════════
@@ -2167,7 +2175,7 @@ def main():
     #   1. Compute OBSERVED lift per number j:
     #      lift_j = mean(PL share of party j in areas where winner number == j)
     #              - national PL share of party j
-    #   2. Monte Carlo null model (500 iterations):
+    #   2. Monte Carlo null model (mc_iterations shuffles, default 100,000):
     #      - Shuffle winner numbers randomly across areas
     #      - Re-compute lift under random assignment
     #      - Build null distribution of max|z| across all 20 numbers
@@ -2178,132 +2186,74 @@ def main():
     # ═══════════════════════════════════════════════════════════════════════
     print("  🎲 Running Monte Carlo Null Model (Twin-Number Effect)...")
 
-    N_MC_ITERATIONS = 500
     MAX_PARTY_NUM = 20  # Test party numbers 1-20 (covers all major parties)
 
     # Step 1: Collect observed data per area
     # For each area: winner candidate number, PL vote shares for each party
-    area_twin_data = []  # list of {winnerNum, plShares: {partyNum: voteShare}}
-    national_pl_totals = {}  # partyNum -> total PL votes nationally
-    national_pl_total_all = 0
-
-    for mp_file in mp_files:
-        ac = os.path.basename(mp_file).replace('.json', '')
-        pl_file_path = os.path.join(PL_DIR, f'{ac}.json')
-        if not os.path.exists(pl_file_path):
-            continue
-        with open(mp_file, 'r', encoding='utf-8') as f:
-            mp_raw = json.load(f)
-        with open(pl_file_path, 'r', encoding='utf-8') as f:
-            pl_raw = json.load(f)
-
-        winner = next((e for e in mp_raw['entries'] if e['rank'] == 1), None)
-        if not winner:
-            continue
-        winner_num = int(winner['candidateCode'][-2:])
-
-        # PL vote shares for this area
-        total_pl_area = sum(e['voteTotal'] for e in pl_raw['entries'])
-        if total_pl_area == 0:
-            continue
-
-        pl_shares = {}
-        for e in pl_raw['entries']:
-            pnum = get_party_num(e['partyCode'])
-            if 1 <= pnum <= MAX_PARTY_NUM:
-                pl_shares[pnum] = e['voteTotal'] / total_pl_area
-                if pnum not in national_pl_totals:
-                    national_pl_totals[pnum] = 0
-                national_pl_totals[pnum] += e['voteTotal']
-                national_pl_total_all += e['voteTotal']
-
-        area_twin_data.append({
-            'areaCode': ac,
-            'winnerNum': winner_num,
-            'plShares': pl_shares,
-            'totalPlVotes': total_pl_area,
-        })
+    # twin_shares[a, j] = PL share of party number j in area a (column 0 unused)
+    twin_rows = paired_rows[(vm.winner_num[paired_rows] >= 0) & (vm.pl_total[paired_rows] > 0)]
+    num_cols = vm.num_columns(MAX_PARTY_NUM)
+    twin_votes = np.zeros((len(twin_rows), MAX_PARTY_NUM + 1), dtype=np.int64)
+    for j in range(1, MAX_PARTY_NUM + 1):
+        if num_cols[j] >= 0:
+            twin_votes[:, j] = vm.pl_votes[twin_rows, num_cols[j]]
+    twin_shares = twin_votes / vm.pl_total[twin_rows][:, None]
+    twin_winner_nums = vm.winner_num[twin_rows]
 
-    n_areas_mc = len(area_twin_data)
+    n_areas_mc = len(twin_rows)
 
     # National PL share for each party (baseline)
+    national_pl_totals = twin_votes.sum(axis=0)
+    national_pl_total_all = int(national_pl_totals.sum())
     national_pl_share = {}
     for pnum in range(1, MAX_PARTY_NUM + 1):
-        national_pl_share[pnum] = national_pl_totals.get(pnum, 0) / national_pl_total_all if national_pl_total_all > 0 else 0
+        national_pl_share[pnum] = int(national_pl_totals[pnum]) / national_pl_total_all if national_pl_total_all > 0 else 0
 
     # Step 2: Compute OBSERVED lift and z-score for each number j
-    def compute_lift_z(twin_data, winner_nums=None):
+    national_share_arr = np.array([0.0] + [national_pl_share[j] for j in range(1, MAX_PARTY_NUM + 1)])
+
+    def compute_lift_z(winner_nums):
         """Compute lift and z-score for each party number j.
-        If winner_nums is provided, use those instead of actual winner numbers.
+        winner_nums is aligned with the rows of twin_shares (observed or shuffled).
         Returns: {j: {'lift': float, 'z': float, 'n': int, 'mean_share': float, 'se': float}}
         """
-        results = {}
-        for j in range(1, MAX_PARTY_NUM + 1):
-            # Collect PL share of party j in areas where winner number == j
-            shares_in_group = []
-            for i, ad in enumerate(twin_data):
-                wn = winner_nums[i] if winner_nums else ad['winnerNum']
-                if wn == j:
-                    shares_in_group.append(ad['plShares'].get(j, 0))
-
-            n = len(shares_in_group)
-            if n < 2:
-                results[j] = {'lift': 0.0, 'z': 0.0, 'n': n, 'meanShare': 0.0, 'se': 0.0}
-                continue
-
-            p_national = national_pl_share.get(j, 0)
-            mean_share = sum(shares_in_group) / n
-            lift = mean_share - p_national
-
-            # Standard error: SE ≈ sqrt(p(1-p)/n) where p is national share
-            se = math.sqrt(p_national * (1 - p_national) / n) if p_national > 0 and p_national < 1 else 0
-            z = lift / se if se > 0 else 0.0
-
-            results[j] = {
-                'lift': lift,
-                'z': z,
-                'n': n,
-                'meanShare': mean_share,
-                'se': se,
+        counts, sums = group_stats(winner_nums, twin_shares)
+        lift, z, mean_share, se = lift_z(counts, sums, national_share_arr)
+        return {
+            j: {
+                'lift': float(lift[j]),
+                'z': float(z[j]),
+                'n': int(counts[j]),
+                'meanShare': float(mean_share[j]),
+                'se': float(se[j]),
             }
-        return results
+            for j in range(1, MAX_PARTY_NUM + 1)
+        }
 
     # Observed results
-    observed_results = compute_lift_z(area_twin_data)
+    observed_results = compute_lift_z(twin_winner_nums)
     observed_max_abs_z = max(abs(r['z']) for r in observed_results.values()) if observed_results else 0
 
-    # Step 3: Monte Carlo simulation — shuffle winner numbers
-    null_max_abs_z_dist = []  # Distribution of max|z| under null
-    # Also track per-number null z-score distributions for comparison
-    null_z_by_number = {j: [] for j in range(1, MAX_PARTY_NUM + 1)}
-
-    all_winner_nums = [ad['winnerNum'] for ad in area_twin_data]
+    # Step 3: Monte Carlo simulation — shuffle winner numbers, a batch of
+    # permutations at a time; null_z[i, j] = z of number j in shuffle i
+    def report_mc_progress(done, total):
+        print(f"    🎲 MC iteration {done}/{total}")
 
-    for mc_iter in range(N_MC_ITERATIONS):
-        # Shuffle winner numbers randomly across areas
-        shuffled_nums = list(all_winner_nums)
-        rng_module.shuffle(shuffled_nums)
-
-        # Compute lift/z under shuffled assignment
-        null_results = compute_lift_z(area_twin_data, winner_nums=shuffled_nums)
-
-        # Track max|z| for this iteration
-        max_abs_z_iter = max(abs(r['z']) for r in null_results.values()) if null_results else 0
-        null_max_abs_z_dist.append(max_abs_z_iter)
-
-        # Track per-number z-scores
-        for j in range(1, MAX_PARTY_NUM + 1):
-            null_z_by_number[j].append(null_results[j]['z'])
-
-        if (mc_iter + 1) % 100 == 0:
-            print(f"    🎲 MC iteration {mc_iter + 1}/{N_MC_ITERATIONS}")
-
-    null_max_abs_z_dist.sort()
+    null_z = simulate_null_z(
+        twin_winner_nums, twin_shares, national_share_arr, mc_iterations,
+        batch_size=mc_batch_size, seed=stage_seed(seed, 'twin_mc'), progress=report_mc_progress, jobs=jobs,
+    )
+    null_abs_z = np.abs(null_z[:, 1:])
+    null_max_abs_z = np.sort(null_abs_z.max(axis=1)) if mc_iterations else np.zeros(0)
+    # Distribution of max|z| under null
+    null_max_abs_z_dist = null_max_abs_z.tolist()
 
     # Step 4: Compute p-values
     # Per-number p-value: fraction of null iterations where |z_null| >= |z_observed|
     # Also compute MC-corrected p-value using max|z| distribution
-    mc_p_value_global = sum(1 for nz in null_max_abs_z_dist if nz >= observed_max_abs_z) / N_MC_ITERATIONS
+    mc_p_value_global = (
+        int((null_max_abs_z >= observed_max_abs_z).sum()) / mc_iterations if mc_iterations else 1.0
+    )
 
     # Bonferroni correction thresholds
     bonferroni_alpha = 0.05 / MAX_PARTY_NUM  # 0.0025
@@ -2314,11 +2264,11 @@ def main():
     significant_numbers = []
     for j in range(1, MAX_PARTY_NUM + 1):
         obs = observed_results[j]
-        null_zs = null_z_by_number[j]
+        null_zs = null_z[:, j]
 
         # Two-tailed p-value from null distribution
-        if null_zs:
-            p_mc = sum(1 for nz in null_zs if abs(nz) >= abs(obs['z'])) / len(null_zs)
+        if mc_iterations:
+            p_mc = int((null_abs_z[:, j - 1] >= abs(obs['z'])).sum()) / mc_iterations
         else:
             p_mc = 1.0
 
@@ -2341,8 +2291,8 @@ def main():
             'pValueMC': round(p_mc, 4),
             'isBonferroniSig': is_bonferroni_sig,
             # Null distribution stats for this number
-            'nullZMean': round(sum(null_zs) / len(null_zs), 3) if null_zs else 0,
-            'nullZStd': round(stat_module.stdev(null_zs), 3) if len(null_zs) > 1 else 0,
+            'nullZMean': round(float(null_zs.mean()), 3) if mc_iterations else 0,
+            'nullZStd': round(float(null_zs.std(ddof=1)), 3) if mc_iterations > 1 else 0,
         }
         null_model_per_number.append(result)
         if is_bonferroni_sig:
@@ -2361,13 +2311,13 @@ def main():
         for b in range(max_z_hist_bins):
             lo = hist_min + b * bin_width
             hi = lo + bin_width
-            count = sum(1 for v in null_max_abs_z_dist if lo <= v < hi)
+            count = int(((null_max_abs_z >= lo) & (null_max_abs_z < hi)).sum())
             max_z_histogram.append({
                 'binStart': round(lo, 2),
                 'binEnd': round(hi, 2),
                 'binMid': round((lo + hi) / 2, 2),
                 'count': count,
-                'density': round(count / N_MC_ITERATIONS, 4),
+                'density': round(count / mc_iterations, 4),
             })
     else:
         max_z_histogram = []
@@ -2404,7 +2354,7 @@ def main():
             null_percentiles[f'p{pctl}'] = round(null_max_abs_z_dist[idx], 3)
 
     null_model_meta = {
-        'nIterations': N_MC_ITERATIONS,
+        'nIterations': mc_iterations,
         'nAreas': n_areas_mc,
         'nPartyNumbers': MAX_PARTY_NUM,
         'observedMaxAbsZ': round(observed_max_abs_z, 3),
@@ -2416,7 +2366,7 @@ def main():
         'nullMaxZPercentiles': null_percentiles,
     }
 
-    print(f"  🎲 Monte Carlo complete: {N_MC_ITERATIONS} iterations, {n_areas_mc} areas")
+    print(f"  🎲 Monte Carlo complete: {mc_iterations} iterations, {n_areas_mc} areas")
     print(f"  🎲 Observed max|z| = {observed_max_abs_z:.3f}, MC global p = {mc_p_value_global:.4f}")
     print(f"  🎲 Bonferroni significant (|z|≥{bonferroni_z_critical}, p≤{bonferroni_alpha:.4f}): {len(significant_numbers)} numbers")
     if significant_numbers:
@@ -2425,6 +2375,19 @@ def main():
             party_id = f'PARTY-{str(j).zfill(4)}'
             print(f"    → #{j} {get_party_name(party_id)}: z={obs['z']:.3f}, lift={obs['lift']*100:.2f}pp, n={obs['n']}")
 
+    return {
+        'null_model_per_number': null_model_per_number,
+        'max_z_histogram': max_z_histogram,
+        'structural_bias': structural_bias,
+        'null_model_meta': null_model_meta,
+    }
+
+
+def stage_ensemble_score(gap_scores, dev_scores, turnout_scores, concentration_scores,
+                         consistency_scores, spoiled_scores, dominance_scores, novote_scores,
+                         vps_scores, benford_scores, eligible_by_area, all_eligible_list,
+                         area_name_map, focus_area_tags, constituency_data, referendum_data,
+                         candidate_counts, n_permutations, perm_block_size, seed, jobs):
     # ═══════════════════════════════════════════════════════
     # ── Entropy Weight Method (data-driven feature weights) ──
     # Instead of hardcoded 40/25/15/10/10, compute weights from
@@ -2615,26 +2578,22 @@ def main():
             'isOfficialSpoiledData': is_official_spoiled,
         })
 
-    # ── Permutation Test (1000 iterations) ──
-    print("  ⏳ Running permutation test (1000 iterations)...")
-    N_PERMUTATIONS = 1000
-    all_scaled_by_feature = {fn: feature_vectors[fn] for fn in feature_names}
-
-    null_scores = []
-    for _ in range(N_PERMUTATIONS):
-        shuffled = {fn: rng_module.sample(all_scaled_by_feature[fn], len(all_scaled_by_feature[fn]))
-                    for fn in feature_names}
-        for i in range(len(all_area_codes)):
-            s = sum(shuffled[fn][i % len(shuffled[fn])] * entropy_w[fn] for fn in feature_names)
-            null_scores.append(s)
-
-    null_scores.sort()
-    null_len = len(null_scores)
+    # ── Permutation Test (n_permutations shuffles, chunked) ──
+    print(f"  ⏳ Running permutation test ({n_permutations} iterations)...")
+    # Pooled null: every feature shuffled independently, weighted sum per area.
+    # Blocks of shuffles only update exceedance counts of the observed scores.
+    def report_perm_progress(done, total):
+        print(f"    ⏳ Permutation {done}/{total}")
+
+    perm_p_values = permutation_p_values(
+        [feature_vectors[fn] for fn in feature_names],
+        [entropy_w[fn] for fn in feature_names],
+        [item['rawScore'] for item in ensemble_analysis],
+        n_permutations, block_size=perm_block_size, seed=stage_seed(seed, 'ensemble_perm'),
+        progress=report_perm_progress, jobs=jobs,
+    )
 
-    for item in ensemble_analysis:
-        observed = item['rawScore']
-        idx = bisect.bisect_left(null_scores, observed)
-        p_value = (null_len - idx) / null_len
+    for item, p_value in zip(ensemble_analysis, perm_p_values.tolist()):
         item['pValue'] = round(p_value, 4)
         if p_value < 0.01:
             item['confidence'] = 'very-high'
@@ -2647,160 +2606,91 @@ def main():
 
     print(f"  ✅ Permutation test complete. p<0.01: {sum(1 for e in ensemble_analysis if e['pValue'] < 0.01)}, p<0.05: {sum(1 for e in ensemble_analysis if e['pValue'] < 0.05)}")
 
+    return {
+        'all_area_codes': all_area_codes,
+        'feature_names': feature_names,
+        'entropy_w': entropy_w,
+        'scored_areas': ensemble_analysis,
+    }
+
+
+def stage_ensemble_spatial(all_area_codes, area_name_map, cache, scored_areas,
+                           moran_permutations, moran_block_size, seed, jobs, feature_names,
+                           entropy_w, n_permutations, global_chi2, global_benford_p,
+                           global_benford_distribution, global_total, benford_conform,
+                           benford_deviate):
     # ═══════════════════════════════════════════════════════
     # ── Spatial Analysis: Moran's I ──
-    # Build province-based adjacency (same province = neighbors)
-    # Then compute Local Moran's I for each area
+    # Neighbours = other areas of the same province + areas of adjacent
+    # provinces (queen contiguity of the province polygons), as one sparse
+    # weights matrix; then compute Local Moran's I for each area
     # ═══════════════════════════════════════════════════════
+    # Spatial results, labels and final scores are added to the scored items
+    # in place (this stage is their only consumer) and the list is re-sorted
+    ensemble_analysis = scored_areas
     print("  🗺️ Computing Spatial Analysis (Moran's I)...")
 
-    # Thailand province adjacency (2-digit prefix from area code)
-    # Build adjacency: areas in the same province are neighbors
-    province_by_area = {}
-    areas_by_province = {}
+    # Province = 2-digit prefix of the area code; polygons are keyed by the
+    # English province name
+    geo_by_prefix = {}
     for ac in all_area_codes:
-        prov_code = ac[:2]
-        province_by_area[ac] = prov_code
-        if prov_code not in areas_by_province:
-            areas_by_province[prov_code] = []
-        areas_by_province[prov_code].append(ac)
-
-    # Also add cross-province adjacency for neighboring provinces
-    # Thai province code adjacency (approximate geographic neighbors)
-    PROVINCE_NEIGHBORS = {
-        '10': ['11', '12', '13'],  # BKK neighbors
-        '11': ['10', '13'],  # สมุทรปราการ
-        '12': ['10', '13'],  # นนทบุรี
-        '13': ['10', '11', '12', '14'],  # ปทุมธานี
-        '14': ['13', '15', '16', '17', '18', '19'],  # อยุธยา
-        '15': ['14', '16'],  # อ่างทอง
-        '16': ['14', '15', '17', '19'],  # ลพบุรี
-        '17': ['14', '15', '18'],  # สิงห์บุรี
-        '18': ['14', '17', '60'],  # ชัยนาท
-        '19': ['14', '16', '30'],  # สระบุรี
-        '20': ['21', '24', '25'],  # ชลบุรี
-        '21': ['20', '22'],  # ระยอง
-        '22': ['21', '23'],  # จันทบุรี
-        '23': ['22'],  # ตราด
-        '24': ['20', '25', '26'],  # ฉะเชิงเทรา
-        '25': ['24', '26', '27'],  # ปราจีนบุรี
-        '26': ['13', '24', '25'],  # นครนายก
-        '27': ['25'],  # สระแก้ว
-        '30': ['19', '31', '32', '33', '36'],  # นครราชสีมา
-        '31': ['30', '32', '33'],  # บุรีรัมย์
-        '32': ['30', '31', '33', '34'],  # สุรินทร์
-        '33': ['30', '31', '32', '34'],  # ศรีสะเกษ
-        '34': ['33', '35', '37'],  # อุบลราชธานี
-        '35': ['34', '45'],  # ยโสธร
-        '36': ['30', '40'],  # ชัยภูมิ
-        '37': ['34'],  # อำนาจเจริญ
-        '38': ['43', '47'],  # บึงกาฬ
-        '39': ['41', '42'],  # หนองบัวลำภู
-        '40': ['36', '44', '46'],  # ขอนแก่น
-        '41': ['39', '40', '43', '47'],  # อุดรธานี
-        '42': ['39', '41'],  # เลย
-        '43': ['38', '41', '47'],  # หนองคาย
-        '44': ['40', '45', '46'],  # มหาสารคาม
-        '45': ['35', '44', '46'],  # ร้อยเอ็ด
-        '46': ['40', '44', '45'],  # กาฬสินธุ์
-        '47': ['38', '41', '43', '48'],  # สกลนคร
-        '48': ['47', '49'],  # นครพนม
-        '49': ['48'],  # มุกดาหาร
-        '50': ['51', '57', '58'],  # เชียงใหม่
-        '51': ['50'],  # ลำพูน
-        '52': ['54'],  # ลำปาง
-        '53': ['54', '55'],  # อุตรดิตถ์
-        '54': ['52', '53', '55'],  # แพร่
-        '55': ['53', '54', '57'],  # น่าน
-        '56': ['50', '57'],  # พะเยา
-        '57': ['50', '55', '56'],  # เชียงราย
-        '58': ['50'],  # แม่ฮ่องสอน
-        '60': ['18', '61'],  # นครสวรรค์
-        '61': ['60'],  # อุทัยธานี
-        '62': ['63', '64'],  # กำแพงเพชร
-        '63': ['62', '64'],  # ตาก
-        '64': ['62', '63', '65'],  # สุโขทัย
-        '65': ['64', '66', '67'],  # พิษณุโลก
-        '66': ['65', '67'],  # พิจิตร
-        '67': ['65', '66'],  # เพชรบูรณ์
-        '70': ['71', '73'],  # ราชบุรี
-        '71': ['70', '72'],  # กาญจนบุรี
-        '72': ['71', '73', '74', '75'],  # สุพรรณบุรี
-        '73': ['70', '72', '74'],  # นครปฐม
-        '74': ['72', '73', '75'],  # สมุทรสาคร
-        '75': ['72', '74'],  # สมุทรสงคราม
-        '76': ['70', '77'],  # เพชรบุรี
-        '77': ['76', '86'],  # ประจวบคีรีขันธ์
-        '80': ['84', '86'],  # นครศรีธรรมราช
-        '81': ['82'],  # กระบี่
-        '82': ['81', '83'],  # พังงา
-        '83': ['82'],  # ภูเก็ต
-        '84': ['80', '86'],  # สุราษฎร์ธานี
-        '85': ['86'],  # ระนอง
-        '86': ['77', '80', '84', '85'],  # ชุมพร
-        '90': ['80', '93'],  # สงขลา
-        '91': ['90', '92'],  # สตูล
-        '92': ['91', '93'],  # ตรัง
-        '93': ['80', '90', '92'],  # พัทลุง
-        '94': ['90', '95'],  # ปัตตานี
-        '95': ['94', '96'],  # ยะลา
-        '96': ['94', '95'],  # นราธิวาส
+        geo = THAI_TO_GEO.get(get_province(area_name_map.get(ac, '')))
+        if geo:
+            geo_by_prefix.setdefault(ac[:2], geo)
+    prefix_by_geo = {geo: prov for prov, geo in geo_by_prefix.items()}
+    geo_adjacency = province_adjacency(PROVINCES_GEOJSON_FILE, cache)
+    province_neighbors = {
+        prov: [prefix_by_geo[g] for g in geo_adjacency.get(geo, []) if g in prefix_by_geo]
+        for prov, geo in geo_by_prefix.items()
     }
-
-    def get_neighbors(ac_target):
-        """Get all neighbor area codes for a given area (same province + adjacent provinces)."""
-        prov = province_by_area.get(ac_target, '')
-        neighbor_areas = []
-        # Same province (other areas in same province)
-        for a in areas_by_province.get(prov, []):
-            if a != ac_target:
-                neighbor_areas.append(a)
-        # Adjacent provinces
-        for nprov in PROVINCE_NEIGHBORS.get(prov, []):
-            for a in areas_by_province.get(nprov, []):
-                neighbor_areas.append(a)
-        return neighbor_areas
+    spatial_w = SpatialWeights(all_area_codes, {ac: ac[:2] for ac in all_area_codes}, province_neighbors)
+    print(f"  🗺️ Spatial weights: {len(geo_adjacency)} provinces, "
+          f"{sum(map(len, geo_adjacency.values())) // 2} adjacent pairs, {spatial_w.nnz} area links")
 
     # Build score vector indexed by area
     score_by_area = {item['areaCode']: item['suspicionScore'] for item in ensemble_analysis}
     all_scores_list = [item['suspicionScore'] for item in ensemble_analysis]
     global_mean = stat_module.mean(all_scores_list) if all_scores_list else 0
-    global_var = stat_module.variance(all_scores_list) if len(all_scores_list) > 1 else 1
 
-    # Compute Local Moran's I for each area
-    moran_results = {}
-    for ac in all_area_codes:
-        neighbors = get_neighbors(ac)
-        if not neighbors:
-            moran_results[ac] = {'moranI': 0.0, 'spatialLag': 0.0, 'cluster': 'ns'}
-            continue
+    # Local Moran's I = (x_i - mean) * (mean of neighbours - mean) / variance,
+    # with a conditional-permutation pseudo p-value per area; clusters are
+    # the areas still significant after Benjamini–Hochberg FDR control
+    score_vec = np.array([score_by_area.get(ac, 0) for ac in all_area_codes], dtype=np.float64)
+    dev_vec = score_vec - global_mean
+    lag_vec = spatial_w.lag(score_vec)
+    print(f"  🗺️ Local Moran permutation test ({moran_permutations:,} conditional permutations)...")
+    local_moran_vec, moran_p_vec = local_moran(
+        score_vec, spatial_w, moran_permutations, block_size=moran_block_size,
+        seed=stage_seed(seed, 'local_moran'), jobs=jobs)
+    moran_q_vec = fdr_bh(moran_p_vec)
 
-        xi = score_by_area.get(ac, 0) - global_mean
-        neighbor_scores = [score_by_area.get(n, 0) for n in neighbors if n in score_by_area]
-        if not neighbor_scores:
-            moran_results[ac] = {'moranI': 0.0, 'spatialLag': 0.0, 'cluster': 'ns'}
+    moran_results = {}
+    for i, ac in enumerate(all_area_codes):
+        if spatial_w.n_neighbors[i] == 0:
+            moran_results[ac] = {'moranI': 0.0, 'spatialLag': 0.0, 'cluster': 'ns', 'moranP': 1.0}
             continue
+        xi = dev_vec[i]
+        local_moran_i = float(local_moran_vec[i])
 
-        spatial_lag = stat_module.mean(neighbor_scores) - global_mean
-        # Local Moran's I = (x_i - mean) * sum(w_ij * (x_j - mean)) / variance
-        local_moran = xi * spatial_lag / global_var if global_var > 0 else 0
-
-        # Classify cluster type
-        if local_moran > 0.5 and xi > 0:
+        # Classify cluster type (quadrant of significant areas)
+        if moran_q_vec[i] > MORAN_FDR_ALPHA:
+            cluster = 'ns'  # Not significant
+        elif local_moran_i > 0 and xi > 0:
             cluster = 'HH'  # High-High hotspot
-        elif local_moran > 0.5 and xi < 0:
+        elif local_moran_i > 0 and xi < 0:
             cluster = 'LL'  # Low-Low coldspot
-        elif local_moran < -0.5 and xi > 0:
+        elif local_moran_i < 0 and xi > 0:
             cluster = 'HL'  # High-Low outlier
-        elif local_moran < -0.5 and xi < 0:
+        elif local_moran_i < 0 and xi < 0:
             cluster = 'LH'  # Low-High outlier
         else:
-            cluster = 'ns'  # Not significant
+            cluster = 'ns'
 
         moran_results[ac] = {
-            'moranI': round(local_moran, 3),
-            'spatialLag': round(stat_module.mean(neighbor_scores), 1),
+            'moranI': round(local_moran_i, 3),
+            'spatialLag': round(float(lag_vec[i]), 1),
             'cluster': cluster,
+            'moranP': round(float(moran_p_vec[i]), 4),
         }
 
     # Apply spatial results to ensemble_analysis
@@ -2810,20 +2700,19 @@ def main():
         item['moranI'] = mr.get('moranI', 0.0)
         item['spatialLag'] = mr.get('spatialLag', 0.0)
         item['spatialCluster'] = mr.get('cluster', 'ns')
+        item['moranP'] = mr.get('moranP', 1.0)
 
     hh_count = sum(1 for m in moran_results.values() if m['cluster'] == 'HH')
     ll_count = sum(1 for m in moran_results.values() if m['cluster'] == 'LL')
-    print(f"  🗺️ Spatial: HH hotspots={hh_count}, LL coldspots={ll_count}")
+    moran_sig_count = sum(1 for m in moran_results.values() if m['cluster'] != 'ns')
+    print(f"  🗺️ Spatial: HH hotspots={hh_count}, LL coldspots={ll_count} "
+          f"({moran_sig_count} significant at FDR {MORAN_FDR_ALPHA})")
 
-    # Global Moran's I
+    # Global Moran's I = (n / ΣW) · (zᵀ W z) / (zᵀ z)
     n_areas = len(all_area_codes)
-    numerator = sum(
-        (score_by_area.get(ac, 0) - global_mean) *
-        sum((score_by_area.get(nb, 0) - global_mean) for nb in get_neighbors(ac) if nb in score_by_area)
-        for ac in all_area_codes
-    )
-    total_w = sum(len([nb for nb in get_neighbors(ac) if nb in score_by_area]) for ac in all_area_codes)
-    denominator = sum((score_by_area.get(ac, 0) - global_mean) ** 2 for ac in all_area_codes)
+    numerator = float(dev_vec @ spatial_w.dot(dev_vec))
+    total_w = spatial_w.nnz
+    denominator = float(dev_vec @ dev_vec)
     global_moran_i = (n_areas / max(total_w, 1)) * (numerator / max(denominator, 1))
     print(f"  🗺️ Global Moran's I = {global_moran_i:.4f} (>0 = positive spatial autocorrelation)")
 
@@ -2843,6 +2732,8 @@ def main():
     normal_codes = set(item['areaCode'] for item in sorted_by_score[-bottom_25pct:])
 
     # Label propagation: if an area's spatial neighbors are mostly suspect → elevate
+    suspect_vec = np.array([ac in suspect_codes for ac in all_area_codes], dtype=np.float64)
+    suspect_neighbor_counts = spatial_w.dot(suspect_vec)
     for item in ensemble_analysis:
         ac = item['areaCode']
         if ac in suspect_codes:
@@ -2851,9 +2742,10 @@ def main():
             item['semiSupervisedLabel'] = 'normal'
         else:
             # Check if neighbors are mostly suspect
-            neighbors = get_neighbors(ac)
-            suspect_neighbors = sum(1 for n in neighbors if n in suspect_codes)
-            if len(neighbors) > 0 and suspect_neighbors / len(neighbors) >= 0.3 and item['pValue'] < 0.15:
+            i = spatial_w.index[ac]
+            n_neighbors = int(spatial_w.n_neighbors[i])
+            suspect_neighbors = int(suspect_neighbor_counts[i])
+            if n_neighbors > 0 and suspect_neighbors / n_neighbors >= 0.3 and item['pValue'] < 0.15:
                 item['semiSupervisedLabel'] = 'elevated'
             else:
                 item['semiSupervisedLabel'] = 'unlabeled'
@@ -2928,9 +2820,12 @@ def main():
         'features': len(feature_names),
         'entropyWeights': {fn: round(entropy_w[fn], 4) for fn in feature_names},
         'globalMoranI': round(global_moran_i, 4),
-        'permutationIterations': N_PERMUTATIONS,
+        'permutationIterations': n_permutations,
         'hotspots': hh_count,
         'coldspots': ll_count,
+        'moranPermutations': moran_permutations,
+        'moranFdrAlpha': MORAN_FDR_ALPHA,
+        'moranSignificant': moran_sig_count,
         'pLt001': sum(1 for e in ensemble_analysis if e['pValue'] < 0.01),
         'pLt005': sum(1 for e in ensemble_analysis if e['pValue'] < 0.05),
         'suspectLabels': suspect_count,
@@ -2946,6 +2841,15 @@ def main():
         'benfordDeviateCount': benford_deviate,
     }
 
+    return {
+        'ensemble_analysis': ensemble_analysis,
+        'ensemble_summary_list': ensemble_summary_list,
+        'ensemble_meta': ensemble_meta,
+    }
+
+
+def stage_klimek(ensemble_analysis, constituency_data, eligible_by_area, store, klimek_bins,
+                 klimek_kde, klimek_bandwidth):
     # ═══════════════════════════════════════════════════════════════════════
     # ── Model A: Klimek Fingerprint (2D Turnout × Vote-Share Histogram) ──
     # ═══════════════════════════════════════════════════════════════════════
@@ -2968,13 +2872,10 @@ def main():
             continue
 
         # Turnout = total votes cast / eligible voters
-        mp_file_k = os.path.join(MP_DIR, f'{ac}.json')
-        if not os.path.exists(mp_file_k):
+        if not store.has_mp(ac):
             continue
-        with open(mp_file_k, 'r', encoding='utf-8') as f:
-            mp_raw_k = json.load(f)
 
-        total_votes_cast = sum(e.get('voteTotal', 0) for e in mp_raw_k.get('entries', []))
+        total_votes_cast = store.mp_totals[ac]
         # Add spoiled + no-vote to get actual turnout denominator
         good_votes = cd.get('goodVotes', total_votes_cast)
         bad_votes = cd.get('badVotes', 0)
@@ -2983,7 +2884,7 @@ def main():
         turnout_pct = min(100, actual_turnout / eligible * 100) if eligible > 0 else 0
 
         # Winner vote share = winner votes / total valid votes
-        winner_entry = next((e for e in mp_raw_k['entries'] if e.get('rank') == 1), None)
+        winner_entry = store.winner(ac)
         if not winner_entry:
             continue
         winner_votes = winner_entry.get('voteTotal', 0)
@@ -3003,56 +2904,81 @@ def main():
             'suspicionScore': item['finalScore'],
         })
 
-    # Build 2D histogram bins (20×20 grid)
-    KLIMEK_BINS = 20
+    # 2D histogram (klimek_bins × klimek_bins grid) of the per-area points
+    klimek_turnout = np.array([p['turnout'] for p in klimek_points], dtype=np.float64)
+    klimek_share = np.array([p['winnerShare'] for p in klimek_points], dtype=np.float64)
+    klimek_counts = fingerprint(klimek_turnout, klimek_share, klimek_bins)
+    klimek_edges = bin_edges(klimek_bins).tolist()
     klimek_heatmap = []
-    bin_w = 100.0 / KLIMEK_BINS
-    for bx in range(KLIMEK_BINS):
-        for by in range(KLIMEK_BINS):
-            x_lo = bx * bin_w
-            x_hi = (bx + 1) * bin_w
-            y_lo = by * bin_w
-            y_hi = (by + 1) * bin_w
-            count = sum(1 for p in klimek_points
-                        if x_lo <= p['turnout'] < x_hi and y_lo <= p['winnerShare'] < y_hi)
-            if count > 0:
-                klimek_heatmap.append({
-                    'turnoutBin': round((x_lo + x_hi) / 2, 1),
-                    'shareBin': round((y_lo + y_hi) / 2, 1),
-                    'count': count,
-                    'turnoutRange': [round(x_lo, 1), round(x_hi, 1)],
-                    'shareRange': [round(y_lo, 1), round(y_hi, 1)],
-                })
+    for bx, by in zip(*np.nonzero(klimek_counts)):
+        x_lo, x_hi = klimek_edges[bx], klimek_edges[bx + 1]
+        y_lo, y_hi = klimek_edges[by], klimek_edges[by + 1]
+        # 4 decimals: the 0.25 / 0.75 centres of a 200-bin grid survive
+        klimek_heatmap.append({
+            'turnoutBin': round((x_lo + x_hi) / 2, 4),
+            'shareBin': round((y_lo + y_hi) / 2, 4),
+            'count': int(klimek_counts[bx, by]),
+            'turnoutRange': [round(x_lo, 4), round(x_hi, 4)],
+            'shareRange': [round(y_lo, 4), round(y_hi, 4)],
+        })
+
+    # Optional KDE-smoothed surface on the same grid (Scott's rule by default)
+    klimek_density = None
+    if klimek_kde and klimek_points:
+        bandwidth = klimek_bandwidth or (
+            scott_bandwidth(klimek_turnout), scott_bandwidth(klimek_share))
+        if not isinstance(bandwidth, (tuple, list)):
+            bandwidth = (bandwidth, bandwidth)
+        surface = kde_surface(klimek_counts, bandwidth)
+        klimek_density = {
+            'bins': klimek_bins,
+            'bandwidth': [round(bandwidth[0], 3), round(bandwidth[1], 3)],
+            # grid[turnout bin][share bin], density per (turnout % × share %)
+            'grid': [[round(v, 6) for v in row] for row in surface.tolist()],
+        }
 
     # Summary statistics
     if klimek_points:
         turnouts = [p['turnout'] for p in klimek_points]
         shares = [p['winnerShare'] for p in klimek_points]
+        mean_turnout = stat_module.mean(turnouts)
+        mean_share = stat_module.mean(shares)
+        std_turnout = stat_module.stdev(turnouts) if len(turnouts) > 1 else 0
+        std_share = stat_module.stdev(shares) if len(shares) > 1 else 0
         klimek_meta = {
             'totalPoints': len(klimek_points),
-            'meanTurnout': round(stat_module.mean(turnouts), 2),
-            'stdTurnout': round(stat_module.stdev(turnouts), 2) if len(turnouts) > 1 else 0,
-            'meanWinnerShare': round(stat_module.mean(shares), 2),
-            'stdWinnerShare': round(stat_module.stdev(shares), 2) if len(shares) > 1 else 0,
+            'meanTurnout': round(mean_turnout, 2),
+            'stdTurnout': round(std_turnout, 2) if len(turnouts) > 1 else 0,
+            'meanWinnerShare': round(mean_share, 2),
+            'stdWinnerShare': round(std_share, 2) if len(shares) > 1 else 0,
             'minTurnout': round(min(turnouts), 2),
             'maxTurnout': round(max(turnouts), 2),
             'minWinnerShare': round(min(shares), 2),
             'maxWinnerShare': round(max(shares), 2),
             # Correlation coefficient
             'correlation': round(
-                sum((t - stat_module.mean(turnouts)) * (s - stat_module.mean(shares)) for t, s in zip(turnouts, shares))
-                / (stat_module.stdev(turnouts) * stat_module.stdev(shares) * (len(turnouts) - 1))
-                if len(turnouts) > 2 and stat_module.stdev(turnouts) > 0 and stat_module.stdev(shares) > 0
+                sum((t - mean_turnout) * (s - mean_share) for t, s in zip(turnouts, shares))
+                / (std_turnout * std_share * (len(turnouts) - 1))
+                if len(turnouts) > 2 and std_turnout > 0 and std_share > 0
                 else 0, 4),
             # High-turnout high-share quadrant (potential fraud indicator)
-            'highHighCount': sum(1 for p in klimek_points if p['turnout'] > 80 and p['winnerShare'] > 60),
-            'bins': KLIMEK_BINS,
+            'highHighCount': int(((klimek_turnout > 80) & (klimek_share > 60)).sum()),
+            'bins': klimek_bins,
         }
     else:
-        klimek_meta = {'totalPoints': 0, 'bins': KLIMEK_BINS}
+        klimek_meta = {'totalPoints': 0, 'bins': klimek_bins}
 
     print(f"  📊 Klimek: {len(klimek_points)} points, corr={klimek_meta.get('correlation', 0)}, high-high={klimek_meta.get('highHighCount', 0)}")
 
+    return {
+        'klimek_points': klimek_points,
+        'klimek_heatmap': klimek_heatmap,
+        'klimek_density': klimek_density,
+        'klimek_meta': klimek_meta,
+    }
+
+
+def stage_last_digit(digit_results, store):
     # ═══════════════════════════════════════════════════════════════════════
     # ── Model B: Last-Digit Uniformity Test (Beber & Scacco 2012) ──
     # ═══════════════════════════════════════════════════════════════════════
@@ -3067,32 +2993,11 @@ def main():
 
     last_digit_scores = {}
     all_last_digit_chi2 = []
-    global_last_digit_counts = {d: 0 for d in range(10)}  # 0-9
-    global_last_digit_total = 0
-
-    for mp_file in mp_files:
-        area_code = os.path.basename(mp_file).replace('.json', '')
-        pl_file = os.path.join(PL_DIR, f'{area_code}.json')
-        if not os.path.exists(pl_file):
-            continue
+    ld_test = digit_results['last']  # last digits of all vote counts ≥ 10
+    ld_rows = ld_test.total >= 10
 
-        with open(mp_file, 'r', encoding='utf-8') as f:
-            mp_data_ld = json.load(f)
-        with open(pl_file, 'r', encoding='utf-8') as f:
-            pl_data_ld = json.load(f)
-
-        # Collect last digits of all vote counts ≥ 10
-        area_last_digits = []
-        for entry in mp_data_ld.get('entries', []):
-            v = entry.get('voteTotal', 0)
-            if v >= 10:
-                area_last_digits.append(v % 10)
-        for entry in pl_data_ld.get('entries', []):
-            v = entry.get('voteTotal', 0)
-            if v >= 10:
-                area_last_digits.append(v % 10)
-
-        if len(area_last_digits) < 10:
+    for k, area_code in enumerate(store.paired_codes):
+        if not ld_rows[k]:
             last_digit_scores[area_code] = {
                 'chi2': 0.0, 'pValue': 1.0,
                 'digitCounts': {d: 0 for d in range(10)},
@@ -3100,41 +3005,28 @@ def main():
             }
             continue
 
-        # Count last digits
-        ld_counts = {d: 0 for d in range(10)}
-        for ld in area_last_digits:
-            ld_counts[ld] += 1
-            global_last_digit_counts[ld] += 1
-            global_last_digit_total += 1
-
-        total_ld = sum(ld_counts.values())
-
-        # Chi-square test against uniform distribution
-        expected_each = total_ld / 10.0
-        chi2_ld = sum((ld_counts[d] - expected_each) ** 2 / expected_each for d in range(10))
-
-        # Approximate p-value (df=9)
-        df_ld = 9
-        if chi2_ld > 0:
-            z_ld = ((chi2_ld / df_ld) ** (1/3) - (1 - 2/(9*df_ld))) / math.sqrt(2/(9*df_ld))
-            p_ld = 1.0 / (1.0 + math.exp(1.7 * z_ld))
-        else:
-            p_ld = 1.0
+        # Chi-square test against uniform distribution, exact p-value (df=9)
+        chi2_ld = float(ld_test.chi2[k])
+        p_ld = float(ld_test.p_value[k])
 
         all_last_digit_chi2.append(chi2_ld)
         last_digit_scores[area_code] = {
             'chi2': round(chi2_ld, 3),
             'pValue': round(max(0, min(1, p_ld)), 4),
-            'digitCounts': ld_counts,
-            'totalNumbers': total_ld,
+            'digitCounts': dict(zip(ld_test.digits, ld_test.counts[k].tolist())),
+            'totalNumbers': int(ld_test.total[k]),
             'scaledScore': 0,
         }
 
+    global_ld_counts, global_last_digit_total, global_ld_chi2, global_ld_p = ld_test.global_test(ld_rows)
+    global_last_digit_counts = dict(zip(ld_test.digits, global_ld_counts.tolist()))
+
     # Scale last-digit chi2 to 0-100
     if all_last_digit_chi2:
+        chi2_scaler = RobustScaler().fit(all_last_digit_chi2)
         for ac in last_digit_scores:
             if last_digit_scores[ac]['totalNumbers'] >= 10:
-                rz = robust_z_score(last_digit_scores[ac]['chi2'], all_last_digit_chi2)
+                rz = float(chi2_scaler.transform([last_digit_scores[ac]['chi2']])[0])
                 last_digit_scores[ac]['scaledScore'] = max(0, min(100, rz * 20))
 
     # Global last-digit distribution
@@ -3151,11 +3043,8 @@ def main():
 
     # Global chi-square for last digit
     if global_last_digit_total > 0:
-        exp_global_ld = global_last_digit_total / 10.0
-        global_last_digit_chi2 = sum((global_last_digit_counts[d] - exp_global_ld) ** 2 / exp_global_ld for d in range(10))
-        df_gld = 9
-        z_gld = ((global_last_digit_chi2 / df_gld) ** (1/3) - (1 - 2/(9*df_gld))) / math.sqrt(2/(9*df_gld))
-        global_last_digit_p = 1.0 / (1.0 + math.exp(1.7 * z_gld))
+        global_last_digit_chi2 = global_ld_chi2
+        global_last_digit_p = global_ld_p
     else:
         global_last_digit_chi2 = 0.0
         global_last_digit_p = 1.0
@@ -3165,6 +3054,18 @@ def main():
     print(f"  🔢 Last-Digit: conform={ld_conform}, deviate(p≤0.05)={ld_deviate}")
     print(f"  🔢 Global χ²={round(global_last_digit_chi2, 3)}, p={round(global_last_digit_p, 4)}, total={global_last_digit_total}")
 
+    return {
+        'last_digit_scores': last_digit_scores,
+        'global_last_digit_total': global_last_digit_total,
+        'global_last_digit_distribution': global_last_digit_distribution,
+        'global_last_digit_chi2': global_last_digit_chi2,
+        'global_last_digit_p': global_last_digit_p,
+        'ld_conform': ld_conform,
+        'ld_deviate': ld_deviate,
+    }
+
+
+def stage_second_digit(digit_results, store):
     # ═══════════════════════════════════════════════════════════════════════
     # ── Model C: 2nd-Digit Benford's Law (Mebane 2BL Test) ──
     # ═══════════════════════════════════════════════════════════════════════
@@ -3178,52 +3079,13 @@ def main():
     # ═══════════════════════════════════════════════════════════════════════
     print("  📐 Computing 2nd-Digit Benford's Law (Mebane)...")
 
-    # Compute Benford 2nd-digit expected probabilities
-    BENFORD_2ND_EXPECTED = {}
-    for k in range(10):
-        prob = sum(math.log10(1 + 1/(10*d1 + k)) for d1 in range(1, 10))
-        BENFORD_2ND_EXPECTED[k] = prob
-
     second_digit_scores = {}
     all_second_digit_chi2 = []
-    global_second_digit_counts = {d: 0 for d in range(10)}
-    global_second_digit_total = 0
-
-    def second_digit(n):
-        """Extract the second digit of a positive integer (must be >= 10)."""
-        if n < 10:
-            return None
-        while n >= 100:
-            n //= 10
-        return n % 10
-
-    for mp_file in mp_files:
-        area_code = os.path.basename(mp_file).replace('.json', '')
-        pl_file = os.path.join(PL_DIR, f'{area_code}.json')
-        if not os.path.exists(pl_file):
-            continue
+    sd_test = digit_results['second']  # second digits of all vote counts >= 10
+    sd_rows = sd_test.total >= 10
 
-        with open(mp_file, 'r', encoding='utf-8') as f:
-            mp_data_sd = json.load(f)
-        with open(pl_file, 'r', encoding='utf-8') as f:
-            pl_data_sd = json.load(f)
-
-        # Collect second digits of all vote counts >= 10
-        area_second_digits = []
-        for entry in mp_data_sd.get('entries', []):
-            v = entry.get('voteTotal', 0)
-            if v >= 10:
-                sd = second_digit(v)
-                if sd is not None:
-                    area_second_digits.append(sd)
-        for entry in pl_data_sd.get('entries', []):
-            v = entry.get('voteTotal', 0)
-            if v >= 10:
-                sd = second_digit(v)
-                if sd is not None:
-                    area_second_digits.append(sd)
-
-        if len(area_second_digits) < 10:
+    for k, area_code in enumerate(store.paired_codes):
+        if not sd_rows[k]:
             second_digit_scores[area_code] = {
                 'chi2': 0.0, 'pValue': 1.0,
                 'digitCounts': {d: 0 for d in range(10)},
@@ -3231,51 +3093,34 @@ def main():
             }
             continue
 
-        # Count second digits
-        sd_counts = {d: 0 for d in range(10)}
-        for sd_val in area_second_digits:
-            sd_counts[sd_val] += 1
-            global_second_digit_counts[sd_val] += 1
-            global_second_digit_total += 1
-
-        total_sd = sum(sd_counts.values())
-
-        # Chi-square test against Benford 2nd-digit distribution
-        chi2_sd = 0.0
-        for d in range(10):
-            observed = sd_counts[d]
-            expected = BENFORD_2ND_EXPECTED[d] * total_sd
-            if expected > 0:
-                chi2_sd += (observed - expected) ** 2 / expected
-
-        # Approximate p-value (df=9)
-        df_sd = 9
-        if chi2_sd > 0:
-            z_sd = ((chi2_sd / df_sd) ** (1/3) - (1 - 2/(9*df_sd))) / math.sqrt(2/(9*df_sd))
-            p_sd = 1.0 / (1.0 + math.exp(1.7 * z_sd))
-        else:
-            p_sd = 1.0
+        # Chi-square test against Benford 2nd-digit distribution, exact p-value (df=9)
+        chi2_sd = float(sd_test.chi2[k])
+        p_sd = float(sd_test.p_value[k])
 
         all_second_digit_chi2.append(chi2_sd)
         second_digit_scores[area_code] = {
             'chi2': round(chi2_sd, 3),
             'pValue': round(max(0, min(1, p_sd)), 4),
-            'digitCounts': sd_counts,
-            'totalNumbers': total_sd,
+            'digitCounts': dict(zip(sd_test.digits, sd_test.counts[k].tolist())),
+            'totalNumbers': int(sd_test.total[k]),
             'scaledScore': 0,
         }
 
+    global_sd_counts, global_second_digit_total, global_sd_chi2_all, global_sd_p_all = sd_test.global_test(sd_rows)
+    global_second_digit_counts = dict(zip(sd_test.digits, global_sd_counts.tolist()))
+
     # Scale 2nd-digit chi2 to 0-100
     if all_second_digit_chi2:
+        chi2_scaler = RobustScaler().fit(all_second_digit_chi2)
         for ac in second_digit_scores:
             if second_digit_scores[ac]['totalNumbers'] >= 10:
-                rz = robust_z_score(second_digit_scores[ac]['chi2'], all_second_digit_chi2)
+                rz = float(chi2_scaler.transform([second_digit_scores[ac]['chi2']])[0])
                 second_digit_scores[ac]['scaledScore'] = max(0, min(100, rz * 20))
 
     # Global 2nd-digit distribution
     global_second_digit_distribution = []
     for d in range(10):
-        expected_pct = BENFORD_2ND_EXPECTED[d] * 100
+        expected_pct = BENFORD_SECOND[d] * 100
         observed_pct = (global_second_digit_counts[d] / global_second_digit_total * 100) if global_second_digit_total > 0 else 0
         global_second_digit_distribution.append({
             'digit': d,
@@ -3286,14 +3131,8 @@ def main():
 
     # Global chi-square for 2nd digit
     if global_second_digit_total > 0:
-        global_sd_chi2 = sum(
-            (global_second_digit_counts[d] - BENFORD_2ND_EXPECTED[d] * global_second_digit_total) ** 2
-            / (BENFORD_2ND_EXPECTED[d] * global_second_digit_total)
-            for d in range(10)
-        )
-        df_gsd = 9
-        z_gsd = ((global_sd_chi2 / df_gsd) ** (1/3) - (1 - 2/(9*df_gsd))) / math.sqrt(2/(9*df_gsd))
-        global_sd_p = 1.0 / (1.0 + math.exp(1.7 * z_gsd))
+        global_sd_chi2 = global_sd_chi2_all
+        global_sd_p = global_sd_p_all
     else:
         global_sd_chi2 = 0.0
         global_sd_p = 1.0
@@ -3303,6 +3142,18 @@ def main():
     print(f"  📐 2nd-Digit Benford: conform={sd_conform}, deviate(p≤0.05)={sd_deviate}")
     print(f"  📐 Global 2nd-digit χ²={round(global_sd_chi2, 3)}, p={round(global_sd_p, 4)}, total={global_second_digit_total}")
 
+    return {
+        'second_digit_scores': second_digit_scores,
+        'global_second_digit_total': global_second_digit_total,
+        'global_second_digit_distribution': global_second_digit_distribution,
+        'global_sd_chi2': global_sd_chi2,
+        'global_sd_p': global_sd_p,
+        'sd_conform': sd_conform,
+        'sd_deviate': sd_deviate,
+    }
+
+
+def stage_ecological_inference(constituency_data, area_name_map):
     # ═══════════════════════════════════════════════════════════════════════
     # 📊 Ecological Inference — Transition Matrix (66 → 69)
     # Compare which party won each constituency in election 66 vs 69
@@ -3434,140 +3285,410 @@ def main():
     for r in eco_retention[:5]:
         print(f"     {r['party']}: 66={r['seats66']} → 69={r['seats69']} (retained {r['retainPct']}%, net {'+' if r['net'] > 0 else ''}{r['net']})")
 
+    return {
+        'eco_matrix_rows': eco_matrix_rows,
+        'eco_retention': eco_retention,
+        'eco_changed_areas': eco_changed_areas,
+        'eco_col_labels': eco_col_labels,
+        'eco_meta': eco_meta,
+    }
+
+
+def build_output(r):
+    """election_data.json document from the stage results `r`."""
     output = {
         'summary': {
-            'totalAreas': total_areas,
-            'totalSuspicious': total_suspicious,
-            'suspiciousPercent': round(total_suspicious / total_areas * 100, 1) if total_areas > 0 else 0,
-            'total66Winners': len(all_66_winners),
-            'switchedCandidates': sum(1 for c in candidate_raw['candidates'] if c['switchedParty'] == True),
+            'totalAreas': r['total_areas'],
+            'totalSuspicious': r['total_suspicious'],
+            'suspiciousPercent': round(r['total_suspicious'] / r['total_areas'] * 100, 1) if r['total_areas'] > 0 else 0,
+            'total66Winners': len(r['all_66_winners']),
+            'switchedCandidates': sum(1 for c in r['candidate_raw']['candidates'] if c['switchedParty'] == True),
         },
         'partyMeta': {k: {'name': v['name'], 'num': v['num'], 'color': v['color']} for k, v in PARTY_META.items()},
-        'voteBuyingAnalysis': vote_buying_analysis,
-        'suspiciousByParty': list(suspicious_by_party.values()),
-        'targetPartyCounts': list(target_party_counts.values()),
-        'rankDistribution': rank_distribution,
-        'provinceSummary': province_summary,
-        'provinceMapData': province_map_data,
+        'voteBuyingAnalysis': r['vote_buying_analysis'],
+        'suspiciousByParty': list(r['suspicious_by_party'].values()),
+        'targetPartyCounts': list(r['target_party_counts'].values()),
+        'rankDistribution': r['rank_distribution'],
+        'provinceSummary': r['province_summary'],
+        'provinceMapData': r['province_map_data'],
         # Deep dive data
-        'scatterData': scatter_data,
-        'areaDetails': area_details,
-        'candidateNumbers': candidate_numbers,
-        'regionSummary': region_summary,
-        'voteAnomaly': vote_anomaly[:50],
+        'scatterData': r['scatter_data'],
+        'areaDetails': r['area_details'],
+        'candidateNumbers': r['candidate_numbers'],
+        'regionSummary': r['region_summary'],
+        'voteAnomaly': r['vote_anomaly'][:50],
         # Candidate data
-        'partySwitcherFlows': party_switcher_data[:40],
-        'partySwitcherSummary': switcher_to_list,
-        'retentionSummary': retention_summary,
-        'winnerRetention': winner_retention,
-        'lost66Winners': lost_66_winners[:50],
+        'partySwitcherFlows': r['party_switcher_data'][:40],
+        'partySwitcherSummary': r['switcher_to_list'],
+        'retentionSummary': r['retention_summary'],
+        'winnerRetention': r['winner_retention'],
+        'lost66Winners': r['lost_66_winners'][:50],
         # Switcher Vote Comparison (66 vs 69 votes)
-        'switcherVoteComparison': switcher_vote_comparison,
+        'switcherVoteComparison': r['switcher_vote_comparison'],
         # New analysis tabs
-        'turnoutAnomaly': turnout_anomaly,
-        'voteSplitting': vote_splitting,
-        'winningMargins': winning_margins,
+        'turnoutAnomaly': r['turnout_anomaly'],
+        'voteSplitting': r['vote_splitting'],
+        'winningMargins': r['winning_margins'],
         # Myagkov-Ordeshook: Turnout vs Winner Vote-Share Correlation
         'myagkovAnalysis': {
-            'points': myagkov_points,
-            'partyCorrelations': myagkov_party_corr,
-            'flagged': myagkov_flagged,
-            'meta': myagkov_meta,
+            'points': r['myagkov_points'],
+            'partyCorrelations': r['myagkov_party_corr'],
+            'flagged': r['myagkov_flagged'],
+            'meta': r['myagkov_meta'],
         },
         # Ecological Inference — Transition Matrix (66 → 69)
         'ecologicalInference': {
-            'matrixRows': eco_matrix_rows,
-            'colLabels': eco_col_labels,
-            'retention': eco_retention,
-            'changedAreas': eco_changed_areas,
-            'meta': eco_meta,
+            'matrixRows': r['eco_matrix_rows'],
+            'colLabels': r['eco_col_labels'],
+            'retention': r['eco_retention'],
+            'changedAreas': r['eco_changed_areas'],
+            'meta': r['eco_meta'],
         },
         # MP vs Party-List Comparison (ส้มหล่น analysis)
         'mpPlComparison': {
-            'partySummary': mp_pl_party_summary,
-            'perArea': mp_pl_per_area[:100],  # top 100 areas by absolute diff
-            'meta': mp_pl_meta,
+            'partySummary': r['mp_pl_party_summary'],
+            'perArea': r['mp_pl_per_area'][:100],  # top 100 areas by absolute diff
+            'meta': r['mp_pl_meta'],
         },
         # Ballot Imbalance (บัตรเขย่ง) — MP total vs PL total per area
         'ballotImbalance': {
-            'perArea': ballot_imbalance,
-            'histogram': histogram_data,
-            'byProvince': province_imbalance_list,
-            'meta': ballot_imbalance_meta,
+            'perArea': r['ballot_imbalance'],
+            'histogram': r['histogram_data'],
+            'byProvince': r['province_imbalance_list'],
+            'meta': r['ballot_imbalance_meta'],
         },
         # Spoiled Ballot Comparison (MP Election vs Referendum)
-        'spoiledComparison': spoiled_comparison,
-        'spoiledComparisonMeta': spoiled_comparison_meta,
+        'spoiledComparison': r['spoiled_comparison'],
+        'spoiledComparisonMeta': r['spoiled_comparison_meta'],
         # National Election Comparison (66 vs 69)
-        'electionComparison': election_comparison,
+        'electionComparison': r['election_comparison'],
         # Ensemble model
-        'ensembleAnalysis': ensemble_analysis,
-        'ensemblePartySummary': ensemble_summary_list,
-        'ensembleMeta': ensemble_meta,
+        'ensembleAnalysis': r['ensemble_analysis'],
+        'ensemblePartySummary': r['ensemble_summary_list'],
+        'ensembleMeta': r['ensemble_meta'],
         # Monte Carlo Null Model (Twin-Number Effect)
         'nullModelAnalysis': {
-            'perNumber': null_model_per_number,
-            'maxZHistogram': max_z_histogram,
-            'structuralBias': structural_bias,
-            'meta': null_model_meta,
+            'perNumber': r['null_model_per_number'],
+            'maxZHistogram': r['max_z_histogram'],
+            'structuralBias': r['structural_bias'],
+            'meta': r['null_model_meta'],
         },
         # Klimek Fingerprint
         'klimekAnalysis': {
-            'points': klimek_points,
-            'heatmap': klimek_heatmap,
-            'meta': klimek_meta,
+            'points': r['klimek_points'],
+            'heatmap': r['klimek_heatmap'],
+            'meta': r['klimek_meta'],
+            **({'density': r['klimek_density']} if r['klimek_density'] else {}),
         },
         # Last-Digit Uniformity Test
         'lastDigitAnalysis': {
-            'globalDistribution': global_last_digit_distribution,
-            'globalChi2': round(global_last_digit_chi2, 3),
-            'globalPValue': round(global_last_digit_p, 4),
-            'totalNumbers': global_last_digit_total,
-            'conformCount': ld_conform,
-            'deviateCount': ld_deviate,
+            'globalDistribution': r['global_last_digit_distribution'],
+            'globalChi2': round(r['global_last_digit_chi2'], 3),
+            'globalPValue': round(r['global_last_digit_p'], 4),
+            'totalNumbers': r['global_last_digit_total'],
+            'conformCount': r['ld_conform'],
+            'deviateCount': r['ld_deviate'],
             'perArea': [
                 {
                     'areaCode': ac,
-                    'chi2': last_digit_scores[ac]['chi2'],
-                    'pValue': last_digit_scores[ac]['pValue'],
-                    'digitCounts': last_digit_scores[ac]['digitCounts'],
-                    'totalNumbers': last_digit_scores[ac]['totalNumbers'],
-                    'scaledScore': round(last_digit_scores[ac]['scaledScore'], 1),
+                    'chi2': r['last_digit_scores'][ac]['chi2'],
+                    'pValue': r['last_digit_scores'][ac]['pValue'],
+                    'digitCounts': r['last_digit_scores'][ac]['digitCounts'],
+                    'totalNumbers': r['last_digit_scores'][ac]['totalNumbers'],
+                    'scaledScore': round(r['last_digit_scores'][ac]['scaledScore'], 1),
                 }
-                for ac in sorted(last_digit_scores.keys())
-                if last_digit_scores[ac]['totalNumbers'] >= 10
+                for ac in sorted(r['last_digit_scores'].keys())
+                if r['last_digit_scores'][ac]['totalNumbers'] >= 10
             ],
         },
         # 2nd-Digit Benford's Law (Mebane)
         'secondDigitBenfordAnalysis': {
-            'globalDistribution': global_second_digit_distribution,
-            'globalChi2': round(global_sd_chi2, 3),
-            'globalPValue': round(global_sd_p, 4),
-            'totalNumbers': global_second_digit_total,
-            'conformCount': sd_conform,
-            'deviateCount': sd_deviate,
+            'globalDistribution': r['global_second_digit_distribution'],
+            'globalChi2': round(r['global_sd_chi2'], 3),
+            'globalPValue': round(r['global_sd_p'], 4),
+            'totalNumbers': r['global_second_digit_total'],
+            'conformCount': r['sd_conform'],
+            'deviateCount': r['sd_deviate'],
             'perArea': [
                 {
                     'areaCode': ac,
-                    'chi2': second_digit_scores[ac]['chi2'],
-                    'pValue': second_digit_scores[ac]['pValue'],
-                    'digitCounts': second_digit_scores[ac]['digitCounts'],
-                    'totalNumbers': second_digit_scores[ac]['totalNumbers'],
-                    'scaledScore': round(second_digit_scores[ac]['scaledScore'], 1),
+                    'chi2': r['second_digit_scores'][ac]['chi2'],
+                    'pValue': r['second_digit_scores'][ac]['pValue'],
+                    'digitCounts': r['second_digit_scores'][ac]['digitCounts'],
+                    'totalNumbers': r['second_digit_scores'][ac]['totalNumbers'],
+                    'scaledScore': round(r['second_digit_scores'][ac]['scaledScore'], 1),
                 }
-                for ac in sorted(second_digit_scores.keys())
-                if second_digit_scores[ac]['totalNumbers'] >= 10
+                for ac in sorted(r['second_digit_scores'].keys())
+                if r['second_digit_scores'][ac]['totalNumbers'] >= 10
             ],
         },
     }
+    return output
+
+
+
+# Pipeline stages in run order. Inputs are the stage functions' parameter
+# names (upstream outputs, run parameters, or the `cache` / `memo` / `jobs`
+# context); `files` are the raw inputs hashed into each stage's cache
+# fingerprint.
+# Loading stages are cheap with the parse cache, so they are not pickled.
+# Stages using the parse cache run in the main process (pool=False) so its
+# index stays in one place; with --jobs the others go to worker processes.
+STAGES = [
+    Stage('inputs', stage_inputs,
+          ['area_name_map', 'candidate_raw', 'candidates_by_area', 'election66_lookup', 'store',
+           'vm', 'paired_rows'],
+          files=[AREA_CODE_FILE, CANDIDATE_FILE, ELECTION66_LEADING_FILE, MP_DIR, PL_DIR],
+          cache=False, pool=False),
+    Stage('vote_buying', stage_vote_buying,
+          ['vote_buying_analysis', 'province_data', 'rank_distribution']),
+    Stage('deep_dive', stage_deep_dive,
+          ['scatter_data', 'area_details', 'candidate_numbers', 'region_summary', 'vote_anomaly',
+           'suspicious_by_party', 'target_party_counts', 'province_summary']),
+    Stage('province_map', stage_province_map,
+          ['province_map_data', 'total_areas', 'total_suspicious']),
+    Stage('candidates', stage_candidates,
+          ['party_switcher_data', 'switcher_to_list', 'winner_retention', 'retention_summary',
+           'all_66_winners', 'lost_66_winners', 'switcher_vote_comparison']),
+    Stage('thaipbs_inputs', stage_thaipbs_inputs,
+          ['constituency_data', 'partylist_data', 'referendum_data', 'focus_area_tags'],
+          files=[CONSTITUENCY_FILE, PARTYLIST_FILE, REFERENDUM_FILE, FOCUS_AREAS_FILE],
+          cache=False, pool=False),
+    Stage('turnout_anomaly', stage_turnout_anomaly, ['turnout_anomaly']),
+    Stage('vote_splitting', stage_vote_splitting, ['vote_splitting']),
+    Stage('mp_pl', stage_mp_pl,
+          ['mp_pl_per_area', 'mp_pv', 'pl_pv', 'present_pv', 'diff_pv', 'mp_pl_party_summary',
+           'mp_pl_meta']),
+    Stage('ballot_imbalance', stage_ballot_imbalance,
+          ['ballot_imbalance', 'histogram_data', 'province_imbalance_list',
+           'ballot_imbalance_meta']),
+    Stage('winning_margins', stage_winning_margins, ['winning_margins']),
+    Stage('myagkov', stage_myagkov,
+          ['myagkov_points', 'myagkov_party_corr', 'myagkov_flagged', 'myagkov_meta'],
+          files=[ECT_STATS_CONS_FILE, ECT_INFO_PROVINCE_FILE], pool=False),
+    Stage('spoiled_comparison', stage_spoiled_comparison,
+          ['spoiled_comparison', 'spoiled_comparison_meta']),
+    Stage('election_comparison', stage_election_comparison, ['election_comparison']),
+    Stage('ensemble_features', stage_ensemble_features,
+          ['eligible_by_area', 'all_eligible_list', 'gap_scores', 'dev_scores', 'turnout_scores',
+           'candidate_counts', 'concentration_scores', 'consistency_scores', 'spoiled_scores',
+           'dominance_scores', 'novote_scores', 'vps_scores', 'digit_results', 'benford_scores',
+           'global_total', 'global_benford_distribution', 'global_chi2', 'global_benford_p',
+           'benford_conform', 'benford_deviate']),
+    Stage('null_model', stage_null_model,
+          ['null_model_per_number', 'max_z_histogram', 'structural_bias', 'null_model_meta']),
+    Stage('ensemble_score', stage_ensemble_score,
+          ['all_area_codes', 'feature_names', 'entropy_w', 'scored_areas']),
+    Stage('ensemble_spatial', stage_ensemble_spatial,
+          ['ensemble_analysis', 'ensemble_summary_list', 'ensemble_meta'],
+          files=[PROVINCES_GEOJSON_FILE], pool=False),
+    Stage('klimek', stage_klimek,
+          ['klimek_points', 'klimek_heatmap', 'klimek_density', 'klimek_meta']),
+    Stage('last_digit', stage_last_digit,
+          ['last_digit_scores', 'global_last_digit_total', 'global_last_digit_distribution',
+           'global_last_digit_chi2', 'global_last_digit_p', 'ld_conform', 'ld_deviate']),
+    Stage('second_digit', stage_second_digit,
+          ['second_digit_scores', 'global_second_digit_total', 'global_second_digit_distribution',
+           'global_sd_chi2', 'global_sd_p', 'sd_conform', 'sd_deviate']),
+    Stage('ecological_inference', stage_ecological_inference,
+          ['eco_matrix_rows', 'eco_retention', 'eco_changed_areas', 'eco_col_labels', 'eco_meta']),
+]
+
+
+def write_profile(path, rows, total, jobs, trace_memory, params):
+    """pipeline_profile.json: the resources used by each stage of this run
+    (input paths relative to the repository)"""
+    profile = {
+        'generatedAt': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'jobs': jobs,
+        'traceMemory': trace_memory,
+        'params': {key: os.path.relpath(value, BASE_DIR) if isinstance(value, str) and os.path.isabs(value)
+                   else value
+                   for key, value in params.items()},
+        'totalWallSeconds': round(total['wallSeconds'], 4),
+        'totalCpuSeconds': round(total['cpuSeconds'], 4),
+        'maxRssBytes': total['maxRssBytes'],
+        'stages': [
+            {key: round(value, 4) if isinstance(value, float) else value
+             for key, value in row.items()}
+            for row in rows
+        ],
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(profile, f, ensure_ascii=False, indent=2)
+
+
+def checkout_snapshot(version, cache_dir):
+    """(version, mp dir, pl dir) of an archived snapshot ("latest" = newest),
+    written once under <cache_dir>/snapshots/<version>"""
+    sys.path.insert(0, os.path.join(BASE_DIR, 'scripts'))
+    from snapshot_archive import SnapshotArchive
+
+    archive = SnapshotArchive(SNAPSHOT_ARCHIVE_DIR)
+    version = archive.resolve(version)
+    dest = os.path.join(cache_dir or tempfile.gettempdir(), 'snapshots', version)
+    archive.checkout(version, dest)
+    return version, os.path.join(dest, 'mp'), os.path.join(dest, 'pl')
+
+
+def run_params(mp_dir=MP_DIR, pl_dir=PL_DIR, mc_iterations=MC_ITERATIONS, mc_batch_size=MC_BATCH_SIZE,
+               n_permutations=N_PERMUTATIONS, perm_block_size=PERM_BLOCK_SIZE,
+               moran_permutations=MORAN_PERMUTATIONS, moran_block_size=MORAN_BLOCK_SIZE, seed=SEED,
+               klimek_bins=KLIMEK_BINS, klimek_kde=False, klimek_bandwidth=None):
+    """Run parameters of STAGES (part of the stage fingerprints)"""
+    return {
+        'mp_dir': mp_dir,
+        'pl_dir': pl_dir,
+        'mc_iterations': mc_iterations,
+        'mc_batch_size': mc_batch_size,
+        'n_permutations': n_permutations,
+        'perm_block_size': perm_block_size,
+        'moran_permutations': moran_permutations,
+        'moran_block_size': moran_block_size,
+        'seed': seed,
+        'klimek_bins': klimek_bins,
+        'klimek_kde': klimek_kde,
+        'klimek_bandwidth': klimek_bandwidth,
+    }
 
-    os.makedirs(os.path.dirname(OUTPUT_FILE), exist_ok=True)
-    with open(OUTPUT_FILE, 'w', encoding='utf-8') as f:
-        json.dump(output, f, ensure_ascii=False, indent=2)
 
-    print(f"✅ Data prepared: {OUTPUT_FILE}")
-    print(f"   Total areas: {total_areas}")
-    print(f"   Suspicious areas: {total_suspicious} ({output['summary']['suspiciousPercent']}%)")
+def make_runner(params, cache, memo, cache_dir, jobs=1, rerun=(), trace_memory=False, memory=None):
+    """StageRunner of STAGES; run() it and pass the values to build_output"""
+    return StageRunner(
+        STAGES,
+        params=params,
+        # --jobs parallelises across stages; a stage sharing the pool runs its
+        # simulation blocks serially so N workers use N cores, one running
+        # alone gets all of them (the results are the same)
+        context={'cache': cache, 'memo': memo, 'jobs': 1},
+        solo_context={'jobs': jobs},
+        cache_dir=cache_dir,
+        file_hash=cache.file_hash if cache is not None else None,
+        rerun=rerun,
+        jobs=jobs,
+        trace_memory=trace_memory,
+        memory=memory,
+    )
+
+
+def main(cache_dir=CACHE_DIR, mc_iterations=MC_ITERATIONS, mc_batch_size=MC_BATCH_SIZE,
+         n_permutations=N_PERMUTATIONS, perm_block_size=PERM_BLOCK_SIZE,
+         moran_permutations=MORAN_PERMUTATIONS, moran_block_size=MORAN_BLOCK_SIZE, seed=SEED, jobs=1,
+         klimek_bins=KLIMEK_BINS, klimek_kde=False, klimek_bandwidth=None, rerun=(),
+         trace_memory=False, output_file=OUTPUT_FILE, snapshot=None, profile_file=None):
+    # Decoded inputs and stage results are cached by content hash;
+    # cache_dir=None parses and computes everything
+    cache = ParseCache(cache_dir) if cache_dir else None
+    # Per-area records of areas whose files did not change are reused
+    memo = AreaMemo(os.path.join(cache_dir, 'areas') if cache_dir else None)
+    mp_dir, pl_dir = MP_DIR, PL_DIR
+    if snapshot:
+        # An archived snapshot's data/mp + data/pl; the other inputs stay as they are
+        version, mp_dir, pl_dir = checkout_snapshot(snapshot, cache_dir)
+        print(f"  🕒 Snapshot {version}")
+    params = run_params(mp_dir, pl_dir, mc_iterations, mc_batch_size, n_permutations, perm_block_size,
+                        moran_permutations, moran_block_size, seed, klimek_bins, klimek_kde,
+                        klimek_bandwidth)
+    runner = make_runner(params, cache, memo, cache_dir, jobs, rerun, trace_memory)
+    with Measure() as total:
+        output = build_output(runner.run())
+
+        cached = [name for name in runner.topo if runner.status.get(name) == 'cached']
+        ran = [name for name in runner.topo if runner.status.get(name) == 'run']
+        print(f"  🧩 Stages: {len(ran)} run ({', '.join(ran)}), {len(cached)} cached")
+        if cache is not None:
+            cache.save_index()
+            print(f"  🗄️ Parse cache: {cache.hits} hits / {cache.misses} misses "
+                  f"({cache.files_parsed} files parsed)")
+
+        os.makedirs(os.path.dirname(output_file), exist_ok=True)
+        # Unchanged parts of the document reuse their rendered text
+        with Measure(trace_memory) as m:
+            write_json(output_file, output, cache_dir)
+
+    rows = [
+        {'stage': name, 'status': runner.status[name],
+         'fingerprint': runner.fingerprints[name][:12], **runner.metrics[name]}
+        for name in runner.topo if name in runner.metrics
+    ]
+    rows.append({'stage': 'write_json', 'status': 'run', 'fingerprint': None, **m.metrics})
+    # Not in public/: the profile would be deployed with the site. Without a
+    # cache directory it is only written where profile_file asks
+    if profile_file is None and cache_dir:
+        profile_file = os.path.join(cache_dir, PROFILE_NAME)
+    if profile_file:
+        os.makedirs(os.path.dirname(os.path.abspath(profile_file)), exist_ok=True)
+        write_profile(profile_file, rows, total.metrics, jobs, trace_memory, runner.params)
+        print(f"  ⏱️ Stage profile (slowest first, saved to {os.path.normpath(profile_file)}):")
+    else:
+        print("  ⏱️ Stage profile (slowest first):")
+    print(summary_table(rows))
+
+    print(f"✅ Data prepared: {output_file}")
+    print(f"   Total areas: {output['summary']['totalAreas']}")
+    print(f"   Suspicious areas: {output['summary']['totalSuspicious']} ({output['summary']['suspiciousPercent']}%)")
+
 
 if __name__ == '__main__':
-    main()
+    parser = argparse.ArgumentParser(description='Build public/election_data.json from data/')
+    parser.add_argument('--output', default=OUTPUT_FILE,
+                        help='output JSON file (default: public/election_data.json)')
+    parser.add_argument('--profile', metavar='PATH',
+                        help=f'per-stage resource profile JSON (default: <cache-dir>/{PROFILE_NAME}; '
+                             'with --no-cache none unless given)')
+    parser.add_argument('--cache-dir', default=CACHE_DIR,
+                        help='parse cache directory (default: visualization/.cache)')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='parse every input file, ignoring and not writing the cache')
+    parser.add_argument('--mc-iterations', type=int, default=MC_ITERATIONS,
+                        help=f'twin-number Monte Carlo shuffles (default: {MC_ITERATIONS})')
+    parser.add_argument('--mc-batch-size', type=int, default=MC_BATCH_SIZE,
+                        help=f'shuffles generated per batch (default: {MC_BATCH_SIZE})')
+    parser.add_argument('--permutations', type=int, default=N_PERMUTATIONS,
+                        help=f'ensemble permutation-test shuffles (default: {N_PERMUTATIONS})')
+    parser.add_argument('--perm-block-size', type=int, default=PERM_BLOCK_SIZE,
+                        help=f'permutations generated per block (default: {PERM_BLOCK_SIZE})')
+    parser.add_argument('--moran-permutations', type=int, default=MORAN_PERMUTATIONS,
+                        help=f'Local Moran conditional permutations per area (default: {MORAN_PERMUTATIONS})')
+    parser.add_argument('--moran-block-size', type=int, default=MORAN_BLOCK_SIZE,
+                        help=f'Local Moran permutations generated per block (default: {MORAN_BLOCK_SIZE})')
+    parser.add_argument('--klimek-bins', type=int, default=KLIMEK_BINS,
+                        help=f'Klimek fingerprint grid bins per axis, e.g. 100 or 200 (default: {KLIMEK_BINS})')
+    parser.add_argument('--klimek-kde', action='store_true',
+                        help='also emit a Gaussian-KDE smoothed Klimek surface (klimekAnalysis.density)')
+    parser.add_argument('--klimek-bandwidth', type=float, default=None,
+                        help='KDE bandwidth in percentage points (default: Scott\'s rule per axis)')
+    parser.add_argument('--seed', type=int, default=SEED,
+                        help=f'random seed for the simulations (default: {SEED})')
+    parser.add_argument('--snapshot', metavar='VERSION',
+                        help='read data/mp and data/pl of an archived snapshot (data/snapshots), '
+                             'or "latest"; default: the files in data/mp and data/pl')
+    parser.add_argument('--jobs', type=int, default=1,
+                        help='worker processes running independent stages in parallel; '
+                             'the output is identical for any value (default: 1)')
+    parser.add_argument('--rerun', action='append', default=[], metavar='STAGE',
+                        choices=[stage.name for stage in STAGES],
+                        help='run this stage even if its cached result is current (repeatable)')
+    parser.add_argument('--trace-memory', action='store_true',
+                        help='record peak memory per stage with tracemalloc '
+                             '(slows the run ~2.5x; see --profile)')
+    args = parser.parse_args()
+    main(
+        cache_dir=None if args.no_cache else args.cache_dir,
+        mc_iterations=args.mc_iterations,
+        mc_batch_size=args.mc_batch_size,
+        n_permutations=args.permutations,
+        perm_block_size=args.perm_block_size,
+        moran_permutations=args.moran_permutations,
+        moran_block_size=args.moran_block_size,
+        seed=args.seed,
+        jobs=args.jobs,
+        klimek_bins=args.klimek_bins,
+        klimek_kde=args.klimek_kde,
+        klimek_bandwidth=args.klimek_bandwidth,
+        rerun=args.rerun,
+        trace_memory=args.trace_memory,
+        output_file=args.output,
+        snapshot=args.snapshot,
+        profile_file=args.profile,
+    )
@@ -0,0 +1,49 @@
+"""
+Reproducible, independent random streams for the stochastic stages.
+
+    root seed ──► stage stream ("twin_mc", "ensemble_perm", ...) ──► block k
+
+A stage's stream is derived from the root seed and the stage *name*. So
+adding a stage, or changing one stage's iteration count, leaves every other
+stage's draws untouched. Each stage splits its work into fixed-size blocks,
+and block k always draws from the k-th child SeedSequence of the stage. The
+result therefore depends on the block size but never on how many workers
+run the blocks or in which order they finish.
+"""
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+
+def stage_seed(seed, stage):
+    """SeedSequence of a named stage, independent of every other stage."""
+    return np.random.SeedSequence([seed, zlib.crc32(stage.encode('utf-8'))])
+
+
+def block_seed(stage_seq, k):
+    """k-th child of `stage_seq`, the same as stage_seq.spawn(k + 1)[k]."""
+    return np.random.SeedSequence(
+        entropy=stage_seq.entropy,
+        spawn_key=tuple(stage_seq.spawn_key) + (k,),
+        pool_size=stage_seq.pool_size,
+    )
+
+
+def block_sizes(total, block_size):
+    """Sizes of the consecutive blocks covering `total` draws."""
+    block_size = max(1, block_size)
+    return [min(block_size, total - start) for start in range(0, total, block_size)]
+
+
+def map_blocks(fn, tasks, jobs=1):
+    """Yield fn(task) for each task in order, over `jobs` worker processes.
+
+    fn must be a module-level function so it can be sent to the workers.
+    """
+    if jobs <= 1 or len(tasks) <= 1:
+        for task in tasks:
+            yield fn(task)
+        return
+    with ProcessPoolExecutor(max_workers=min(jobs, len(tasks))) as pool:
+        yield from pool.map(fn, tasks)
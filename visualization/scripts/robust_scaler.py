@@ -0,0 +1,62 @@
+"""
+Robust Z-Score scaling (median / IQR) fitted once, applied to whole arrays.
+
+RobustScaler reproduces prepare_data.py's original per-value formula exactly:
+
+    q1 = sorted[n // 4], q3 = sorted[3n // 4], median = statistics.median
+    z  = 0.6745 * (value - median) / (iqr / 2)
+    z  = 0.0 when n < 5 or iqr == 0
+
+but sorts the reference values once per feature instead of once per call.
+"""
+import numpy as np
+
+
+class RobustScaler:
+    """Median / IQR robust z-score fitted on a reference sample."""
+
+    MIN_COUNT = 5
+
+    def __init__(self):
+        self.n = 0
+        self.median = 0
+        self.q1 = 0
+        self.q3 = 0
+        self.iqr = 0
+
+    def fit(self, values):
+        """Fit median / quartiles on `values` (any sequence of numbers)."""
+        s = np.sort(np.asarray(values))
+        n = len(s)
+        self.n = n
+        if n < self.MIN_COUNT:
+            return self
+        self.q1 = s[n // 4]
+        self.q3 = s[3 * n // 4]
+        self.iqr = self.q3 - self.q1
+        # statistics.median: middle element, or mean of the two middles
+        if n % 2:
+            self.median = s[n // 2]
+        else:
+            self.median = (s[n // 2 - 1] + s[n // 2]) / 2
+        return self
+
+    @property
+    def degenerate(self):
+        """True when every score is 0.0 (too few values or zero IQR)."""
+        return self.n < self.MIN_COUNT or self.iqr == 0
+
+    def transform(self, values):
+        """(len(values),) float64 robust z-scores."""
+        values = np.asarray(values)
+        if self.degenerate:
+            return np.zeros(len(values), dtype=np.float64)
+        return 0.6745 * (values - self.median) / (self.iqr / 2)
+
+    def fit_transform(self, values):
+        return self.fit(values).transform(values)
+
+
+def robust_z_scores(values, reference):
+    """Robust z-score of each of `values` against `reference`, as Python floats."""
+    return RobustScaler().fit(reference).transform(values).tolist()
@@ -0,0 +1,78 @@
+"""
+Numpy arrays handed to worker processes through shared memory.
+
+A pickled ndarray carries a copy of its bytes, and every worker that
+receives it unpickles its own copy. A SharedArray handle is pickled as a
+segment name, shape and dtype only. Unpickling it maps the segment and
+yields a read-only ndarray view, with no copy:
+
+    with SharedArrays() as segments:
+        handle = segments.put(array)      # one copy into a new segment
+        pool.submit(fn, handle)           # fn receives an ndarray view
+
+The SharedArrays owner unlinks its segments on close, so workers must be
+done with them by then. It must be created before the pool: workers then
+share the parent's resource tracker, and attaching in a worker does not
+register the segment a second time.
+"""
+import os
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+_attached = {}  # segment name -> SharedMemory, mapped for the life of the worker
+
+
+class SharedArray:
+    """Picklable handle of an array stored in a shared-memory segment."""
+
+    def __init__(self, name, shape, dtype):
+        self.name = name
+        self.shape = shape
+        self.dtype = dtype
+
+    def __reduce__(self):
+        return attach, (self.name, self.shape, self.dtype)
+
+
+class SharedArrays:
+    """Owner of the shared-memory segments created during one run."""
+
+    def __init__(self):
+        self._segments = []
+        if os.name == 'posix':
+            # Forked workers inherit a running tracker; started lazily, each
+            # worker would launch its own and unlink segments when it exits
+            resource_tracker.ensure_running()
+
+    def put(self, array):
+        """SharedArray handle of a shared copy of `array`."""
+        array = np.ascontiguousarray(array)
+        shm = shared_memory.SharedMemory(create=True, size=max(1, array.nbytes))
+        self._segments.append(shm)
+        view = np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)
+        view[...] = array
+        del view
+        return SharedArray(shm.name, array.shape, array.dtype.str)
+
+    def close(self):
+        for shm in self._segments:
+            shm.close()
+            shm.unlink()
+        self._segments = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def attach(name, shape, dtype):
+    """Read-only ndarray view of segment `name` (called when a handle is unpickled)."""
+    shm = _attached.get(name)
+    if shm is None:
+        shm = _attached[name] = shared_memory.SharedMemory(name=name)
+    array = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+    array.flags.writeable = False
+    return array
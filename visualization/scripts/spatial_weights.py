@@ -0,0 +1,122 @@
+"""
+Sparse spatial weights between constituency areas.
+
+Province adjacency is derived from the province polygons in
+public/thailand-provinces.json by queen contiguity: two provinces are
+neighbours when their boundaries share at least one vertex. Vertices are
+snapped to `decimals` places first, so boundaries digitised with tiny
+floating-point differences still match.
+
+Areas are neighbours when they lie in the same province or in adjacent
+provinces. The result is a binary CSR matrix (indptr / indices), so spatial
+lags and Moran's I sums are one sparse matrix-vector product each:
+
+    (W x)_i = Σ_{j ∈ N(i)} x_j
+"""
+import json
+
+import numpy as np
+
+
+def _rings(geometry):
+    """Coordinate rings of a Polygon / MultiPolygon geometry."""
+    if geometry['type'] == 'Polygon':
+        return geometry['coordinates']
+    if geometry['type'] == 'MultiPolygon':
+        return [ring for polygon in geometry['coordinates'] for ring in polygon]
+    return []
+
+
+def queen_contiguity(geojson, decimals=6):
+    """{province name: sorted neighbour names} from a FeatureCollection.
+
+    Provinces are keyed by properties.name. Islands with no shared vertex
+    (Phuket) get an empty list.
+    """
+    names = [f['properties']['name'] for f in geojson['features']]
+    coords, owner = [], []
+    for i, feature in enumerate(geojson['features']):
+        for ring in _rings(feature['geometry']):
+            ring = np.asarray(ring, dtype=np.float64)[:, :2]
+            coords.append(ring)
+            owner.append(np.full(len(ring), i))
+    neighbours = {name: set() for name in names}
+    if coords:
+        coords = np.round(np.concatenate(coords), decimals)
+        owner = np.concatenate(owner)
+        _, vertex = np.unique(coords, axis=0, return_inverse=True)
+        # Distinct (vertex, province) pairs; a vertex listed under two or
+        # more provinces links every pair of them
+        pairs = np.unique(np.stack([vertex.ravel(), owner], axis=1), axis=0)
+        starts = np.flatnonzero(np.r_[True, pairs[1:, 0] != pairs[:-1, 0], True])
+        for lo, hi in zip(starts[:-1], starts[1:]):
+            if hi - lo < 2:
+                continue
+            shared = pairs[lo:hi, 1].tolist()
+            for a in shared:
+                for b in shared:
+                    if a != b:
+                        neighbours[names[a]].add(names[b])
+    return {name: sorted(nb) for name, nb in neighbours.items()}
+
+
+class SpatialWeights:
+    """Binary CSR weights over `codes`: same province + adjacent provinces.
+
+    codes : area codes, row / column order of the matrix
+    province_of : {area code: province key}
+    province_neighbors : {province key: [adjacent province keys]}
+    """
+
+    def __init__(self, codes, province_of, province_neighbors):
+        self.codes = list(codes)
+        self.index = {code: i for i, code in enumerate(self.codes)}
+        by_province = {}
+        for i, code in enumerate(self.codes):
+            by_province.setdefault(province_of.get(code), []).append(i)
+
+        indptr = [0]
+        indices = []
+        for i, code in enumerate(self.codes):
+            prov = province_of.get(code)
+            row = [j for j in by_province.get(prov, []) if j != i]
+            if prov is not None:
+                for nprov in province_neighbors.get(prov, []):
+                    if nprov != prov:
+                        row.extend(by_province.get(nprov, []))
+            indices.extend(sorted(row))
+            indptr.append(len(indices))
+        self.indptr = np.array(indptr, dtype=np.int64)
+        self.indices = np.array(indices, dtype=np.int64)
+        self.n_neighbors = np.diff(self.indptr)
+        self._row = np.repeat(np.arange(len(self.codes)), self.n_neighbors)
+
+    @property
+    def nnz(self):
+        return len(self.indices)
+
+    def neighbors(self, code):
+        """Neighbour area codes of `code`."""
+        i = self.index[code]
+        return [self.codes[j] for j in self.indices[self.indptr[i]:self.indptr[i + 1]]]
+
+    def dot(self, x):
+        """W @ x: sum of x over each area's neighbours."""
+        x = np.asarray(x, dtype=np.float64)
+        return np.bincount(self._row, weights=x[self.indices], minlength=len(self.codes))
+
+    def lag(self, x):
+        """Row-standardised spatial lag: mean of x over each area's neighbours (0 if none)."""
+        sums = self.dot(x)
+        return np.divide(sums, self.n_neighbors, out=np.zeros(len(sums)), where=self.n_neighbors > 0)
+
+
+def province_adjacency(path, cache=None, decimals=6):
+    """queen_contiguity() of a province GeoJSON file, through the parse cache when given."""
+    def build(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return queen_contiguity(json.load(f), decimals)
+
+    if cache is not None:
+        return cache.load_derived(path, 'queen-contiguity', build, {'decimals': decimals})
+    return build(path)
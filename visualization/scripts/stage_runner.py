@@ -0,0 +1,458 @@
+"""
+Named pipeline stages with declared inputs, run in dependency order and
+cached on disk by input fingerprint.
+
+A stage is a function whose parameter names say what it consumes:
+
+    def stage_klimek(ensemble_analysis, constituency_data, store, klimek_bins): ...
+
+Each parameter is either an output of an upstream stage (which makes that
+stage a dependency), a run parameter (e.g. klimek_bins, part of the
+fingerprint), or a context value (e.g. cache, jobs, which cannot change the
+result and are not fingerprinted). The function returns a dict holding
+exactly the stage's declared `outputs`.
+
+    fingerprint(stage) = sha256(stage name, code of the stage function and
+                                everything it references, run parameter
+                                values, hashes of declared input files,
+                                fingerprints of upstream stages)
+
+Fingerprints are computed before anything runs. A cached stage whose
+fingerprint matches a pickle under <cache_dir>/stages/ is loaded instead
+of run. Upstream stages are only executed when a stage that needs them has
+to run. So changing --klimek-bins re-runs the Klimek stage alone.
+
+A stage may modify objects it receives, but only if it is their sole
+consumer. Each result is pickled as soon as its stage finishes, so the
+cache always holds what that stage returned.
+
+With jobs > 1, every stage whose inputs are ready is submitted to a pool
+of worker processes, so independent stages run at the same time. Stages
+declared with pool=False (those using the parse cache, whose index lives
+in this process) run in the main process between submissions. A stage
+that is the only one ready while nothing runs (everything pending waits
+for it) also runs in the main process, with `solo_context` overriding
+its context values, so it can use the idle cores itself (--jobs for the
+simulations). The pool starts at the first submission. Values that
+exist by then, such as the parsed inputs, are handed to each worker once
+through the pool initializer, so forked workers inherit them without a
+copy. Values with a share(segments) method (VoteMatrix) are moved into
+shared memory first and reach the workers as handles rather than pickled
+arrays. Stage results do not depend on where they ran, so the output is
+the same for any `jobs`.
+
+runner.metrics[name] holds the instrument.Measure metrics of each stage:
+of its run (measured in the worker for pool stages) or of its cache load.
+
+A long-running caller (watch.py) passes the same `memory` dict to the
+runner of every cycle; it keeps {name: (fingerprint, result)} of each
+stage. A stage whose fingerprint is unchanged is then taken from memory
+(status 'memory') without unpickling, but only if none of the stages
+consuming its outputs has to be brought up to date: such a consumer may
+modify what it receives, so it gets the result as the stage returned it,
+from the pickle or a new run.
+"""
+import glob
+import hashlib
+import inspect
+import os
+import pickle
+import sys
+import types
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from instrument import Measure
+from shared_arrays import SharedArrays
+
+RUNNER_VERSION = 1
+_SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class Stage:
+    """One pipeline step.
+
+    fn : function computing the outputs; its parameter names are its inputs
+    outputs : names of the values in the dict fn returns
+    files : raw input files (or directories of *.json) the stage reads
+    cache : False for cheap stages whose outputs are not worth pickling
+        (they still have a fingerprint and run only when needed)
+    pool : False to always run in the main process, e.g. for stages that
+        use an unpicklable context value
+    """
+
+    def __init__(self, name, fn, outputs, files=(), cache=True, pool=True):
+        self.name = name
+        self.fn = fn
+        self.outputs = tuple(outputs)
+        self.files = tuple(files)
+        self.cache = cache
+        self.pool = pool
+        self.inputs = tuple(inspect.signature(fn).parameters)
+
+
+class StageRunner:
+    """Resolve, fingerprint and run a list of stages.
+
+    params : {name: value} run parameters, included in fingerprints
+    context : {name: value} injected but not fingerprinted (cache, jobs)
+    cache_dir : directory for stage pickles; None disables stage caching
+    file_hash : function(path) -> content hash (ParseCache.file_hash)
+    rerun : stage names to run even when a cached result matches
+    jobs : worker processes for independent stages; 1 runs everything here
+    trace_memory : record each stage's peak traced memory (tracemalloc)
+    memory : {name: (fingerprint, result)} kept between runs by the caller
+    solo_context : {name: value} replacing context values of a stage that
+        runs alone with jobs > 1 (e.g. {'jobs': jobs})
+    """
+
+    def __init__(self, stages, params=None, context=None, cache_dir=None,
+                 file_hash=None, rerun=(), jobs=1, trace_memory=False, memory=None,
+                 solo_context=None):
+        self.stages = {s.name: s for s in stages}
+        self.order = [s.name for s in stages]
+        self.params = dict(params or {})
+        self.context = dict(context or {})
+        self.cache_dir = cache_dir
+        self.file_hash = file_hash or _sha256_file
+        self.rerun = set(rerun)
+        self.jobs = jobs
+        self.trace_memory = trace_memory
+        self.memory = memory
+        self.solo_context = dict(solo_context or {})
+        self.producer = {}
+        for stage in stages:
+            for out in stage.outputs:
+                if out in self.producer:
+                    raise ValueError(f'{out!r} is produced by both {self.producer[out]!r} and {stage.name!r}')
+                self.producer[out] = stage.name
+        unknown = set(self.rerun) - set(self.stages)
+        if unknown:
+            raise ValueError(f'unknown stage(s): {", ".join(sorted(unknown))}')
+        self.deps = {}
+        for stage in stages:
+            deps = []
+            for name in stage.inputs:
+                if name in self.producer:
+                    if self.producer[name] not in deps:
+                        deps.append(self.producer[name])
+                elif name not in self.params and name not in self.context:
+                    raise ValueError(f'stage {stage.name!r}: no stage, parameter or context provides {name!r}')
+            self.deps[stage.name] = deps
+        self.topo = self._toposort()
+        self.fingerprints = {}
+        self.status = {}  # name -> 'run' | 'cached' | 'memory'
+        self.metrics = {}  # name -> instrument.Measure metrics
+        self._values = {}
+        self._done = set()
+        self._from_memory = set()
+
+    def _toposort(self):
+        order, state = [], {}
+
+        def visit(name, path):
+            if state.get(name) == 'done':
+                return
+            if state.get(name) == 'visiting':
+                raise ValueError('stage cycle: ' + ' -> '.join(path + [name]))
+            state[name] = 'visiting'
+            for dep in self.deps[name]:
+                visit(dep, path + [name])
+            state[name] = 'done'
+            order.append(name)
+
+        for name in self.order:
+            visit(name, [])
+        return order
+
+    # ── fingerprints ─────────────────────────────────────────────
+
+    def fingerprint(self, name):
+        if name in self.fingerprints:
+            return self.fingerprints[name]
+        stage = self.stages[name]
+        h = hashlib.sha256()
+        h.update(f'{RUNNER_VERSION}\0{name}\0'.encode('utf-8'))
+        h.update(code_fingerprint(stage.fn).encode('utf-8'))
+        for p in stage.inputs:
+            if p in self.params and p not in self.producer:
+                h.update(f'\0param {p}={self.params[p]!r}'.encode('utf-8'))
+        for path in stage.files:
+            h.update(f'\0file {os.path.basename(os.path.normpath(path))}={self._path_hash(path)}'.encode('utf-8'))
+        for dep in self.deps[name]:
+            h.update(f'\0dep {dep}={self.fingerprint(dep)}'.encode('utf-8'))
+        self.fingerprints[name] = h.hexdigest()
+        return self.fingerprints[name]
+
+    def _path_hash(self, path):
+        if os.path.isdir(path):
+            paths = sorted(glob.glob(os.path.join(path, '*.json')))
+            listing = ''.join(f'{os.path.basename(p)}:{self.file_hash(p)}\n' for p in paths)
+            return hashlib.sha256(listing.encode('utf-8')).hexdigest()
+        if os.path.exists(path):
+            return self.file_hash(path)
+        return 'missing'
+
+    # ── execution ────────────────────────────────────────────────
+
+    def _pickle_path(self, name):
+        return os.path.join(self.cache_dir, 'stages', f'{name}-{self.fingerprint(name)[:32]}.pickle')
+
+    def _plan_memory(self):
+        """Stages whose result in `memory` can be used as is (see the module docstring)."""
+        stale = {name for name in self.topo
+                 if name in self.rerun or self.memory.get(name, (None,))[0] != self.fingerprint(name)}
+        consumers = {name: [c for c in self.topo if name in self.deps[c]] for name in self.topo}
+        return {name for name in self.topo
+                if name not in stale and not any(c in stale for c in consumers[name])}
+
+    def _load_memory(self, name):
+        if name not in self._from_memory:
+            return False
+        with Measure(self.trace_memory) as m:
+            result = self.memory[name][1]
+        self._finish(name, result, 'memory', m.metrics)
+        return True
+
+    def _load_cached(self, name):
+        if self.cache_dir is None or not self.stages[name].cache or name in self.rerun:
+            return None
+        try:
+            with open(self._pickle_path(name), 'rb') as f:
+                return pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            return None
+
+    def _store(self, name, result):
+        if self.cache_dir is None or not self.stages[name].cache:
+            return
+        path = self._pickle_path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f'{path}.{os.getpid()}.tmp'
+        with open(tmp, 'wb') as f:
+            pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+        # Keep one result per stage
+        for old in glob.glob(os.path.join(self.cache_dir, 'stages', f'{name}-*.pickle')):
+            if old != path:
+                try:
+                    os.remove(old)
+                except OSError:
+                    pass
+
+    def _kwargs(self, name, segments=None, skip=(), context=None):
+        context = self.context if context is None else context
+        kwargs = {}
+        for p in self.stages[name].inputs:
+            if p in skip:
+                continue
+            if p in self.producer:
+                value = self._values[p]
+                if segments is not None and hasattr(value, 'share'):
+                    value.share(segments)
+                kwargs[p] = value
+            elif p in self.params:
+                kwargs[p] = self.params[p]
+            else:
+                kwargs[p] = context[p]
+        return kwargs
+
+    def _finish(self, name, result, status, metrics):
+        if status == 'run':
+            outputs = self.stages[name].outputs
+            if set(result) != set(outputs):
+                raise ValueError(f'stage {name!r} returned {sorted(result)}, declared {sorted(outputs)}')
+            self._store(name, result)
+        self.status[name] = status
+        self.metrics[name] = metrics
+        self._values.update(result)
+        self._done.add(name)
+        if self.memory is not None:
+            self.memory[name] = (self.fingerprint(name), result)
+
+    def _ensure(self, name):
+        """Make the outputs of `name` available, loading or running it."""
+        if name in self._done or self._load_memory(name):
+            return
+        with Measure(self.trace_memory) as m:
+            result = self._load_cached(name)
+        if result is not None:
+            self._finish(name, result, 'cached', m.metrics)
+            return
+        for dep in self.deps[name]:
+            self._ensure(dep)
+        with Measure(self.trace_memory) as m:
+            result = self.stages[name].fn(**self._kwargs(name))
+        self._finish(name, result, 'run', m.metrics)
+
+    def _run_pool(self, targets):
+        """Run the stages `targets` need on a process pool, as soon as their inputs exist."""
+        # Same laziness as _ensure: a stage loaded from the cache needs nothing upstream
+        to_run = []
+
+        def plan(name):
+            if name in self._done or name in to_run or self._load_memory(name):
+                return
+            with Measure(self.trace_memory) as m:
+                result = self._load_cached(name)
+            if result is not None:
+                self._finish(name, result, 'cached', m.metrics)
+                return
+            to_run.append(name)
+            for dep in self.deps[name]:
+                plan(dep)
+
+        for name in targets:
+            plan(name)
+        pending = [name for name in self.topo if name in to_run]
+        if not pending:
+            return
+
+        running = {}  # future -> stage name
+        pool, preloaded = None, {}
+        segments = SharedArrays()
+        try:
+            while pending or running:
+                ready = [n for n in pending if all(d in self._done for d in self.deps[n])]
+                if len(ready) == 1 and not running and self.solo_context:
+                    # Every other pending stage waits for it: give it the workers instead
+                    name = ready[0]
+                    pending.remove(name)
+                    with Measure(self.trace_memory) as m:
+                        result = self.stages[name].fn(**self._kwargs(
+                            name, context={**self.context, **self.solo_context}))
+                    self._finish(name, result, 'run', m.metrics)
+                    continue
+                for name in ready:
+                    if not self.stages[name].pool:
+                        continue
+                    if pool is None:
+                        preloaded = dict(self._values)
+                        for value in preloaded.values():
+                            if hasattr(value, 'share'):
+                                value.share(segments)
+                        # Forked workers must not inherit buffered output
+                        sys.stdout.flush()
+                        pool = ProcessPoolExecutor(max_workers=self.jobs, initializer=_preload,
+                                                   initargs=(preloaded,))
+                    pending.remove(name)
+                    names = [p for p in self.stages[name].inputs if p in preloaded]
+                    kwargs = self._kwargs(name, segments, skip=names)
+                    future = pool.submit(_call, self.stages[name].fn, kwargs, names,
+                                         self.trace_memory)
+                    running[future] = name
+                local = [n for n in ready if not self.stages[n].pool]
+                if local:
+                    name = local[0]
+                    pending.remove(name)
+                    with Measure(self.trace_memory) as m:
+                        result = self.stages[name].fn(**self._kwargs(name))
+                    self._finish(name, result, 'run', m.metrics)
+                    continue
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    self._finish(name, *future.result())
+        finally:
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+            segments.close()
+
+    def run(self, targets=None):
+        """{output name: value} of `targets` (default: every stage) and what they needed."""
+        for name in self.topo:
+            self.fingerprint(name)
+        if self.memory is not None:
+            self._from_memory = self._plan_memory()
+        targets = list(targets or self.topo)
+        if self.jobs > 1:
+            self._run_pool(targets)
+        else:
+            for name in targets:
+                self._ensure(name)
+        return dict(self._values)
+
+
+_preloaded = {}  # worker side: values handed over when the pool started
+
+
+def _preload(values):
+    _preloaded.update(values)
+
+
+def _call(fn, kwargs, preloaded_names, trace_memory):
+    """Worker side: (result, 'run', metrics) of one stage."""
+    for name in preloaded_names:
+        kwargs[name] = _preloaded[name]
+    with Measure(trace_memory) as m:
+        result = fn(**kwargs)
+    sys.stdout.flush()
+    return result, 'run', m.metrics
+
+
+# ── code fingerprints ───────────────────────────────────────────
+
+def _code_names(code):
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            names |= _code_names(const)
+    return names
+
+
+def _module_file_digest(module_name, _memo={}):
+    """Digest of a pipeline module's source, or the version of a library."""
+    if module_name not in _memo:
+        module = sys.modules.get(module_name)
+        path = getattr(module, '__file__', None) or ''
+        if os.path.dirname(os.path.abspath(path)) == _SCRIPTS_DIR and path.endswith('.py'):
+            _memo[module_name] = _sha256_file(path)
+        else:
+            _memo[module_name] = str(getattr(module, '__version__', module_name))
+    return _memo[module_name]
+
+
+def code_fingerprint(fn):
+    """Hash of fn's source and of every global it references, recursively.
+
+    Functions and classes of fn's own module contribute their source,
+    objects from other modules their module file digest, and plain
+    constants their repr.
+    """
+    h = hashlib.sha256()
+    seen = set()
+    home = fn.__module__
+
+    def add(obj):
+        if id(obj) in seen:
+            return
+        seen.add(id(obj))
+        if isinstance(obj, types.ModuleType):
+            h.update(f'\0module {obj.__name__}={_module_file_digest(obj.__name__)}'.encode('utf-8'))
+            return
+        if isinstance(obj, (types.FunctionType, type)):
+            if obj.__module__ != home:
+                h.update(f'\0extern {obj.__module__}.{obj.__qualname__}='
+                         f'{_module_file_digest(obj.__module__.split(".")[0])}'.encode('utf-8'))
+                return
+            try:
+                h.update(inspect.getsource(obj).encode('utf-8'))
+            except (OSError, TypeError):
+                h.update(obj.__qualname__.encode('utf-8'))
+            code = getattr(obj, '__code__', None)
+            if code is not None:
+                for name in sorted(_code_names(code)):
+                    if name in obj.__globals__:
+                        add(obj.__globals__[name])
+            return
+        if callable(obj):
+            h.update(f'\0callable {getattr(obj, "__module__", "")}.{getattr(obj, "__qualname__", "")}'.encode('utf-8'))
+            return
+        h.update(f'\0const {obj!r}'.encode('utf-8'))
+
+    add(fn)
+    return h.hexdigest()
+
+
+def _sha256_file(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
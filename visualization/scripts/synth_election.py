@@ -0,0 +1,231 @@
+"""
+Synthetic election data in the schemas of data/, for scaling benchmarks.
+
+    python scripts/synth_election.py --areas 4000 --parties 120 --out /tmp/synth/data
+    ELECTION_DATA_DIR=/tmp/synth/data python scripts/prepare_data.py \\
+        --output /tmp/synth/out/election_data.json
+
+Writes mp/<code>.json, pl/<code>.json, area_code/area_code.json,
+candidates/candidate-data.json, constituency.json, party_list.json and
+referendum.json, laid out and formatted like the scraped files. The
+optional inputs (focus areas, Election 66 results, ECT API files) are not
+generated. Areas are spread over the 77 provinces of THAI_TO_GEO, so the
+spatial stage finds their polygons. An area code is a 2-digit province
+prefix plus the district number (2 digits, wider beyond 99 districts).
+
+Votes follow a small hierarchical model:
+
+    party strength      Zipf over the parties (a few large ones)
+    province shares     Dirichlet around the national strengths
+    area shares         Dirichlet around the province shares
+    turnout             Normal(70%, 6%); invalid and no-vote ballots 1–5% each
+    party-list votes    Multinomial(valid ballots, area shares)
+    constituency votes  Multinomial over the area's candidates, with shares
+                        ∝ party share × a personal log-normal factor
+
+The same arguments give the same files. A synthetic.json manifest records
+them; the generator only overwrites a directory that holds one.
+"""
+import argparse
+import glob
+import json
+import os
+
+import numpy as np
+
+from prepare_data import THAI_TO_GEO
+from rng_streams import stage_seed
+
+MANIFEST = 'synthetic.json'
+UPDATED_AT = '2026-02-08T12:00:00.000Z'
+
+PROVINCE_CONCENTRATION = 60.0  # Dirichlet concentration of province shares
+AREA_CONCENTRATION = 250.0     # ... and of area shares around their province
+
+PREFIXES = [('นาย', 0.76), ('นางสาว', 0.14), ('นาง', 0.05), ('ว่าที่ร้อยตรี', 0.02),
+            ('พันตำรวจเอก', 0.015), ('ร้อยตำรวจเอก', 0.015)]
+SYLLABLES = ['สม', 'ชัย', 'ประ', 'วิ', 'ศักดิ์', 'สุ', 'กิตติ', 'พง', 'ธนา', 'ณัฐ',
+             'รัตน์', 'อนุ', 'ชาติ', 'ศรี', 'พร', 'วัฒน์', 'นา', 'ทอง', 'บุญ', 'มณี',
+             'เกียรติ', 'ภูมิ', 'จันทร์', 'แก้ว', 'สิทธิ์', 'กุล', 'วงศ์', 'เดช', 'ทิพย์', 'ยศ']
+
+
+def area_counts(n_areas, n_provinces, rng):
+    """Areas per province: at least one each, the rest by log-normal weights."""
+    if n_areas <= n_provinces:
+        return [1] * n_areas + [0] * (n_provinces - n_areas)
+    weights = rng.lognormal(0.0, 0.6, n_provinces)
+    extra = (n_areas - n_provinces) * weights / weights.sum()
+    counts = np.floor(extra).astype(int)
+    # Largest remainders take the areas lost to rounding
+    for i in np.argsort(-(extra - counts), kind='stable')[:n_areas - n_provinces - counts.sum()]:
+        counts[i] += 1
+    return [int(c) + 1 for c in counts]
+
+
+def dirichlet_rows(alpha, rng):
+    """One Dirichlet draw per row of `alpha` (gamma variates, normalised)."""
+    g = rng.gamma(np.maximum(alpha, 1e-3))
+    return g / g.sum(axis=-1, keepdims=True)
+
+
+def ballots(valid_rng, eligible, turnout):
+    """(cast, invalid, no vote, valid) ballot counts per area."""
+    cast = valid_rng.binomial(eligible, turnout)
+    invalid = valid_rng.binomial(cast, valid_rng.uniform(0.01, 0.05, len(cast)))
+    no_vote = valid_rng.binomial(cast - invalid, valid_rng.uniform(0.01, 0.05, len(cast)))
+    return cast, invalid, no_vote, cast - invalid - no_vote
+
+
+def ranked(codes, votes):
+    """[(rank, code, votes, percent)] by votes, as the scraped entries are ordered."""
+    total = int(votes.sum())
+    order = sorted(range(len(codes)), key=lambda i: (-votes[i], i))
+    return [(rank, codes[i], int(votes[i]), round(100 * int(votes[i]) / total, 2) if total else 0)
+            for rank, i in enumerate(order, start=1)]
+
+
+def name(rng, syllables):
+    return ''.join(SYLLABLES[i] for i in rng.integers(0, len(SYLLABLES), syllables))
+
+
+def write_json(path, doc, indent):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(doc, f, ensure_ascii=False, indent=indent)
+
+
+def generate(out_dir, n_areas=400, n_parties=60, candidates=9.0, voters=130_000, seed=42):
+    """Write a synthetic data/ tree to `out_dir`; returns its manifest."""
+    manifest = {'areas': n_areas, 'parties': n_parties, 'candidates': candidates,
+                'voters': voters, 'seed': seed}
+    manifest_path = os.path.join(out_dir, MANIFEST)
+    if os.path.isdir(out_dir) and os.listdir(out_dir) and not os.path.exists(manifest_path):
+        raise SystemExit(f'❌ {out_dir} is not empty and holds no {MANIFEST}; not overwriting it')
+    for sub in ('mp', 'pl'):
+        for path in glob.glob(os.path.join(out_dir, sub, '*.json')):
+            os.remove(path)
+        os.makedirs(os.path.join(out_dir, sub), exist_ok=True)
+
+    rng = np.random.default_rng(stage_seed(seed, 'synth_election'))
+    provinces = sorted(THAI_TO_GEO)
+    counts = area_counts(n_areas, len(provinces), rng)
+    width = max(2, len(str(max(counts))))
+    party_codes = [f'PARTY-{k:04d}' for k in range(1, n_parties + 1)]
+    strength = 1.0 / np.arange(1, n_parties + 1) ** 1.3
+    strength = rng.permutation(strength / strength.sum())
+    prefix_names = [p for p, _ in PREFIXES]
+    prefix_p = np.array([w for _, w in PREFIXES])
+    prefix_p /= prefix_p.sum()
+
+    areas, candidates_out, constituency, party_list, referendum = [], [], [], [], []
+    for p, (province, k) in enumerate(zip(provinces, counts)):
+        if k == 0:
+            continue
+        province_share = dirichlet_rows(PROVINCE_CONCENTRATION * n_parties * strength, rng)
+        share = dirichlet_rows(
+            np.broadcast_to(AREA_CONCENTRATION * n_parties * province_share, (k, n_parties)), rng)
+        eligible = rng.lognormal(np.log(voters), 0.2, k).astype(np.int64)
+        turnout = np.clip(rng.normal(0.70, 0.06, k), 0.3, 0.95)
+        _, _, _, mp_valid = ballots(rng, eligible, turnout)
+        pl_cast, _, _, pl_valid = ballots(rng, eligible, turnout)
+        pl_votes = rng.multinomial(pl_valid, share)
+
+        for d in range(k):
+            code = f'{p + 10}{d + 1:0{width}d}'
+            area_ref = f'AREA-{code}'
+            areas.append({'code': code, 'name': f'{province} เขต {d + 1}'})
+
+            # Constituency: a few parties field a candidate, numbered at random
+            n_cand = int(min(n_parties, max(2, 2 + rng.poisson(max(0.0, candidates - 2)))))
+            p_field = share[d] + 1e-9
+            fielded = rng.choice(n_parties, n_cand, replace=False, p=p_field / p_field.sum())
+            cand_share = share[d][fielded] * rng.lognormal(0.0, 0.35, n_cand)
+            mp_votes = rng.multinomial(mp_valid[d], cand_share / cand_share.sum())
+            numbers = rng.permutation(n_cand) + 1
+            cand_codes = [f'CANDIDATE-MP-{code}{n:02d}' for n in numbers]
+            party_of = {c: party_codes[j] for c, j in zip(cand_codes, fielded)}
+            for c, n, j, prefix in zip(cand_codes, numbers, fielded,
+                                       rng.choice(len(prefix_names), n_cand, p=prefix_p)):
+                candidates_out.append({
+                    'code': c, 'areaCode': area_ref, 'partyCode': party_codes[j],
+                    'number': int(n), 'prefix': prefix_names[prefix], 'specialPrefix': '',
+                    'firstName': name(rng, 2), 'lastName': name(rng, 3),
+                    'is66Winner': False, 'party66RefCode': None, 'switchedParty': None,
+                })
+            mp_ranked = ranked(cand_codes, mp_votes)
+            write_json(os.path.join(out_dir, 'mp', f'{code}.json'), {
+                'area_code': int(code),
+                'entries': [{'candidateCode': c, 'partyCode': party_of[c], 'rank': r,
+                             'voteTotal': v, 'votePercent': pct} for r, c, v, pct in mp_ranked],
+            }, indent=4)
+            constituency.append({
+                'sourceType': 'ect-unofficial', 'areaCode': area_ref,
+                'winnerPartyCode': party_of[mp_ranked[0][1]],
+                'win66PartyCode': party_codes[int(rng.choice(n_parties, p=strength))],
+                'voteProgressExists': True, 'voteProgressPercent': 100,
+                'totalEligibleVoters': int(eligible[d]),
+                'totalStations': max(1, int(eligible[d]) // 470), 'stationsReported': 0,
+                'topEntries': [{'rank': r, 'candidateCode': c, 'voteTotal': v, 'votePercent': pct}
+                               for r, c, v, pct in mp_ranked[:3]],
+            })
+
+            # Party list: every party, as in the scraped files
+            pl_ranked = ranked(party_codes, pl_votes[d])
+            write_json(os.path.join(out_dir, 'pl', f'{code}.json'), {
+                'area_code': int(code),
+                'entries': [{'partyCode': c, 'rank': r, 'voteTotal': v, 'votePercent': pct}
+                            for r, c, v, pct in pl_ranked],
+            }, indent=4)
+            party_list.append({
+                'sourceType': 'ect-unofficial', 'areaCode': area_ref,
+                'winnerPartyCode': pl_ranked[0][1],
+                'voteProgressExists': True, 'voteProgressPercent': 100,
+                'topEntries': [{'rank': r, 'partyCode': c, 'voteTotal': v, 'votePercent': pct}
+                               for r, c, v, pct in pl_ranked[:3]],
+            })
+
+            # Referendum on the party-list turnout
+            total = int(pl_cast[d])
+            bad = int(rng.binomial(total, rng.uniform(0.005, 0.02)))
+            no = int(rng.binomial(total - bad, rng.uniform(0.02, 0.06)))
+            good = total - bad - no
+            agree = int(rng.binomial(good, rng.beta(6, 4)))
+            answers = ranked(['agree', 'disagree'], np.array([agree, good - agree]))
+            referendum.append({
+                'areaCode': area_ref, 'winnerAnswerCode': answers[0][1],
+                'voteProgressExists': False, 'voteProgressPercent': 100,
+                'goodVotes': good, 'goodVotePercent': 100 * good / total if total else 0,
+                'badVotes': bad, 'badVotePercent': 100 * bad / total if total else 0,
+                'noVotes': no, 'noVotePercent': 100 * no / total if total else 0,
+                'totalVotes': total,
+                'entries': [{'rank': r, 'answerCode': c, 'voteTotal': v, 'votePercent': pct}
+                            for r, c, v, pct in answers],
+            })
+
+    write_json(os.path.join(out_dir, 'area_code', 'area_code.json'), {'areas': areas}, indent=2)
+    write_json(os.path.join(out_dir, 'candidates', 'candidate-data.json'),
+               {'candidates': candidates_out}, indent=2)
+    write_json(os.path.join(out_dir, 'constituency.json'),
+               {'lastUpdatedAt': UPDATED_AT, 'data': constituency}, indent=2)
+    write_json(os.path.join(out_dir, 'party_list.json'), {'data': party_list}, indent=2)
+    write_json(os.path.join(out_dir, 'referendum.json'),
+               {'lastUpdatedAt': UPDATED_AT, 'data': referendum}, indent=2)
+    manifest['candidatesWritten'] = len(candidates_out)
+    write_json(manifest_path, manifest, indent=2)
+    return manifest
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Write a synthetic data/ tree for benchmarks')
+    parser.add_argument('--out', required=True, help='output directory (the data/ equivalent)')
+    parser.add_argument('--areas', type=int, default=400, help='constituencies (default: 400)')
+    parser.add_argument('--parties', type=int, default=60, help='parties (default: 60)')
+    parser.add_argument('--candidates', type=float, default=9.0,
+                        help='mean constituency candidates per area (default: 9)')
+    parser.add_argument('--voters', type=int, default=130_000,
+                        help='median eligible voters per area (default: 130,000)')
+    parser.add_argument('--seed', type=int, default=42, help='random seed (default: 42)')
+    args = parser.parse_args()
+    result = generate(args.out, args.areas, args.parties, args.candidates, args.voters, args.seed)
+    print(f"✅ Synthetic data: {args.out} ({result['areas']} areas, {result['parties']} parties, "
+          f"{result['candidatesWritten']} candidates)")
@@ -0,0 +1,103 @@
+"""
+Vectorized Monte Carlo engine for the twin-number null model.
+
+For each party number j the statistic is
+
+    lift_j = mean(PL share of party j over areas whose MP winner is number j)
+             - national PL share of party j
+    z_j    = lift_j / sqrt(p_j (1 - p_j) / n_j)
+
+Under the null, winner numbers are shuffled across areas. Instead of calling
+a per-number Python loop once per shuffle, a batch of shuffles is drawn as a
+(batch, areas) permutation matrix and the per-number group sums and counts of
+every shuffle come out of a single np.bincount over (shuffle, number) keys.
+"""
+import numpy as np
+
+from rng_streams import block_seed, block_sizes, map_blocks
+
+
+def lift_z(counts, sums, national_share):
+    """Lift / z statistics from per-number group counts and share sums.
+
+    counts, sums : (..., J + 1) areas per winner number and the sum of the
+        matching party's PL share over those areas (column 0 unused)
+    national_share : (J + 1,) national PL share of each party number
+    Returns (lift, z, mean_share, se), each shaped like `counts`.
+    Groups with fewer than 2 areas, and parties with a national share of
+    0 or 1, get z = 0.
+    """
+    counts = np.asarray(counts)
+    valid = counts >= 2
+    n = np.where(valid, counts, 1)
+    mean_share = np.where(valid, sums / n, 0.0)
+    lift = np.where(valid, mean_share - national_share, 0.0)
+    p = national_share
+    var = np.where((p > 0) & (p < 1), p * (1 - p), 0.0)
+    se = np.where(valid, np.sqrt(var / n), 0.0)
+    z = np.divide(lift, se, out=np.zeros(np.broadcast(lift, se).shape), where=se > 0)
+    return lift, z, mean_share, se
+
+
+def group_stats(winner_nums, shares):
+    """Per-number (counts, sums) for one or many winner-number assignments.
+
+    winner_nums : (A,) or (B, A) winner number of each area, 1..J (other
+        values are ignored)
+    shares : (A, J + 1) PL share of party number j in area a
+    Returns counts, sums shaped (J + 1,) or (B, J + 1).
+    """
+    winner_nums = np.asarray(winner_nums)
+    single = winner_nums.ndim == 1
+    nums = np.atleast_2d(winner_nums)
+    n_batch, n_areas = nums.shape
+    width = shares.shape[1]
+
+    in_range = (nums >= 0) & (nums < width)
+    cols = np.where(in_range, nums, 0)
+    # Share of the party whose number won the area, in each shuffle
+    values = np.where(in_range, shares[np.arange(n_areas), cols], 0.0)
+    keys = (np.arange(n_batch)[:, None] * width + cols).ravel()
+    counts = np.bincount(keys, weights=in_range.ravel(), minlength=n_batch * width)
+    sums = np.bincount(keys, weights=values.ravel(), minlength=n_batch * width)
+    counts = counts.reshape(n_batch, width).astype(np.int64)
+    sums = sums.reshape(n_batch, width)
+    counts[:, 0] = 0
+    sums[:, 0] = 0.0
+    if single:
+        return counts[0], sums[0]
+    return counts, sums
+
+
+def _null_z_block(task):
+    """z-scores of one block of shuffles drawn from its own seed."""
+    winner_nums, shares, national_share, size, seq = task
+    rng = np.random.default_rng(seq)
+    shuffled = rng.permuted(np.tile(winner_nums, (size, 1)), axis=1)
+    counts, sums = group_stats(shuffled, shares)
+    return lift_z(counts, sums, national_share)[1]
+
+
+def simulate_null_z(winner_nums, shares, national_share, n_iterations,
+                    batch_size=5000, seed=42, progress=None, jobs=1):
+    """(n_iterations, J + 1) z-scores under random shuffles of winner numbers.
+
+    Shuffles are drawn `batch_size` at a time as rows of a permutation
+    matrix, so memory stays O(batch_size × areas). Block k draws from the
+    k-th child of `seed` (an int or np.random.SeedSequence), so the result
+    is the same for any `jobs` worker-process count.
+    `progress(done, total)` is called after every batch when given.
+    """
+    stage = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+    winner_nums = np.asarray(winner_nums)
+    sizes = block_sizes(n_iterations, batch_size)
+    tasks = [(winner_nums, shares, national_share, size, block_seed(stage, k))
+             for k, size in enumerate(sizes)]
+    null_z = np.zeros((n_iterations, shares.shape[1]))
+    done = 0
+    for block in map_blocks(_null_z_block, tasks, jobs):
+        null_z[done:done + len(block)] = block
+        done += len(block)
+        if progress:
+            progress(done, n_iterations)
+    return null_z
@@ -0,0 +1,130 @@
+"""
+Columnar vote matrices built once from an AreaStore.
+
+Rows are areas (sorted area codes), columns are parties (sorted party codes)
+or MP ballot numbers. Downstream statistics are reductions over these dense
+integer arrays instead of per-area dicts rebuilt from raw entry lists.
+"""
+import numpy as np
+
+
+class VoteMatrix:
+    """Dense area × party and area × candidate-number vote arrays.
+
+    Attributes
+    ----------
+    area_codes / area_index : row labels and their inverse mapping
+    party_codes / party_index : column labels and their inverse mapping
+    party_num : (P,) ballot number of each party column (PARTY-0009 -> 9)
+    mp_votes, pl_votes : (A, P) int64 votes per party on each ballot
+    mp_present, pl_present : (A, P) bool, party appears in the area's entries
+    cand_votes : (A, C) int64 MP votes by candidate ballot number
+    cand_present : (A, C) bool
+    winner_num, winner_party : (A,) rank-1 candidate number / party column,
+        -1 when the area has no MP winner
+    top_party : (A,) party column of the first MP entry with the most votes
+    mp_total, pl_total : (A,) int64 valid votes on each ballot
+    has_mp, has_pl : (A,) bool, area has an MP / PL result file
+
+    After share(), pickles carry shared-memory handles instead of the array
+    bytes, so worker processes map the arrays rather than copy them.
+    """
+
+    def __init__(self, store):
+        self.area_codes = sorted(set(store.mp_codes) | set(store.pl_codes))
+        self.area_index = {ac: i for i, ac in enumerate(self.area_codes)}
+
+        party_codes = set()
+        max_num = 0
+        for entries in store.mp.values():
+            for e in entries:
+                party_codes.add(e['partyCode'])
+                max_num = max(max_num, int(e['candidateCode'][-2:]))
+        for entries in store.pl.values():
+            for e in entries:
+                party_codes.add(e['partyCode'])
+        self.party_codes = sorted(party_codes)
+        self.party_index = {pc: j for j, pc in enumerate(self.party_codes)}
+        self.party_num = np.array([_party_num(pc) for pc in self.party_codes], dtype=np.int64)
+
+        n_areas, n_parties = len(self.area_codes), len(self.party_codes)
+        self.mp_votes = np.zeros((n_areas, n_parties), dtype=np.int64)
+        self.pl_votes = np.zeros((n_areas, n_parties), dtype=np.int64)
+        self.mp_present = np.zeros((n_areas, n_parties), dtype=bool)
+        self.pl_present = np.zeros((n_areas, n_parties), dtype=bool)
+        self.cand_votes = np.zeros((n_areas, max_num + 1), dtype=np.int64)
+        self.cand_present = np.zeros((n_areas, max_num + 1), dtype=bool)
+        self.winner_num = np.full(n_areas, -1, dtype=np.int64)
+        self.winner_party = np.full(n_areas, -1, dtype=np.int64)
+        self.top_party = np.full(n_areas, -1, dtype=np.int64)
+        self.has_mp = np.zeros(n_areas, dtype=bool)
+        self.has_pl = np.zeros(n_areas, dtype=bool)
+
+        for ac, entries in store.mp.items():
+            i = self.area_index[ac]
+            self.has_mp[i] = True
+            for e in entries:
+                j = self.party_index[e['partyCode']]
+                num = int(e['candidateCode'][-2:])
+                self.mp_votes[i, j] += e['voteTotal']
+                self.mp_present[i, j] = True
+                self.cand_votes[i, num] += e['voteTotal']
+                self.cand_present[i, num] = True
+            if entries:
+                top = max(entries, key=lambda x: x['voteTotal'])
+                self.top_party[i] = self.party_index[top['partyCode']]
+            winner = store.winner(ac)
+            if winner:
+                self.winner_num[i] = int(winner['candidateCode'][-2:])
+                self.winner_party[i] = self.party_index[winner['partyCode']]
+        for ac, entries in store.pl.items():
+            i = self.area_index[ac]
+            self.has_pl[i] = True
+            for e in entries:
+                j = self.party_index[e['partyCode']]
+                # PL files carry one entry per party; a repeat overwrites
+                self.pl_votes[i, j] = e['voteTotal']
+                self.pl_present[i, j] = True
+
+        self.mp_total = self.cand_votes.sum(axis=1)
+        self.pl_total = self.pl_votes.sum(axis=1)
+        self._shared = None
+
+    def share(self, segments):
+        """Copy the arrays into `segments` (SharedArrays) for worker processes."""
+        if self._shared is None or self._shared[0] is not segments:
+            self._shared = (segments, {
+                name: segments.put(value)
+                for name, value in vars(self).items() if isinstance(value, np.ndarray)
+            })
+
+    def __getstate__(self):
+        state = dict(vars(self))
+        shared = state.pop('_shared')
+        if shared is not None:
+            state.update(shared[1])
+        state['_shared'] = None
+        return state
+
+    def rows(self, area_codes):
+        """Row indices for a list of area codes (order preserved)."""
+        return np.array([self.area_index[ac] for ac in area_codes], dtype=np.int64)
+
+    def party_column(self, party_code):
+        """Column index for a party code, or -1 if the party never appears."""
+        return self.party_index.get(party_code, -1)
+
+    def num_columns(self, max_num):
+        """(max_num + 1,) column index of party number 0..max_num, -1 if absent."""
+        cols = np.full(max_num + 1, -1, dtype=np.int64)
+        for j, num in enumerate(self.party_num):
+            if 0 < num <= max_num:
+                cols[num] = j
+        return cols
+
+
+def _party_num(party_code):
+    try:
+        return int(party_code.replace('PARTY-', ''))
+    except ValueError:
+        return 0
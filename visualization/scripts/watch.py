@@ -0,0 +1,219 @@
+"""
+Election-night watch: poll the sources, recompute what changed, publish.
+
+    python scripts/watch.py                       # poll every 60 s until Ctrl-C
+    python scripts/watch.py --interval 30 --concurrency 16
+    python scripts/watch.py --once --no-scrape    # one cycle, ECT endpoints only
+    python scripts/watch.py --base-url http://127.0.0.1:8800 \
+        --snapshot-page http://127.0.0.1:8800/election69/result/en/geo \
+        --ect-base-url http://127.0.0.1:8800     # against scripts/mock_server.py
+
+Every cycle
+1. looks up the newest ThaiPBS snapshot version on the results page
+   (election_scraper.discover_version). A version not seen before is
+   downloaded into data/mp + data/pl with the concurrent fetcher and
+   added to data/snapshots; the file hashes before and after give the
+   areas that changed. If some areas fail, the version is not archived
+   and the next cycle fetches only those (data/crawl_journal.jsonl);
+2. polls the ECT stats_cons and stats_party endpoints with conditional
+   GETs (ect_api_fetcher.fetch_all), a 304 when nothing moved;
+3. if anything changed, and on the first cycle, runs the stages of
+   prepare_data.py in this process and publishes election_data.json. The
+   document is written next to the live file and os.replace()d over it,
+   so the site never reads a half-written file.
+
+The process stays up, so its state is warm between cycles: the parse
+cache's file-hash index, the per-area records, the HTTP connection pools
+(one AsyncFetcher serves every snapshot download) and every stage result (StageRunner memory). Only stages whose
+fingerprint moved are run again, per-area sections recompute the changed
+areas only, and everything else comes from memory. A quiet cycle is a few
+small HTTP requests.
+"""
+import argparse
+import asyncio
+import datetime
+import glob
+import os
+import sys
+import time
+import traceback
+from collections import Counter
+
+from area_memo import AreaMemo
+from instrument import Measure
+from json_output import write_json
+from parse_cache import ParseCache
+from prepare_data import (BASE_DIR, CACHE_DIR, MP_DIR, OUTPUT_FILE, PL_DIR, build_output, make_runner,
+                          run_params)
+
+# The fetchers live in <repo>/scripts
+sys.path.insert(0, os.path.join(BASE_DIR, 'scripts'))
+import ect_api_fetcher  # noqa: E402
+import election_scraper  # noqa: E402
+from crawl_journal import CrawlJournal  # noqa: E402
+from snapshot_archive import SnapshotArchive  # noqa: E402
+
+INTERVAL = 60
+ECT_ENDPOINTS = ['stats_cons', 'stats_party']
+
+
+class Watch:
+    """Polling loop state kept between cycles."""
+
+    def __init__(self, output_file=OUTPUT_FILE, cache_dir=CACHE_DIR, jobs=1, scrape=True, ect=True,
+                 concurrency=8, rps=10.0, base_url=election_scraper.BASE_URL,
+                 snapshot_page=election_scraper.SNAPSHOT_PAGE, ect_base_url=None):
+        self.output_file = output_file
+        self.cache_dir = cache_dir
+        self.jobs = jobs
+        self.scrape = scrape
+        self.ect = ect
+        self.concurrency = concurrency
+        self.rps = rps
+        self.base_url = base_url
+        self.snapshot_page = snapshot_page
+        self.ect_endpoints = (ect_api_fetcher.api_endpoints(ect_base_url, ect_base_url) if ect_base_url
+                              else ect_api_fetcher.API_ENDPOINTS)
+        self.cache = ParseCache(cache_dir)
+        self.memo = AreaMemo(os.path.join(cache_dir, 'areas'))
+        self.memory = {}  # StageRunner memory: stage name -> (fingerprint, result)
+        self.params = run_params()
+        self.cycles = 0
+        self.archive = SnapshotArchive()
+        self.codes = election_scraper.load_manifest() if scrape else []
+        # Kept open between cycles so its threads and connections are reused
+        self.fetcher = (election_scraper.AsyncFetcher(concurrency, rps, election_scraper.RETRIES, base_url)
+                        if scrape else None)
+        # data/mp + data/pl hold the snapshot the scraper archived last
+        versions = self.archive.versions()
+        self.version = versions[-1] if versions else None
+
+    def area_hashes(self):
+        """{('mp', '1001'): sha256, ...} of the files in data/mp and data/pl"""
+        hashes = {}
+        for sub, directory in (('mp', MP_DIR), ('pl', PL_DIR)):
+            for path in glob.glob(os.path.join(directory, '*.json')):
+                hashes[sub, os.path.basename(path)[:-len('.json')]] = self.cache.file_hash(path)
+        return hashes
+
+    def poll_thaipbs(self):
+        """Codes of the areas changed by a new ThaiPBS snapshot (empty if there is none)."""
+        version = election_scraper.discover_version(
+            self.snapshot_page, self.base_url, self.codes[0] if self.codes else 1001)
+        if version is None or version == self.version:
+            print(f'  🕒 Snapshot {self.version or "-"}: no newer version')
+            return set()
+        print(f'  🆕 Snapshot {version} (was {self.version or "-"}): downloading...')
+        before = self.area_hashes()
+        election_scraper.TIMESTAMP_VERSION = version
+        # A version left incomplete by the last cycle only fetches its missing areas
+        journal = CrawlJournal(version)
+        try:
+            asyncio.run(election_scraper.scrape_async(
+                self.concurrency, self.rps, election_scraper.RETRIES, self.base_url, self.codes,
+                fetcher=self.fetcher, journal=journal))
+        finally:
+            journal.close()
+        after = self.area_hashes()
+        changed = {code for sub, code in before.keys() | after.keys()
+                   if before.get((sub, code)) != after.get((sub, code))}
+        incomplete = journal.incomplete(self.codes)
+        files = journal.files()
+        if incomplete or not files:
+            # Failed areas still hold an older snapshot's file: archive the version
+            # once a later cycle has fetched them
+            print(f'  ⚠️ Snapshot {version} incomplete ({len(incomplete)} area files left); not archived yet')
+            print(f'  📥 Snapshot {version}: {len(changed)} areas changed')
+            return changed
+        written, _ = self.archive.add(version, files)
+        self.version = version
+        print(f'  📥 Snapshot {version}: {len(changed)} areas changed, {written} new files archived')
+        return changed
+
+    def poll_ect(self):
+        """Names of the ECT endpoints whose content changed."""
+        return set(ect_api_fetcher.fetch_all(names=ECT_ENDPOINTS, endpoints=self.ect_endpoints))
+
+    def publish(self):
+        """Run the stages that need it and swap the new document into place."""
+        runner = make_runner(self.params, self.cache, self.memo, self.cache_dir, self.jobs,
+                             memory=self.memory)
+        output = build_output(runner.run())
+        self.cache.save_index()
+        tmp = f'{self.output_file}.{os.getpid()}.tmp'
+        os.makedirs(os.path.dirname(self.output_file), exist_ok=True)
+        write_json(tmp, output, self.cache_dir)
+        os.replace(tmp, self.output_file)
+        status = Counter(runner.status.values())
+        ran = [name for name in runner.topo if runner.status.get(name) == 'run']
+        print(f"  🧩 Stages: {status['run']} run ({', '.join(ran) or '-'}), "
+              f"{status['memory']} from memory, {status['cached']} cached")
+        print(f"  📤 Published {self.output_file}: {output['summary']['totalAreas']} areas, "
+              f"{output['summary']['totalSuspicious']} suspicious")
+
+    def cycle(self):
+        self.cycles += 1
+        print(f'🔁 Cycle {self.cycles} ({datetime.datetime.now():%H:%M:%S})')
+        with Measure() as m:
+            areas = self.poll_thaipbs() if self.scrape else set()
+            endpoints = self.poll_ect() if self.ect else set()
+            if areas or endpoints or self.cycles == 1:
+                self.publish()
+            else:
+                print('  💤 Nothing changed; the published data is current')
+        print(f"  ⏱️ Cycle {self.cycles}: {m.metrics['wallSeconds']:.2f}s wall, "
+              f"{m.metrics['cpuSeconds']:.2f}s CPU")
+
+    def run(self, interval=INTERVAL, once=False):
+        while True:
+            started = time.monotonic()
+            try:
+                self.cycle()
+            except Exception:
+                # A failed poll (network, a malformed snapshot) must not end the night
+                traceback.print_exc()
+            if once:
+                return
+            time.sleep(max(0.0, interval - (time.monotonic() - started)))
+
+    def close(self):
+        if self.fetcher is not None:
+            self.fetcher.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Poll ThaiPBS and ECT, recompute the changed stages and publish election_data.json')
+    parser.add_argument('--interval', type=float, default=INTERVAL,
+                        help=f'seconds between the starts of two cycles (default: {INTERVAL})')
+    parser.add_argument('--once', action='store_true', help='run one cycle and exit')
+    parser.add_argument('--output', default=OUTPUT_FILE,
+                        help='published JSON file (default: public/election_data.json)')
+    parser.add_argument('--cache-dir', default=CACHE_DIR,
+                        help='parse and stage cache directory (default: visualization/.cache)')
+    parser.add_argument('--jobs', type=int, default=1,
+                        help='worker processes for independent stages (default: 1)')
+    parser.add_argument('--no-scrape', action='store_true', help='do not poll ThaiPBS snapshots')
+    parser.add_argument('--no-ect', action='store_true', help='do not poll the ECT endpoints')
+    parser.add_argument('--concurrency', type=int, default=8,
+                        help='requests in flight while downloading a snapshot (default: 8)')
+    parser.add_argument('--rps', type=float, default=10.0,
+                        help='requests per second while downloading a snapshot, 0 for no limit (default: 10)')
+    parser.add_argument('--base-url', default=election_scraper.BASE_URL,
+                        help='ThaiPBS results host (default: %(default)s)')
+    parser.add_argument('--snapshot-page', default=election_scraper.SNAPSHOT_PAGE,
+                        help='page scanned for snapshot versions (default: ThaiPBS results page)')
+    parser.add_argument('--ect-base-url',
+                        help='host serving every ECT endpoint, e.g. mock_server.py (default: the ECT hosts)')
+    args = parser.parse_args()
+    # The scraper writes to ./data/mp and ./data/pl
+    os.chdir(BASE_DIR)
+    watch = Watch(os.path.abspath(args.output), os.path.abspath(args.cache_dir), args.jobs,
+                  not args.no_scrape, not args.no_ect, args.concurrency, args.rps, args.base_url,
+                  args.snapshot_page, args.ect_base_url)
+    try:
+        watch.run(args.interval, args.once)
+    except KeyboardInterrupt:
+        print(f'\n👋 Stopped after {watch.cycles} cycles')
+    finally:
+        watch.close()
@@ -15,7 +15,7 @@ import {
   Sparkles, Thermometer, ShieldCheck, RefreshCw, Gauge, Hash, Shuffle,
   Fingerprint, Binary, Sigma, BookOpen,
 } from 'lucide-react'
-import type { EnsembleAnalysisItem, EnsemblePartySummaryItem, EnsembleMeta, NameToCodeMap, BenfordDigitItem, NullModelAnalysis, KlimekAnalysis, LastDigitAnalysis, SecondDigitBenfordAnalysis } from '../types'
+import type { EnsembleAnalysisItem, EnsemblePartySummaryItem, EnsembleMeta, NameToCodeMap, BenfordDigitItem, NullModelAnalysis, KlimekAnalysis, KlimekHeatmapBin, LastDigitAnalysis, SecondDigitBenfordAnalysis } from '../types'
 import PartyLogo from './PartyLogo'
 import AnalysisSummary from './AnalysisSummary'
 
@@ -351,6 +351,21 @@ export default function EnsembleAnalysis({ data, partySummary, meta, nameToCodeM
     }))
   }, [meta, data])
 
+  // ─── Klimek heatmap cells by integer bin index (any --klimek-bins grid) ───
+  const klimekGrid = useMemo(() => {
+    if (!klimek) return null
+    const width = 100 / klimek.meta.bins
+    const cells = new Map<string, KlimekHeatmapBin>()
+    let maxCount = 1
+    for (const h of klimek.heatmap) {
+      cells.set(`${Math.round(h.turnoutRange[0] / width)}-${Math.round(h.shareRange[0] / width)}`, h)
+      maxCount = Math.max(maxCount, h.count)
+    }
+    // Edge labels without float noise (e.g. 0.5 steps at 200 bins)
+    const edge = (i: number) => +(i * width).toFixed(2)
+    return { cells, maxCount, edge }
+  }, [klimek])
+
   return (
     <div className="section">
       <div className="section-title">
@@ -843,6 +858,7 @@ export default function EnsembleAnalysis({ data, partySummary, meta, nameToCodeM
                       </td>
                       <td style={{ textAlign: 'center', color: clusterColor(d.spatialCluster) }}>
                         {d.moranI.toFixed(2)} ({d.spatialCluster})
+                        <div style={{ fontSize: 10, opacity: 0.6 }}>p={d.moranP.toFixed(3)}</div>
                       </td>
                       <td style={{ textAlign: 'center' }}>{d.spatialLag.toFixed(1)}</td>
                       <td style={{ textAlign: 'center' }}>
@@ -1623,18 +1639,14 @@ export default function EnsembleAnalysis({ data, partySummary, meta, nameToCodeM
                   fontSize: 9, display: 'flex', alignItems: 'center', justifyContent: 'flex-end',
                   paddingRight: 4, opacity: 0.6, gridColumn: 1, gridRow: klimek.meta.bins - by,
                 }}>
-                  {by * (100 / klimek.meta.bins)}%
+                  {klimekGrid!.edge(by)}%
                 </div>
               ))}
               {/* Heat cells */}
               {Array.from({ length: klimek.meta.bins }, (_, by) => klimek.meta.bins - 1 - by).map(by =>
                 Array.from({ length: klimek.meta.bins }, (_, bx) => {
-                  const bin = klimek.heatmap.find(h =>
-                    Math.abs(h.turnoutBin - (bx * (100 / klimek.meta.bins) + 100 / klimek.meta.bins / 2)) < 3 &&
-                    Math.abs(h.shareBin - (by * (100 / klimek.meta.bins) + 100 / klimek.meta.bins / 2)) < 3
-                  )
-                  const count = bin?.count ?? 0
-                  const maxCount = Math.max(...klimek.heatmap.map(h => h.count), 1)
+                  const { cells, maxCount, edge } = klimekGrid!
+                  const count = cells.get(`${bx}-${by}`)?.count ?? 0
                   const intensity = count / maxCount
                   return (
                     <div key={`${bx}-${by}`} style={{
@@ -1646,7 +1658,7 @@ export default function EnsembleAnalysis({ data, partySummary, meta, nameToCodeM
                       display: 'flex', alignItems: 'center', justifyContent: 'center',
                       fontSize: 8, color: intensity > 0.5 ? '#fff' : '#aaa',
                       minHeight: 18,
-                    }} title={`T:${bx * 5}-${(bx + 1) * 5}%, S:${by * 5}-${(by + 1) * 5}%, n=${count}`}>
+                    }} title={`T:${edge(bx)}-${edge(bx + 1)}%, S:${edge(by)}-${edge(by + 1)}%, n=${count}`}>
                       {count > 0 ? count : ''}
                     </div>
                   )
@@ -1659,7 +1671,7 @@ export default function EnsembleAnalysis({ data, partySummary, meta, nameToCodeM
                   fontSize: 9, textAlign: 'center', opacity: 0.6,
                   gridColumn: bx + 2, gridRow: klimek.meta.bins + 1,
                 }}>
-                  {bx % 4 === 0 ? `${bx * (100 / klimek.meta.bins)}%` : ''}
+                  {bx % 4 === 0 ? `${klimekGrid!.edge(bx)}%` : ''}
                 </div>
               ))}
             </div>
@@ -2143,6 +2155,8 @@ export default function EnsembleAnalysis({ data, partySummary, meta, nameToCodeM
           <strong>Moran&apos;s I (Spatial Autocorrelation):</strong> วัดว่าเขตที่มี score สูง/ต่ำ
           อยู่ใกล้กันทางภูมิศาสตร์หรือไม่ <strong>HH (High-High)</strong> = hotspot ที่น่าสงสัยทั้ง cluster,
           <strong> LL</strong> = coldspot (ปกติทั้ง cluster), <strong>HL/LH</strong> = outlier
+          — นับเป็น cluster เฉพาะเขตที่มีนัยสำคัญจาก conditional permutation test ({meta?.moranPermutations ?? 999} รอบ)
+          หลังคุม FDR (Benjamini–Hochberg) ที่ {meta?.moranFdrAlpha ?? 0.05}
           Global Moran&apos;s I &gt; 0 = มี positive spatial autocorrelation
         </div>
         <div style={{ marginTop: 8 }}>
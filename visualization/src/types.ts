@@ -360,6 +360,7 @@ export interface EnsembleAnalysisItem {
   moranI: number
   spatialCluster: 'HH' | 'LL' | 'HL' | 'LH' | 'ns'
   spatialLag: number
+  moranP: number  // conditional-permutation pseudo p-value of moranI
   // Semi-supervised
   semiSupervisedLabel: 'suspect' | 'elevated' | 'normal' | 'unlabeled'
   // Entropy weights (same for all, stored for display)
@@ -404,6 +405,9 @@ export interface EnsembleMeta {
   permutationIterations: number
   hotspots: number
   coldspots: number
+  moranPermutations: number
+  moranFdrAlpha: number
+  moranSignificant: number
   pLt001: number
   pLt005: number
   suspectLabels: number
@@ -517,10 +521,17 @@ export interface KlimekMeta {
   bins: number
 }
 
+export interface KlimekDensity {
+  bins: number
+  bandwidth: [number, number]
+  grid: number[][]
+}
+
 export interface KlimekAnalysis {
   points: KlimekPoint[]
   heatmap: KlimekHeatmapBin[]
   meta: KlimekMeta
+  density?: KlimekDensity
 }
 
 // ─── Last-Digit Uniformity Test ───